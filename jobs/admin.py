@@ -1,7 +1,5 @@
 from django.contrib import admin
-from django.http import HttpResponse
-from django.utils import timezone
-import csv
+from profiles.csv_export import csv_response, job_posting_rows, application_rows
 from .models import JobCategory, JobPosting, JobApplication, JobSkill
 
 @admin.register(JobCategory)
@@ -43,45 +41,7 @@ class JobPostingAdmin(admin.ModelAdmin):
     
     def _export_jobs_csv(self, queryset):
         """Helper method to export job postings to CSV"""
-        response = HttpResponse(content_type='text/csv; charset=utf-8')
-        response['Content-Disposition'] = f'attachment; filename="job_postings_export_{timezone.now().strftime("%Y%m%d_%H%M%S")}.csv"'
-        response.write('\ufeff')
-        
-        writer = csv.writer(response)
-        writer.writerow([
-            'ID', 'Title', 'Company', 'Location', 'Category', 'Employment Type',
-            'Experience Level', 'Work Location', 'Status', 'Is Active',
-            'Salary Min', 'Salary Max', 'Salary Currency', 'Salary Period',
-            'Visa Sponsorship', 'Application Count', 'View Count',
-            'Posted By (Email)', 'Posted By (Username)', 'Posted At', 'Updated At'
-        ])
-        
-        for job in queryset.select_related('posted_by', 'category').prefetch_related('required_skills').order_by('-posted_at'):
-            writer.writerow([
-                job.id,
-                job.title or '',
-                job.company or '',
-                job.location or '',
-                job.category.name if job.category else '',
-                job.get_employment_type_display(),
-                job.get_experience_level_display(),
-                job.get_work_location_display(),
-                job.get_status_display(),
-                'Yes' if job.is_active else 'No',
-                str(job.salary_min) if job.salary_min else '',
-                str(job.salary_max) if job.salary_max else '',
-                job.salary_currency,
-                job.salary_period,
-                'Yes' if job.visa_sponsorship else 'No',
-                job.application_count,
-                job.view_count,
-                job.posted_by.email if job.posted_by else '',
-                job.posted_by.username if job.posted_by else '',
-                job.posted_at.strftime('%Y-%m-%d %H:%M:%S') if job.posted_at else '',
-                job.updated_at.strftime('%Y-%m-%d %H:%M:%S') if job.updated_at else '',
-            ])
-        
-        return response
+        return csv_response('job_postings_export', job_posting_rows(queryset))
 
 @admin.register(JobApplication)
 class JobApplicationAdmin(admin.ModelAdmin):
@@ -105,36 +65,7 @@ class JobApplicationAdmin(admin.ModelAdmin):
     
     def _export_applications_csv(self, queryset):
         """Helper method to export applications to CSV"""
-        response = HttpResponse(content_type='text/csv; charset=utf-8')
-        response['Content-Disposition'] = f'attachment; filename="job_applications_export_{timezone.now().strftime("%Y%m%d_%H%M%S")}.csv"'
-        response.write('\ufeff')
-        
-        writer = csv.writer(response)
-        writer.writerow([
-            'ID', 'Job Title', 'Job Company', 'Applicant Email', 'Applicant Username',
-            'Applicant Name', 'Status', 'Outcome', 'Applied At', 'Interview Date',
-            'Has Resume', 'Has Cover Letter'
-        ])
-        
-        for app in queryset.select_related('job', 'applicant', 'job__posted_by').order_by('-applied_at'):
-            applicant_name = app.applicant.get_full_name() or app.applicant.username
-            
-            writer.writerow([
-                app.id,
-                app.job.title if app.job else '',
-                app.job.company if app.job else '',
-                app.applicant.email if app.applicant else '',
-                app.applicant.username if app.applicant else '',
-                applicant_name,
-                app.get_status_display(),
-                app.get_outcome_display(),
-                app.applied_at.strftime('%Y-%m-%d %H:%M:%S') if app.applied_at else '',
-                app.interview_date.strftime('%Y-%m-%d %H:%M:%S') if app.interview_date else '',
-                'Yes' if app.resume else 'No',
-                'Yes' if app.cover_letter else 'No',
-            ])
-        
-        return response
+        return csv_response('job_applications_export', application_rows(queryset))
 
 @admin.register(JobSkill)
 class JobSkillAdmin(admin.ModelAdmin):
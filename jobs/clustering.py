@@ -0,0 +1,208 @@
+"""
+Viewport-bounded map data: server-side marker clustering and paged markers.
+
+The map asks for the jobs inside its viewport at its current zoom. The
+viewport is split into a grid of cells roughly CLUSTER_CELL_PIXELS wide
+on screen, and the database groups the matching jobs by cell, returning
+one row per non-empty cell (count, centroid). The rows are found through
+the spatial index in jobs.spatial: geohash range scans plus a
+latitude/longitude box.
+
+A cell holding a single job is sent as that job's marker. At
+CLUSTER_MAX_ZOOM and closer, every job in the viewport is sent as a
+marker. Markers only carry (id, latitude, longitude); the popup details
+are fetched when a marker is clicked.
+
+viewport_page serves markers for the box a page at a time: compact rows
+in id order, with a cursor (the last id) for the next page, so a map can
+load what it shows as the user pans.
+"""
+import math
+from decimal import Decimal
+from django.conf import settings
+from django.db.models import Avg, Count, F, FloatField, Min, Q
+from django.db.models.functions import Cast, Floor
+from .spatial import cells_filter, covering_cells
+
+# Approximate on-screen width of a grid cell
+CLUSTER_CELL_PIXELS = 64
+
+# Zoom level from which individual markers are returned instead of clusters
+CLUSTER_MAX_ZOOM = getattr(settings, 'JOB_MAP_CLUSTER_MAX_ZOOM', 14)
+
+# Most grid cells a single request may aggregate; larger requests are clustered coarser
+MAX_CELLS = 2500
+
+# Most markers returned by a single request
+MAX_MARKERS = getattr(settings, 'JOB_MAP_MAX_MARKERS', 500)
+
+MAX_ZOOM = 20
+
+# Markers per viewport_page page
+PAGE_SIZE = getattr(settings, 'MAP_PAGE_SIZE', 500)
+
+
+def parse_bbox(value):
+    """
+    Parse a ``west,south,east,north`` bounding box (Leaflet's
+    ``toBBoxString()``), or return None if it is malformed.
+    """
+    try:
+        west, south, east, north = (float(part) for part in value.split(','))
+    except (AttributeError, ValueError):
+        return None
+    if not all(math.isfinite(part) for part in (west, south, east, north)):
+        return None
+    south, north = max(min(south, north), -90.0), min(max(south, north), 90.0)
+    if east - west >= 360:
+        west, east = -180.0, 180.0
+    else:
+        # Wrap longitudes from a panned-around world back into [-180, 180)
+        west = (west + 180.0) % 360.0 - 180.0
+        east = (east + 180.0) % 360.0 - 180.0
+        if east == -180.0:
+            east = 180.0
+    return west, south, east, north
+
+
+def parse_cursor(value):
+    """Parse a viewport_page cursor, or return None for the first page"""
+    try:
+        return max(int(value), 0) or None
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_zoom(value):
+    """Parse a zoom level, clamped to [0, MAX_ZOOM], or return None"""
+    try:
+        return min(max(int(value), 0), MAX_ZOOM)
+    except (TypeError, ValueError):
+        return None
+
+
+def cell_size(zoom):
+    """Width in degrees of a grid cell at a zoom level"""
+    # A 256px tile spans 360 / 2**zoom degrees of longitude
+    return 360.0 / 2 ** zoom * CLUSTER_CELL_PIXELS / 256
+
+
+def bbox_filter(west, south, east, north, field_prefix='', geohash=True):
+    """
+    Build the indexed filter for a bounding box.
+
+    A box crossing the antimeridian (west > east) is matched as two
+    longitude ranges, without the geohash scans. Pass ``geohash=False``
+    for models that don't store a geohash.
+    """
+    condition = Q(**{
+        f'{field_prefix}latitude__gte': south,
+        f'{field_prefix}latitude__lte': north,
+    })
+    if west <= east:
+        condition &= Q(**{
+            f'{field_prefix}longitude__gte': west,
+            f'{field_prefix}longitude__lte': east,
+        })
+        cells = covering_cells(south, north, west, east) if geohash else None
+        if cells:
+            condition &= cells_filter(cells, field_prefix)
+    else:
+        condition &= (
+            Q(**{f'{field_prefix}longitude__gte': west}) | Q(**{f'{field_prefix}longitude__lte': east})
+        )
+    return condition
+
+
+def _cell_count(west, south, east, north, size):
+    width = east - west if west <= east else 360.0 - (west - east)
+    return (math.floor(width / size) + 1) * (math.floor((north - south) / size) + 1)
+
+
+def cluster_jobs(jobs, bbox, zoom):
+    """
+    Cluster a JobPosting queryset within a bounding box.
+
+    Returns a dict of:
+
+    - ``zoom``: the zoom the grid was built for
+    - ``total``: jobs in the box
+    - ``clusters``: ``[latitude, longitude, count]`` per cell with several jobs
+    - ``markers``: ``[id, latitude, longitude]`` per single job
+    - ``truncated``: True if markers were left out (more than MAX_MARKERS)
+    """
+    west, south, east, north = bbox
+    # Match on ids, so filters that rank, annotate or use DISTINCT don't leak into the grouping
+    located = jobs.model.objects.filter(pk__in=jobs.order_by().values('pk')).filter(
+        bbox_filter(west, south, east, north)
+    )
+
+    # Too many cells for the box (an oversized viewport): cluster coarser
+    while zoom > 0 and _cell_count(west, south, east, north, cell_size(zoom)) > MAX_CELLS:
+        zoom -= 1
+
+    if zoom >= CLUSTER_MAX_ZOOM:
+        rows = list(located.order_by('id').values_list('id', 'latitude', 'longitude')[:MAX_MARKERS + 1])
+        truncated = len(rows) > MAX_MARKERS
+        markers = [[job_id, _round(latitude), _round(longitude)] for job_id, latitude, longitude in rows[:MAX_MARKERS]]
+        return {
+            'zoom': zoom,
+            'total': located.count() if truncated else len(markers),
+            'clusters': [],
+            'markers': markers,
+            'truncated': truncated,
+        }
+
+    size = cell_size(zoom)
+    latitude = Cast(F('latitude'), FloatField())
+    longitude = Cast(F('longitude'), FloatField())
+    cells = located.annotate(
+        cell_y=Floor((latitude + 90.0) / size),
+        cell_x=Floor((longitude + 180.0) / size),
+    ).values('cell_y', 'cell_x').annotate(
+        count=Count('id'),
+        center_lat=Avg(latitude),
+        center_lon=Avg(longitude),
+        first_id=Min('id'),
+    ).values_list('count', 'center_lat', 'center_lon', 'first_id')
+
+    clusters = []
+    markers = []
+    total = 0
+    for count, center_lat, center_lon, first_id in cells:
+        total += count
+        if count == 1:
+            markers.append([first_id, _round(center_lat), _round(center_lon)])
+        else:
+            clusters.append([_round(center_lat), _round(center_lon), count])
+    return {
+        'zoom': zoom,
+        'total': total,
+        'clusters': clusters,
+        'markers': markers,
+        'truncated': False,
+    }
+
+
+def viewport_page(queryset, bbox, fields, cursor=None, limit=PAGE_SIZE, field_prefix='', geohash=True):
+    """
+    One page of rows inside a bounding box, in primary key order.
+
+    ``fields`` are passed to ``values_list`` and must start with the
+    primary key; coordinates come back as floats. Returns (rows, cursor),
+    where cursor is None on the last page.
+    """
+    rows = queryset.filter(bbox_filter(*bbox, field_prefix=field_prefix, geohash=geohash))
+    if cursor:
+        rows = rows.filter(pk__gt=cursor)
+    rows = list(rows.order_by('pk').values_list(*fields)[:limit + 1])
+
+    next_cursor = str(rows[limit - 1][0]) if len(rows) > limit else None
+    return [
+        [_round(value) if isinstance(value, (Decimal, float)) else value for value in row]
+        for row in rows[:limit]
+    ], next_cursor
+
+
+def _round(value):
+    return round(float(value), 5)
@@ -0,0 +1,340 @@
+"""
+Offline geocoding from a bundled gazetteer of cities.
+
+jobs/data/gazetteer.csv lists common cities (name, state/province,
+country, coordinates, population, alternate names). Every way of writing
+a place ("Austin", "Austin TX", "Austin, Texas, USA") is expanded into a
+normalized key, and the keys are held in one sorted array, so a lookup is
+a binary search:
+
+- exact: the whole address, then without country words or ZIP codes,
+  then without leading words as long as a state or country is left
+  ("Downtown Austin, TX" -> "austin tx", but not "Upstate New York")
+- prefix: a word cut short that only matches one place ("Minneap")
+- fuzzy: one or two typos ("San Fransisco, CA"), checking only keys with
+  the same first letter and a similar length
+
+Prefix and fuzzy matching only ever see the whole address (less any
+country words), never a fragment of it, and never a bare state or
+country name.
+
+When a name is ambiguous the most populous place wins, so "Portland"
+means Oregon and "Portland, ME" means Maine.
+
+Larger gazetteers can be added with GAZETTEER_FILES: CSVs in the same
+format, or GeoNames exports (cities*.txt and postal code files).
+"""
+import bisect
+import csv
+import os
+from django.conf import settings
+from .geocoding import normalize_address
+
+BUNDLED_GAZETTEER = os.path.join(os.path.dirname(__file__), 'data', 'gazetteer.csv')
+
+# Alternate ways of writing a country
+COUNTRY_NAMES = {
+    'US': ['United States', 'United States of America', 'USA', 'US', 'America'],
+    'CA': ['Canada'],
+    'GB': ['United Kingdom', 'UK', 'Great Britain', 'GB'],
+    'IE': ['Ireland'],
+    'FR': ['France'],
+    'DE': ['Germany', 'Deutschland'],
+    'NL': ['Netherlands', 'The Netherlands', 'Holland'],
+    'ES': ['Spain'],
+    'PT': ['Portugal'],
+    'IT': ['Italy'],
+    'CH': ['Switzerland'],
+    'AT': ['Austria'],
+    'CZ': ['Czech Republic', 'Czechia'],
+    'PL': ['Poland'],
+    'SE': ['Sweden'],
+    'DK': ['Denmark'],
+    'NO': ['Norway'],
+    'FI': ['Finland'],
+    'IL': ['Israel'],
+    'AE': ['United Arab Emirates', 'UAE'],
+    'IN': ['India'],
+    'SG': ['Singapore'],
+    'JP': ['Japan'],
+    'KR': ['South Korea', 'Korea'],
+    'CN': ['China'],
+    'HK': ['Hong Kong'],
+    'AU': ['Australia'],
+    'NZ': ['New Zealand'],
+    'BR': ['Brazil', 'Brasil'],
+    'MX': ['Mexico', 'México'],
+    'AR': ['Argentina'],
+    'NG': ['Nigeria'],
+    'KE': ['Kenya'],
+    'ZA': ['South Africa'],
+    'EG': ['Egypt'],
+}
+
+# Typos tolerated by fuzzy matching, by key length
+FUZZY_DISTANCES = ((10, 2), (5, 1))
+
+# Shortest input that prefix matching will complete
+MIN_PREFIX = 4
+
+
+class Place:
+    __slots__ = ('name', 'admin_code', 'country_code', 'latitude', 'longitude', 'population')
+
+    def __init__(self, name, admin_code, country_code, latitude, longitude, population):
+        self.name = name
+        self.admin_code = admin_code
+        self.country_code = country_code
+        self.latitude = latitude
+        self.longitude = longitude
+        self.population = population
+
+    @property
+    def coords(self):
+        return self.latitude, self.longitude
+
+    def __repr__(self):
+        return f'<Place {self.name}, {self.admin_code or "-"}, {self.country_code}>'
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def read_gazetteer_csv(path):
+    """Yield (Place, names, admin names) from a CSV in the bundled format"""
+    with open(path, encoding='utf-8', newline='') as source:
+        for row in csv.DictReader(source):
+            place = Place(
+                row['name'], row['admin_code'], row['country_code'],
+                float(row['latitude']), float(row['longitude']), _int(row['population'])
+            )
+            names = [row['name'], *filter(None, (row.get('aliases') or '').split('|'))]
+            yield place, names, [row['admin_code'], row['admin_name']]
+
+
+def read_geonames(path):
+    """
+    Yield (Place, names, admin names) from a GeoNames export: a cities
+    file (cities15000.txt etc.) or a postal code file (US.txt from the
+    postal code dump), told apart by their column counts.
+    """
+    with open(path, encoding='utf-8') as source:
+        for line in source:
+            columns = line.rstrip('\n').split('\t')
+            if len(columns) >= 19:
+                # geonameid, name, asciiname, alternatenames, latitude, longitude, ..., country, cc2, admin1, ..., population
+                place = Place(columns[1], columns[10], columns[8], float(columns[4]), float(columns[5]), _int(columns[14]))
+                yield place, [columns[1], columns[2]], [columns[10]]
+            elif len(columns) >= 11 and columns[9] and columns[10]:
+                # country, postal code, place name, admin1 name, admin1 code, ..., latitude, longitude
+                place = Place(columns[1], columns[4], columns[0], float(columns[9]), float(columns[10]), 0)
+                yield place, [columns[1]], [columns[3], columns[4]]
+
+
+class Gazetteer:
+    """Sorted array of normalized place keys, each pointing at the most populous place it names"""
+
+    def __init__(self, records=()):
+        best = {}
+        self.places = []
+        # Keys that are a bare place name, with no state/province or country
+        self.name_keys = set()
+        # States, provinces and countries, which are never completed to a city
+        self.region_keys = set()
+        for place, names, admin_names in records:
+            index = len(self.places)
+            self.places.append(place)
+            self.name_keys.update(filter(None, map(normalize_address, names)))
+            self.region_keys.update(filter(None, map(normalize_address, admin_names)))
+            for key in self._keys(place, names, admin_names):
+                current = best.get(key)
+                if current is None or place.population > self.places[current].population:
+                    best[key] = index
+        self.keys = sorted(best)
+        self.indexes = [best[key] for key in self.keys]
+        self.country_words = {
+            normalize_address(name) for names in COUNTRY_NAMES.values() for name in names
+        }
+        self.region_keys |= self.country_words
+
+    @staticmethod
+    def _keys(place, names, admin_names):
+        admins = ['', *(normalize_address(name) for name in admin_names if name)]
+        countries = ['', *(normalize_address(name) for name in [place.country_code, *COUNTRY_NAMES.get(place.country_code, [])])]
+        for name in names:
+            name = normalize_address(name)
+            if not name:
+                continue
+            for admin in admins:
+                for country in countries:
+                    yield ' '.join(part for part in (name, admin, country) if part)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def exact(self, key):
+        """The place a normalized key names, or None"""
+        position = bisect.bisect_left(self.keys, key)
+        if position < len(self.keys) and self.keys[position] == key:
+            return self.places[self.indexes[position]]
+        return None
+
+    def complete(self, prefix, limit=10):
+        """Places whose keys start with a normalized prefix, most populous first"""
+        start = bisect.bisect_left(self.keys, prefix)
+        end = bisect.bisect_left(self.keys, prefix + '\uffff')
+        indexes = set(self.indexes[start:end])
+        return sorted((self.places[index] for index in indexes), key=lambda place: -place.population)[:limit]
+
+    def fuzzy(self, key):
+        """The closest place within a few typos of a normalized key, or None"""
+        max_distance = next((distance for length, distance in FUZZY_DISTANCES if len(key) >= length), 0)
+        if not max_distance:
+            return None
+        # Keys sharing the first letter are one contiguous slice of the array
+        start = bisect.bisect_left(self.keys, key[0])
+        end = bisect.bisect_left(self.keys, key[0] + '\uffff')
+        best = None
+        for position in range(start, end):
+            candidate = self.keys[position]
+            if abs(len(candidate) - len(key)) > max_distance:
+                continue
+            distance = bounded_edit_distance(key, candidate, max_distance)
+            if distance <= max_distance:
+                place = self.places[self.indexes[position]]
+                rank = (distance, -place.population)
+                if best is None or rank < best[0]:
+                    best = (rank, place)
+        return best[1] if best else None
+
+    def _candidates(self, words):
+        """
+        Ways to read an address, most specific first, as (whole, partial):
+        the whole address with and without country words at the end
+        ("... usa", "... united states"), and the last of those without
+        leading words ("downtown austin tx" -> "austin tx").
+        """
+        words = [word for word in words if word]
+        whole = [' '.join(words)]
+        while len(words) > 1:
+            for size in (4, 3, 2, 1):
+                if len(words) > size and ' '.join(words[-size:]) in self.country_words:
+                    words = words[:-size]
+                    whole.append(' '.join(words))
+                    break
+            else:
+                break
+        partial = [' '.join(words[start:]) for start in range(1, len(words))]
+        return whole, partial
+
+    def lookup(self, address):
+        """The place an address most likely names, or None"""
+        key = normalize_address(address)
+        if not key:
+            return None
+        words = key.split()
+
+        # Postal codes (only if a postal gazetteer is loaded)
+        for word in words:
+            if word.isdigit() and len(word) >= 5:
+                place = self.exact(word)
+                if place:
+                    return place
+        words = [word for word in words if not word.isdigit()]
+        if not words:
+            return None
+
+        whole, partial = self._candidates(words)
+        for candidate in whole:
+            place = self.exact(candidate)
+            if place:
+                return place
+        # With leading words dropped, only a name qualified by its state or
+        # country counts: "Upstate New York" is not New York City
+        for candidate in partial:
+            if candidate not in self.name_keys:
+                place = self.exact(candidate)
+                if place:
+                    return place
+        # Completion and typos only for the whole address, never a fragment
+        # of it, and never for a bare state or country ("Indiana")
+        for candidate in whole:
+            if candidate in self.region_keys:
+                continue
+            # Only a word cut short is completed: "Minneap", not "Kansas" -> "Kansas City"
+            if len(candidate) >= MIN_PREFIX and not self.complete(candidate + ' ', limit=1):
+                matches = self.complete(candidate, limit=2)
+                if len(matches) == 1:
+                    return matches[0]
+            place = self.fuzzy(candidate)
+            if place:
+                return place
+        return None
+
+
+def bounded_edit_distance(a, b, limit):
+    """
+    Levenshtein distance between two strings, or ``limit + 1`` once it is
+    known to exceed ``limit``. Only the diagonal band of width
+    ``2 * limit + 1`` is computed.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    over = limit + 1
+    previous = [j if j <= limit else over for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        low = max(1, i - limit)
+        high = min(len(b), i + limit)
+        current = [over] * (len(b) + 1)
+        if i <= limit:
+            current[0] = i
+        char_a = a[i - 1]
+        row_min = current[0]
+        for j in range(low, high + 1):
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != b[j - 1]))
+            current[j] = value if value < over else over
+            if value < row_min:
+                row_min = value
+        if row_min > limit:
+            return over
+        previous = current
+    return previous[-1]
+
+
+def load_gazetteer():
+    """Build the gazetteer from the bundled CSV plus any GAZETTEER_FILES"""
+    def records():
+        yield from read_gazetteer_csv(BUNDLED_GAZETTEER)
+        for path in getattr(settings, 'GAZETTEER_FILES', []):
+            if path.endswith('.csv'):
+                yield from read_gazetteer_csv(path)
+            else:
+                yield from read_geonames(path)
+    return Gazetteer(records())
+
+
+_gazetteer = None
+
+
+def get_gazetteer():
+    """The process-wide gazetteer, loaded on first use"""
+    global _gazetteer
+    if _gazetteer is None:
+        _gazetteer = load_gazetteer()
+    return _gazetteer
+
+
+class GazetteerGeocoder:
+    """Resolves cities from the in-memory gazetteer, without any network access"""
+    min_interval = 0
+
+    def __init__(self):
+        self.gazetteer = get_gazetteer()
+
+    def geocode(self, address):
+        place = self.gazetteer.lookup(address)
+        return place.coords if place else None
@@ -0,0 +1,402 @@
+"""
+Background geocoding for job and profile locations.
+
+Saving a JobPosting or JobSeekerProfile with a ``location`` but no
+coordinates queues a GeocodeRequest (see jobs.signals). The
+process_geocode_queue command drains the queue through the configured
+geocoder, at most one lookup per ``min_interval`` seconds, so pages such
+as the applicant map only ever read stored coordinates.
+
+Every lookup goes through the geocode cache first: a per-process LRU in
+front of the GeocodeCache table, keyed by the normalized address text
+(case-folded, punctuation and whitespace collapsed), so "San Francisco, CA"
+and "san francisco ca" share an entry. Found addresses are cached for
+GEOCODE_CACHE_DAYS and addresses the geocoder couldn't find for
+GEOCODE_NEGATIVE_CACHE_DAYS; only a cache miss reaches the geocoder.
+
+Geocoders are chosen by the GEOCODER_BACKEND setting, a comma-separated
+list tried in order (default ``gazetteer,nominatim``):
+
+- ``gazetteer``: the offline city gazetteer in jobs.gazetteer, resolved
+  in memory with no network access.
+- ``nominatim``: OpenStreetMap Nominatim through geopy. GEOCODER_DOMAIN
+  and GEOCODER_SCHEME point it at another Nominatim-compatible server,
+  e.g. a local stand-in.
+- ``static``: a fixed address -> coordinates mapping, for tests and
+  offline development (GEOCODER_STATIC_LOCATIONS).
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from .models import GeocodeCache, GeocodeRequest, JobPosting
+
+# Lookups allowed before a request is dropped
+MAX_ATTEMPTS = 5
+
+# Delay before the first retry; doubles with each failed attempt
+RETRY_AFTER = timedelta(minutes=5)
+
+# How long found and not-found addresses stay cached
+CACHE_TTL = timedelta(days=getattr(settings, 'GEOCODE_CACHE_DAYS', 90))
+NEGATIVE_CACHE_TTL = timedelta(days=getattr(settings, 'GEOCODE_NEGATIVE_CACHE_DAYS', 1))
+
+# Addresses kept in each process's LRU
+LRU_SIZE = getattr(settings, 'GEOCODE_LRU_SIZE', 2048)
+
+# Geocoder lookups each user may trigger from the map search per minute
+USER_LOOKUPS_PER_MINUTE = getattr(settings, 'GEOCODE_USER_LOOKUPS_PER_MINUTE', 10)
+
+# Returned by the cache lookups for an address that isn't cached
+MISS = object()
+
+NON_WORD_RE = re.compile(r'[\W_]+')
+
+
+class GeocodingError(Exception):
+    """The geocoding service failed; the lookup should be retried later"""
+
+
+class NominatimGeocoder:
+    """OpenStreetMap Nominatim (usage policy: at most one request per second)"""
+    min_interval = 1.0
+    # Shared by every instance, so lookups from different requests in one process are spaced too
+    _lock = threading.Lock()
+    _last_request = 0.0
+
+    def __init__(self):
+        from geopy.geocoders import Nominatim
+
+        self.client = Nominatim(
+            user_agent=getattr(settings, 'GEOCODER_USER_AGENT', 'lockedin_recruiter_app'),
+            domain=getattr(settings, 'GEOCODER_DOMAIN', 'nominatim.openstreetmap.org'),
+            scheme=getattr(settings, 'GEOCODER_SCHEME', 'https'),
+            timeout=getattr(settings, 'GEOCODER_TIMEOUT', 5),
+        )
+
+    def geocode(self, address):
+        """Return (latitude, longitude) for an address, or None if it wasn't found"""
+        from geopy.exc import GeopyError
+
+        with NominatimGeocoder._lock:
+            wait = self.min_interval - (time.monotonic() - NominatimGeocoder._last_request)
+            if wait > 0:
+                time.sleep(wait)
+            NominatimGeocoder._last_request = time.monotonic()
+        try:
+            location = self.client.geocode(address)
+        except GeopyError as e:
+            raise GeocodingError(str(e))
+        if location is None:
+            return None
+        return location.latitude, location.longitude
+
+
+class StaticGeocoder:
+    """Looks addresses up in a fixed mapping, without any network access"""
+    min_interval = 0
+
+    def __init__(self, locations=None):
+        if locations is None:
+            locations = getattr(settings, 'GEOCODER_STATIC_LOCATIONS', {})
+        self.locations = {normalize_address(address): coords for address, coords in locations.items()}
+        self.lookups = []
+
+    def geocode(self, address):
+        self.lookups.append(address)
+        return self.locations.get(normalize_address(address))
+
+
+class ChainGeocoder:
+    """Tries several geocoders in turn and returns the first match"""
+    # Network geocoders space their own requests
+    min_interval = 0
+
+    def __init__(self, geocoders):
+        self.geocoders = geocoders
+
+    def geocode(self, address):
+        for geocoder in self.geocoders:
+            coords = geocoder.geocode(address)
+            if coords is not None:
+                return coords
+        return None
+
+
+def _gazetteer_geocoder():
+    from .gazetteer import GazetteerGeocoder
+    return GazetteerGeocoder()
+
+
+GEOCODERS = {
+    'gazetteer': _gazetteer_geocoder,
+    'nominatim': NominatimGeocoder,
+    'static': StaticGeocoder,
+}
+
+
+def get_geocoder(backend=None):
+    """Return the geocoder(s) named by ``backend`` or the GEOCODER_BACKEND setting"""
+    backend = backend or getattr(settings, 'GEOCODER_BACKEND', 'gazetteer,nominatim')
+    geocoders = [GEOCODERS[name.strip()]() for name in backend.split(',') if name.strip()]
+    return geocoders[0] if len(geocoders) == 1 else ChainGeocoder(geocoders)
+
+
+def normalize_address(address):
+    """Cache key for an address: case-folded, with punctuation and whitespace collapsed"""
+    return ' '.join(NON_WORD_RE.sub(' ', address.casefold()).split())[:255]
+
+
+class LRUCache:
+    """Small thread-safe LRU of address key -> (coordinates, expiry)"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISS
+            coords, expires_at = entry
+            if expires_at <= timezone.now():
+                del self._entries[key]
+                return MISS
+            self._entries.move_to_end(key)
+            return coords
+
+    def set(self, key, coords, expires_at):
+        with self._lock:
+            self._entries[key] = (coords, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+lru_cache = LRUCache(LRU_SIZE)
+
+
+def _coords(latitude, longitude):
+    return None if latitude is None or longitude is None else (float(latitude), float(longitude))
+
+
+def cached_geocodes(addresses):
+    """
+    Look addresses up in the cache without calling the geocoder.
+
+    Returns {address: (latitude, longitude) or None if cached as not
+    found}; uncached addresses are left out. Runs at most one query.
+    """
+    found = {}
+    keys = {}
+    for address in addresses:
+        key = normalize_address(address)
+        if not key:
+            continue
+        coords = lru_cache.get(key)
+        if coords is MISS:
+            keys.setdefault(key, []).append(address)
+        else:
+            found[address] = coords
+    if keys:
+        rows = GeocodeCache.objects.filter(
+            address_key__in=keys, expires_at__gt=timezone.now()
+        ).values_list('address_key', 'latitude', 'longitude', 'expires_at')
+        for key, latitude, longitude, expires_at in rows:
+            coords = _coords(latitude, longitude)
+            lru_cache.set(key, coords, expires_at)
+            for address in keys[key]:
+                found[address] = coords
+    return found
+
+
+def cached_geocode(address):
+    """Cached coordinates for an address, None if cached as not found, or MISS"""
+    return cached_geocodes([address]).get(address, MISS)
+
+
+def store_geocode(address, coords):
+    """Cache a geocoder result (None for an address that wasn't found)"""
+    key = normalize_address(address)
+    if not key:
+        return
+    now = timezone.now()
+    expires_at = now + (CACHE_TTL if coords else NEGATIVE_CACHE_TTL)
+    latitude, longitude = (round(value, 6) for value in coords) if coords else (None, None)
+    GeocodeCache.objects.update_or_create(address_key=key, defaults={
+        'latitude': latitude,
+        'longitude': longitude,
+        'created_at': now,
+        'expires_at': expires_at,
+    })
+    lru_cache.set(key, _coords(latitude, longitude), expires_at)
+
+
+def resolve_address(address, geocoder=None):
+    """
+    Coordinates for an address, or None if it can't be found.
+
+    Only a cache miss calls the geocoder; raises GeocodingError if that
+    lookup fails.
+    """
+    coords = cached_geocode(address)
+    if coords is MISS:
+        coords = (geocoder or get_geocoder()).geocode(address)
+        store_geocode(address, coords)
+    return coords
+
+
+def resolve_address_offline(address):
+    """
+    Coordinates for an address from the cache or the offline gazetteer,
+    or None.
+
+    Never calls a network geocoder and never writes to the cache, so it is
+    safe to call from a request with arbitrary user input; addresses it
+    can't answer are left to the geocode queue.
+    """
+    coords = cached_geocode(address)
+    if coords is MISS:
+        coords = get_geocoder('gazetteer').geocode(address)
+    return coords
+
+
+def _allow_user_lookup(user_id):
+    """Count a geocoder lookup against a user's per-minute allowance"""
+    from django.core.cache import cache
+
+    key = f'geocode-lookups:{user_id}'
+    cache.add(key, 0, 60)
+    try:
+        return cache.incr(key) <= USER_LOOKUPS_PER_MINUTE
+    except ValueError:
+        # Expired between add and incr
+        return True
+
+
+def resolve_address_for_user(address, user_id):
+    """
+    Coordinates for an address a user searched for, or None.
+
+    Answered from the cache or the offline gazetteer when possible. Other
+    addresses go to the configured geocoder, at most
+    USER_LOOKUPS_PER_MINUTE times a minute per user, and the result is
+    cached. Raises GeocodingError if the lookup fails or the user is over
+    the limit.
+    """
+    coords = resolve_address_offline(address)
+    if coords is not None or cached_geocode(address) is not MISS:
+        return coords
+    if not _allow_user_lookup(user_id):
+        raise GeocodingError('Too many location lookups; try again in a minute')
+    return resolve_address(address)
+
+
+def prune_geocode_cache():
+    """Delete expired cache rows. Returns the number deleted."""
+    return GeocodeCache.objects.filter(expires_at__lte=timezone.now()).delete()[0]
+
+
+def _target_model(target_type):
+    from profiles.models import JobSeekerProfile
+
+    return JobPosting if target_type == 'job' else JobSeekerProfile
+
+
+def needs_geocoding(obj):
+    """True if a job or profile has location text but no coordinates"""
+    return bool(obj.location and obj.location.strip()) and (obj.latitude is None or obj.longitude is None)
+
+
+def request_geocode(target_type, target_id):
+    """Queue a job or profile for geocoding"""
+    if target_id is not None:
+        GeocodeRequest.objects.get_or_create(target_type=target_type, target_id=target_id)
+
+
+def apply_cached_coordinates(obj):
+    """
+    Fill in a job's or profile's coordinates from the cache and save them.
+
+    Returns True if saved, False if the cache couldn't answer (MISS) or
+    has the address as not found.
+    """
+    coords = cached_geocode(obj.location)
+    if coords is MISS or coords is None:
+        return False
+    obj.latitude, obj.longitude = coords
+    obj.save(update_fields=['latitude', 'longitude'])
+    return True
+
+
+def _retry_later(request):
+    attempts = request.attempts + 1
+    if attempts >= MAX_ATTEMPTS:
+        return
+    GeocodeRequest.objects.update_or_create(
+        target_type=request.target_type,
+        target_id=request.target_id,
+        defaults={
+            'attempts': attempts,
+            'next_attempt_at': timezone.now() + RETRY_AFTER * 2 ** (attempts - 1),
+        }
+    )
+
+
+def process_geocode_requests(geocoder=None, limit=None, sleep=time.sleep):
+    """
+    Geocode queued jobs and profiles that are due.
+
+    Cached addresses are filled in straight away; geocoder lookups are
+    spaced at least ``geocoder.min_interval`` seconds apart. Returns
+    (located, not_found, failed) counts.
+    """
+    if geocoder is None:
+        geocoder = get_geocoder()
+
+    due = GeocodeRequest.objects.filter(next_attempt_at__lte=timezone.now()).order_by('requested_at')
+    if limit:
+        due = due[:limit]
+
+    located = not_found = failed = 0
+    last_lookup = None
+    for request in list(due):
+        # Claim by deleting, so a second worker skips it and a later save re-queues it
+        if not GeocodeRequest.objects.filter(pk=request.pk).delete()[0]:
+            continue
+        obj = _target_model(request.target_type).objects.filter(pk=request.target_id).first()
+        if obj is None or not needs_geocoding(obj):
+            continue
+
+        coords = cached_geocode(obj.location)
+        if coords is MISS:
+            # Only lookups that reach the geocoder are rate-limited
+            if last_lookup is not None:
+                wait = geocoder.min_interval - (time.monotonic() - last_lookup)
+                if wait > 0:
+                    sleep(wait)
+            last_lookup = time.monotonic()
+            try:
+                coords = geocoder.geocode(obj.location)
+            except GeocodingError:
+                _retry_later(request)
+                failed += 1
+                continue
+            store_geocode(obj.location, coords)
+
+        if coords is None:
+            not_found += 1
+            continue
+        obj.latitude, obj.longitude = (round(value, 6) for value in coords)
+        obj.save(update_fields=['latitude', 'longitude'])
+        located += 1
+    return located, not_found, failed
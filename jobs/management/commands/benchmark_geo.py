@@ -0,0 +1,123 @@
+"""
+Management command to benchmark the vectorized distance engine against
+the scalar per-job haversine loop it replaces
+"""
+import math
+import random
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from jobs.geo import coordinate_arrays, within_radius_mask, k_nearest
+
+
+def scalar_distance(lat1, lon1, lat2, lon2):
+    """The original one-distance-per-call haversine implementation"""
+    if not all([lat1, lon1, lat2, lon2]):
+        return None
+
+    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
+
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
+    c = 2 * math.asin(math.sqrt(a))
+
+    return c * 3959
+
+
+class Command(BaseCommand):
+    help = 'Benchmark vectorized distance ranking against the scalar haversine loop'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=int,
+            nargs='+',
+            default=[1000, 10000, 100000],
+            help='Numbers of synthetic job postings to benchmark',
+        )
+        parser.add_argument(
+            '--radius',
+            type=float,
+            default=25.0,
+            help='Search radius in miles',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Runs per measurement; the fastest run is reported',
+        )
+
+    def handle(self, *args, **options):
+        radius = options['radius']
+        repeat = max(1, options['repeat'])
+        rng = random.Random(42)
+        origin_lat, origin_lon = 37.7749, -122.4194
+
+        self.stdout.write(f'Radius: {radius} miles, best of {repeat} runs')
+        self.stdout.write(
+            f'{"Postings":>10} {"Scalar loop":>14} {"NumPy":>14} {"NumPy kernel":>14} {"NumPy k=10":>14} {"Speedup":>10}'
+        )
+
+        for size in options['sizes']:
+            # Decimal coordinates, as loaded from JobPosting.latitude/longitude
+            rows = [
+                (
+                    Decimal(f'{origin_lat + rng.uniform(-5, 5):.6f}'),
+                    Decimal(f'{origin_lon + rng.uniform(-5, 5):.6f}'),
+                )
+                for _ in range(size)
+            ]
+
+            def run_scalar():
+                matches = []
+                for index, (lat, lon) in enumerate(rows):
+                    distance = scalar_distance(origin_lat, origin_lon, float(lat), float(lon))
+                    if distance is not None and distance <= radius:
+                        matches.append(index)
+                return len(matches)
+
+            def run_vectorized():
+                latitudes, longitudes = coordinate_arrays(rows)
+                return int(within_radius_mask(origin_lat, origin_lon, latitudes, longitudes, radius).sum())
+
+            # Distance math alone, with the coordinate column already converted
+            latitudes, longitudes = coordinate_arrays(rows)
+
+            def run_kernel():
+                return int(within_radius_mask(origin_lat, origin_lon, latitudes, longitudes, radius).sum())
+
+            def run_nearest():
+                nearest, _ = k_nearest(origin_lat, origin_lon, latitudes, longitudes, k=10)
+                return len(nearest)
+
+            scalar_time, scalar_count = self._best_of(run_scalar, repeat)
+            vector_time, vector_count = self._best_of(run_vectorized, repeat)
+            kernel_time, _ = self._best_of(run_kernel, repeat)
+            nearest_time, _ = self._best_of(run_nearest, repeat)
+
+            if scalar_count != vector_count:
+                self.stdout.write(self.style.ERROR(
+                    f'  Result mismatch at {size}: scalar={scalar_count} vectorized={vector_count}'
+                ))
+
+            self.stdout.write(
+                f'{size:>10} {scalar_time * 1000:>11.2f} ms {vector_time * 1000:>11.2f} ms '
+                f'{kernel_time * 1000:>11.2f} ms {nearest_time * 1000:>11.2f} ms '
+                f'{scalar_time / vector_time:>9.1f}x'
+            )
+
+        self.stdout.write(self.style.SUCCESS('Benchmark complete.'))
+
+    def _best_of(self, func, repeat):
+        """Return (fastest wall time in seconds, result) over ``repeat`` runs"""
+        best = None
+        result = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - start
+            if best is None or elapsed < best:
+                best = elapsed
+        return best, result
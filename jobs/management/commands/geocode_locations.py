@@ -0,0 +1,132 @@
+"""
+Management command to bulk-geocode existing job and profile locations
+"""
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from jobs.geocoding import (
+    GEOCODERS, GeocodingError, cached_geocodes, get_geocoder, request_geocode, store_geocode
+)
+from jobs.models import GeocodeRequest, JobPosting
+from jobs.spatial import encode_geohash
+from profiles.models import JobSeekerProfile
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = 'Fill in coordinates for every job and profile with a location but no latitude/longitude, using the offline gazetteer by default'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backend',
+            default='gazetteer',
+            help='Comma-separated geocoders to try (default: gazetteer; network geocoders are rate-limited)',
+        )
+        parser.add_argument(
+            '--queue',
+            action='store_true',
+            help='Queue locations that could not be resolved for process_geocode_queue',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would be geocoded without saving anything',
+        )
+
+    def handle(self, *args, **options):
+        names = [name.strip() for name in options['backend'].split(',') if name.strip()]
+        unknown = [name for name in names if name not in GEOCODERS]
+        if not names or unknown:
+            raise CommandError(f'Unknown geocoder(s): {", ".join(unknown) or options["backend"]}')
+        geocoder = get_geocoder(','.join(names))
+        dry_run = options['dry_run']
+
+        targets = [
+            ('job', JobPosting, ['latitude', 'longitude', 'geohash']),
+            ('profile', JobSeekerProfile, ['latitude', 'longitude']),
+        ]
+        # Each distinct location is resolved once across all batches, cache first
+        self.resolved = {}
+        self.failed = set()
+        self.last_lookup = None
+        start = time.perf_counter()
+        for target_type, model, fields in targets:
+            located = missing = 0
+            for batch in self.batches(model, fields):
+                batch_located, batch_missing = self.geocode_batch(
+                    target_type, model, fields, batch, geocoder, options['queue'], dry_run
+                )
+                located += batch_located
+                missing += batch_missing
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}: {located} located, {missing} unresolved'
+            )
+
+        style = self.style.WARNING if self.failed else self.style.SUCCESS
+        self.stdout.write(style(
+            f'{"Would geocode" if dry_run else "Geocoded"} {len(self.resolved) + len(self.failed)} distinct location(s) '
+            f'in {time.perf_counter() - start:.2f}s; {len(self.failed)} lookup(s) failed'
+        ))
+
+    def batches(self, model, fields):
+        """Yield the rows missing coordinates in pk order, BATCH_SIZE at a time"""
+        rows = (
+            model.objects.filter(Q(latitude__isnull=True) | Q(longitude__isnull=True))
+            .exclude(location='').only('pk', 'location', *fields).order_by('pk')
+        )
+        last_pk = 0
+        while True:
+            batch = list(rows.filter(pk__gt=last_pk)[:BATCH_SIZE])
+            if not batch:
+                return
+            yield batch
+            last_pk = batch[-1].pk
+
+    def resolve(self, locations, geocoder, dry_run):
+        """Resolve locations not seen in an earlier batch into self.resolved"""
+        locations = {location for location in locations if location.strip()} - self.resolved.keys() - self.failed
+        self.resolved.update(cached_geocodes(locations))
+        for location in sorted(locations - self.resolved.keys()):
+            if self.last_lookup is not None and geocoder.min_interval:
+                wait = geocoder.min_interval - (time.monotonic() - self.last_lookup)
+                if wait > 0:
+                    time.sleep(wait)
+            self.last_lookup = time.monotonic()
+            try:
+                coords = geocoder.geocode(location)
+            except GeocodingError:
+                self.failed.add(location)
+                continue
+            self.resolved[location] = coords
+            # Only hits are cached: a miss here may still be found by the queue's geocoder
+            if coords is not None and not dry_run:
+                store_geocode(location, coords)
+
+    def geocode_batch(self, target_type, model, fields, batch, geocoder, queue, dry_run):
+        """
+        Fill in the coordinates of one batch of rows
+
+        Returns (located, unresolved) counts.
+        """
+        self.resolve({obj.location for obj in batch}, geocoder, dry_run)
+        located = []
+        missing = 0
+        for obj in batch:
+            coords = self.resolved.get(obj.location)
+            if coords is None:
+                missing += 1
+                if queue and not dry_run and obj.location.strip():
+                    request_geocode(target_type, obj.pk)
+                continue
+            obj.latitude, obj.longitude = (round(value, 6) for value in coords)
+            if target_type == 'job':
+                obj.geohash = encode_geohash(obj.latitude, obj.longitude)
+            located.append(obj)
+        if not dry_run:
+            model.objects.bulk_update(located, fields)
+            # The queue has nothing left to do for these
+            GeocodeRequest.objects.filter(
+                target_type=target_type, target_id__in=[obj.pk for obj in located]
+            ).delete()
+        return len(located), missing
@@ -0,0 +1,46 @@
+"""
+Management command to geocode queued job and profile locations
+"""
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection
+from jobs.geocoding import process_geocode_requests, prune_geocode_cache, get_geocoder
+
+
+class Command(BaseCommand):
+    help = 'Look up coordinates for jobs and profiles saved with a location but no latitude/longitude (run a single worker; lookups are rate-limited)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep polling for new requests instead of exiting when the queue is empty',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=10,
+            help='Seconds between polls with --loop',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            help='Process at most this many requests per poll',
+        )
+
+    def handle(self, *args, **options):
+        geocoder = get_geocoder()
+        while True:
+            prune_geocode_cache()
+            located, not_found, failed = process_geocode_requests(geocoder, limit=options.get('limit'))
+            if located or not_found or failed:
+                style = self.style.WARNING if failed else self.style.SUCCESS
+                self.stdout.write(style(
+                    f'Geocoded {located} location(s); {not_found} not found, {failed} failed (will retry)'
+                ))
+
+            if not options['loop']:
+                return
+            # Don't hold a connection open while idle
+            connection.close()
+            time.sleep(options['interval'])
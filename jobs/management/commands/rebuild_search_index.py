@@ -0,0 +1,22 @@
+"""
+Management command to rebuild the full-text search indexes
+"""
+from django.core.management.base import BaseCommand
+from jobs.search import registry, get_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild full-text search indexes (needed after bulk updates that skip signals)'
+
+    def handle(self, *args, **options):
+        for index in registry:
+            index.rebuild_documents()
+            backend = get_backend(index)
+            if backend.name != 'sqlite':
+                self.stdout.write(f'{index.model.__name__}: {backend.name} backend searches live data, nothing to rebuild')
+                continue
+            backend.create()
+            count = backend.rebuild()
+            self.stdout.write(f'{index.model.__name__}: indexed {count} row(s)')
+
+        self.stdout.write(self.style.SUCCESS('Search indexes rebuilt.'))
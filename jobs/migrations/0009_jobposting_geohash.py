@@ -0,0 +1,29 @@
+# Generated by Django 5.0 on 2026-10-17 06:27
+
+from django.db import migrations, models
+
+from jobs.spatial import encode_geohash
+
+
+def populate_geohash(apps, schema_editor):
+    JobPosting = apps.get_model('jobs', 'JobPosting')
+    jobs = JobPosting.objects.filter(latitude__isnull=False, longitude__isnull=False)
+    for job in jobs.only('id', 'latitude', 'longitude').iterator():
+        job.geohash = encode_geohash(job.latitude, job.longitude)
+        job.save(update_fields=['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0008_remove_jobposting_jobs_jobpos_moderat_3d688a_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobposting',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='Spatial index cell derived from latitude/longitude', max_length=12),
+        ),
+        migrations.RunPython(populate_geohash, migrations.RunPython.noop),
+    ]
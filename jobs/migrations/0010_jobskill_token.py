@@ -0,0 +1,32 @@
+# Generated by Django 5.0 on 2026-10-17 06:30
+
+from django.db import migrations, models
+
+from jobs.skill_index import normalize_skill
+
+
+def populate_tokens(apps, schema_editor):
+    JobSkill = apps.get_model('jobs', 'JobSkill')
+    for skill in JobSkill.objects.only('id', 'name').iterator():
+        skill.token = normalize_skill(skill.name)
+        skill.save(update_fields=['token'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0009_jobposting_geohash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobskill',
+            name='token',
+            field=models.CharField(blank=True, editable=False, help_text='Normalized skill name used by the recommendation index', max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name='jobskill',
+            index=models.Index(fields=['token', 'job'], name='jobs_jobski_token_bdf0b2_idx'),
+        ),
+        migrations.RunPython(populate_tokens, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.0 on 2026-10-17 09:12
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    # Only SQLite needs a side table; other databases search natively
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS jobs_jobposting_fts "
+        "USING fts5(title, company, description, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    )
+    schema_editor.execute(
+        "INSERT INTO jobs_jobposting_fts (rowid, title, company, description) "
+        "SELECT id, title, company, description FROM jobs_jobposting"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS jobs_jobposting_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0010_jobskill_token'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
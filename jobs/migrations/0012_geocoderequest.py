@@ -0,0 +1,29 @@
+# Generated by Django 5.0 on 2026-10-17 07:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0011_jobposting_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeocodeRequest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('target_type', models.CharField(choices=[('job', 'Job Posting'), ('profile', 'Job Seeker Profile')], max_length=20)),
+                ('target_id', models.PositiveIntegerField()),
+                ('requested_at', models.DateTimeField(auto_now_add=True)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['requested_at'],
+                'unique_together': {('target_type', 'target_id')},
+            },
+        ),
+    ]
@@ -2,6 +2,8 @@ from django.db import models
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
+from .spatial import encode_geohash
+from .skill_index import normalize_skill
 
 User = get_user_model()
 
@@ -45,6 +47,7 @@ class JobPosting(models.Model):
     location = models.CharField(max_length=200, blank=True)
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True, help_text="Latitude coordinate")
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True, help_text="Longitude coordinate")
+    geohash = models.CharField(max_length=12, blank=True, db_index=True, editable=False, help_text="Spatial index cell derived from latitude/longitude")
     work_location = models.CharField(max_length=20, choices=WORK_LOCATIONS, default='on_site')
     employment_type = models.CharField(max_length=20, choices=EMPLOYMENT_TYPES, default='full_time')
     experience_level = models.CharField(max_length=20, choices=EXPERIENCE_LEVELS, default='mid')
@@ -99,6 +102,14 @@ class JobPosting(models.Model):
     def __str__(self):
         return f"{self.title} at {self.company}"
     
+    def save(self, *args, **kwargs):
+        # Keep the spatial index cell in sync with the coordinates
+        self.geohash = encode_geohash(self.latitude, self.longitude)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'geohash'}
+        super().save(*args, **kwargs)
+    
     @property
     def is_expired(self):
         if self.application_deadline:
@@ -118,15 +129,27 @@ class JobPosting(models.Model):
 class JobSkill(models.Model):
     job = models.ForeignKey(JobPosting, on_delete=models.CASCADE, related_name='required_skills')
     name = models.CharField(max_length=100)
+    token = models.CharField(max_length=100, blank=True, editable=False, help_text="Normalized skill name used by the recommendation index")
     is_required = models.BooleanField(default=True)
     years_experience = models.PositiveIntegerField(null=True, blank=True)
     
     class Meta:
         unique_together = ['job', 'name']
         ordering = ['-is_required', 'name']
+        indexes = [
+            models.Index(fields=['token', 'job']),
+        ]
     
     def __str__(self):
         return f"{self.name} for {self.job.title}"
+    
+    def save(self, *args, **kwargs):
+        # Keep the inverted index token in sync with the skill name
+        self.token = normalize_skill(self.name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'name' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'token'}
+        super().save(*args, **kwargs)
 
 class JobApplication(models.Model):
     APPLICATION_STATUS = [
@@ -189,4 +212,43 @@ class ApplicationStatusHistory(models.Model):
     
     class Meta:
         verbose_name_plural = "Application Status Histories"
-        ordering = ['-changed_at']
\ No newline at end of file
+        ordering = ['-changed_at']
+
+
+class GeocodeRequest(models.Model):
+    """Pending coordinate lookup for a job or profile location, drained by process_geocode_queue"""
+    TARGET_TYPES = [
+        ('job', 'Job Posting'),
+        ('profile', 'Job Seeker Profile'),
+    ]
+    
+    target_type = models.CharField(max_length=20, choices=TARGET_TYPES)
+    target_id = models.PositiveIntegerField()
+    requested_at = models.DateTimeField(auto_now_add=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # Failed lookups are retried with a backoff
+    next_attempt_at = models.DateTimeField(default=timezone.now, db_index=True)
+    
+    class Meta:
+        unique_together = ['target_type', 'target_id']
+        ordering = ['requested_at']
+    
+    def __str__(self):
+        return f"Geocode {self.target_type} {self.target_id}"
+
+
+class GeocodeCache(models.Model):
+    """Geocoder result for a normalized address; null coordinates record an address that wasn't found"""
+    address_key = models.CharField(max_length=255, unique=True)
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField(db_index=True)
+    
+    class Meta:
+        verbose_name_plural = "Geocode Cache"
+    
+    def __str__(self):
+        if self.latitude is None:
+            return f"{self.address_key}: not found"
+        return f"{self.address_key}: {self.latitude}, {self.longitude}"
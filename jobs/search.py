@@ -0,0 +1,365 @@
+"""
+Pluggable full-text search.
+
+A SearchIndex describes which text columns of a model are searchable and
+how heavily each one counts towards relevance. The backend doing the
+actual work is picked from the database in use (or the SEARCH_BACKEND
+setting):
+
+- ``sqlite``: an FTS5 virtual table per index, kept in sync by signals,
+  ranked with bm25()
+- ``postgresql``: the native tsvector engine via django.contrib.postgres
+- ``simple``: chained icontains filters with no ranking, for any other
+  database
+
+Every backend supports prefix matching (``pyth`` finds "Python"), orders
+results by relevance (``search_rank``, higher is better) and can produce
+highlighted snippets for a page of results.
+"""
+import re
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+# Snippet markers; control characters never occur in user text and survive escape()
+_HIGHLIGHT_START = '\x02'
+_HIGHLIGHT_END = '\x03'
+
+# Approximate number of words in a snippet
+SNIPPET_WORDS = 24
+
+_TERM = re.compile(r'\w+')
+
+
+def parse_terms(query):
+    """Split a free-text query into lowercase search terms"""
+    return [term.lower() for term in _TERM.findall(query or '')]
+
+
+def _render_snippet(text):
+    """Escape a marked-up snippet and turn the markers into <mark> tags"""
+    html = escape(text).replace(_HIGHLIGHT_START, '<mark>').replace(_HIGHLIGHT_END, '</mark>')
+    return mark_safe(html)
+
+
+class SearchIndex:
+    """
+    Describes the full-text index of one model.
+
+    Subclasses set ``model``, ``table`` (name of the FTS table on SQLite),
+    ``columns`` as (model field, weight) pairs and ``snippet_column``.
+    ``lookup_prefix`` is prepended to the column names when the searched
+    queryset is a related model that shares the indexed model's primary
+    key (e.g. a profile searched through its one-to-one search document).
+    """
+    model = None
+    table = None
+    columns = ()
+    snippet_column = None
+    lookup_prefix = ''
+
+    @property
+    def field_names(self):
+        return [field for field, _ in self.columns]
+
+    def document(self, instance):
+        """Return the column values indexed for an instance"""
+        return [getattr(instance, field) or '' for field in self.field_names]
+
+    def get_queryset(self):
+        """Instances included when the index is rebuilt"""
+        return self.model._default_manager.all()
+
+    def rebuild_documents(self):
+        """Regenerate the indexed rows themselves, for denormalized indexes"""
+        pass
+
+
+class SimpleBackend:
+    """Substring matching for databases without a full-text engine"""
+    name = 'simple'
+
+    def __init__(self, index):
+        self.index = index
+
+    def create(self):
+        pass
+
+    def update(self, instance):
+        pass
+
+    def remove(self, pk):
+        pass
+
+    def rebuild(self):
+        return 0
+
+    def search(self, queryset, query):
+        terms = parse_terms(query) or [query.strip()]
+        for term in terms:
+            condition = Q()
+            for field in self.index.field_names:
+                condition |= Q(**{f'{self.index.lookup_prefix}{field}__icontains': term})
+            queryset = queryset.filter(condition)
+        return queryset
+
+    def snippets(self, pks, query):
+        terms = parse_terms(query)
+        if not terms:
+            return {}
+        pattern = re.compile('|'.join(re.escape(term) for term in terms), re.IGNORECASE)
+        snippets = {}
+        field = self.index.snippet_column
+        for pk, text in self.index.model._default_manager.filter(pk__in=pks).values_list('pk', field):
+            words = (text or '').split()
+            first = next((i for i, word in enumerate(words) if pattern.search(word)), None)
+            if first is None:
+                continue
+            start = max(0, first - SNIPPET_WORDS // 4)
+            window = ' '.join(words[start:start + SNIPPET_WORDS])
+            marked = pattern.sub(lambda m: f'{_HIGHLIGHT_START}{m.group(0)}{_HIGHLIGHT_END}', window)
+            prefix = '…' if start > 0 else ''
+            suffix = '…' if start + SNIPPET_WORDS < len(words) else ''
+            snippets[pk] = _render_snippet(f'{prefix}{marked}{suffix}')
+        return snippets
+
+
+class SQLiteFTSBackend:
+    """FTS5 virtual table, one row per instance with rowid = primary key"""
+    name = 'sqlite'
+
+    def __init__(self, index):
+        self.index = index
+
+    @property
+    def _column_list(self):
+        return ', '.join(self.index.field_names)
+
+    def create(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.index.table} "
+                f"USING fts5({self._column_list}, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+            )
+
+    @property
+    def _insert_sql(self):
+        placeholders = ', '.join(['%s'] * (len(self.index.columns) + 1))
+        return f'INSERT INTO {self.index.table} (rowid, {self._column_list}) VALUES ({placeholders})'
+
+    def update(self, instance):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.index.table} WHERE rowid = %s', [instance.pk])
+            cursor.execute(self._insert_sql, [instance.pk, *self.index.document(instance)])
+
+    def remove(self, pk):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.index.table} WHERE rowid = %s', [pk])
+
+    def rebuild(self, batch_size=1000):
+        count = 0
+        batch = []
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.index.table}')
+            for instance in self.index.get_queryset().iterator(chunk_size=batch_size):
+                batch.append([instance.pk, *self.index.document(instance)])
+                if len(batch) >= batch_size:
+                    cursor.executemany(self._insert_sql, batch)
+                    count += len(batch)
+                    batch = []
+            if batch:
+                cursor.executemany(self._insert_sql, batch)
+                count += len(batch)
+        return count
+
+    def _match_expression(self, terms):
+        # Each term is quoted (so FTS5 operators in user input are inert)
+        # and prefix-matched; terms are implicitly ANDed
+        return ' '.join(f'"{term}"*' for term in terms)
+
+    def search(self, queryset, query):
+        terms = parse_terms(query)
+        if not terms:
+            return SimpleBackend(self.index).search(queryset, query)
+
+        table = self.index.table
+        match = self._match_expression(terms)
+        weights = ', '.join(str(weight) for _, weight in self.index.columns)
+        pk_column = f'{queryset.model._meta.db_table}.{queryset.model._meta.pk.column}'
+        ordering = queryset.query.order_by or queryset.model._meta.ordering
+
+        # bm25() is lower-is-better, so negate it to get a descending rank
+        return queryset.filter(
+            pk__in=RawSQL(f'SELECT rowid FROM {table} WHERE {table} MATCH %s', [match])
+        ).annotate(
+            search_rank=RawSQL(
+                f'SELECT -bm25({table}, {weights}) FROM {table} WHERE {table} MATCH %s AND rowid = {pk_column}',
+                [match],
+            )
+        ).order_by('-search_rank', *ordering)
+
+    def snippets(self, pks, query):
+        terms = parse_terms(query)
+        pks = list(pks)
+        if not terms or not pks:
+            return {}
+
+        table = self.index.table
+        column = self.index.field_names.index(self.index.snippet_column)
+        in_list = ', '.join(['%s'] * len(pks))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid, snippet({table}, {column}, %s, %s, '…', %s) FROM {table} "
+                f"WHERE {table} MATCH %s AND rowid IN ({in_list})",
+                [_HIGHLIGHT_START, _HIGHLIGHT_END, SNIPPET_WORDS, self._match_expression(terms), *pks],
+            )
+            return {
+                pk: _render_snippet(snippet)
+                for pk, snippet in cursor.fetchall()
+                if _HIGHLIGHT_START in snippet
+            }
+
+
+class PostgresBackend:
+    """Native tsvector search; vectors are computed by the database on the fly"""
+    name = 'postgresql'
+
+    # Postgres supports four weight classes, most important first
+    _WEIGHT_CLASSES = 'ABCD'
+
+    def __init__(self, index):
+        self.index = index
+
+    def create(self):
+        pass
+
+    def update(self, instance):
+        pass
+
+    def remove(self, pk):
+        pass
+
+    def rebuild(self):
+        return 0
+
+    def _query(self, terms):
+        from django.contrib.postgres.search import SearchQuery
+        return SearchQuery(' & '.join(f'{term}:*' for term in terms), search_type='raw')
+
+    def _vector(self):
+        from django.contrib.postgres.search import SearchVector
+        ranked = sorted(self.index.columns, key=lambda column: -column[1])
+        vector = None
+        for position, (field, _) in enumerate(ranked):
+            part = SearchVector(f'{self.index.lookup_prefix}{field}', weight=self._WEIGHT_CLASSES[min(position, 3)])
+            vector = part if vector is None else vector + part
+        return vector
+
+    def search(self, queryset, query):
+        from django.contrib.postgres.search import SearchRank
+
+        terms = parse_terms(query)
+        if not terms:
+            return SimpleBackend(self.index).search(queryset, query)
+
+        search_query = self._query(terms)
+        ordering = queryset.query.order_by or queryset.model._meta.ordering
+        return queryset.annotate(
+            search_vector=self._vector(),
+        ).filter(search_vector=search_query).annotate(
+            search_rank=SearchRank(self._vector(), search_query),
+        ).order_by('-search_rank', *ordering)
+
+    def snippets(self, pks, query):
+        from django.contrib.postgres.search import SearchHeadline
+
+        terms = parse_terms(query)
+        if not terms:
+            return {}
+        headlines = self.index.model._default_manager.filter(pk__in=list(pks)).annotate(
+            headline=SearchHeadline(
+                self.index.snippet_column,
+                self._query(terms),
+                start_sel=_HIGHLIGHT_START,
+                stop_sel=_HIGHLIGHT_END,
+                max_words=SNIPPET_WORDS,
+            )
+        ).values_list('pk', 'headline')
+        return {
+            pk: _render_snippet(headline)
+            for pk, headline in headlines
+            if _HIGHLIGHT_START in headline
+        }
+
+
+# Every index known to rebuild_search_index
+registry = []
+
+
+def register(index):
+    """Add an index to the registry and return it"""
+    registry.append(index)
+    return index
+
+
+BACKENDS = {
+    'sqlite': SQLiteFTSBackend,
+    'postgresql': PostgresBackend,
+    'simple': SimpleBackend,
+}
+
+
+def get_backend(index):
+    """Return the search backend for an index based on settings/database"""
+    name = getattr(settings, 'SEARCH_BACKEND', None) or connection.vendor
+    return BACKENDS.get(name, SimpleBackend)(index)
+
+
+def search(queryset, query, index):
+    """
+    Filter a queryset to full-text matches for ``query``, best first.
+
+    Results are annotated with ``search_rank`` where the backend ranks;
+    the queryset's previous ordering breaks ties.
+    """
+    return get_backend(index).search(queryset, query)
+
+
+def highlight(objects, query, index):
+    """
+    Attach a highlighted ``search_snippet`` to each object that has one.
+
+    Meant for a single page of results; runs one query.
+    """
+    objects = list(objects)
+    snippets = get_backend(index).snippets([obj.pk for obj in objects], query)
+    for obj in objects:
+        obj.search_snippet = snippets.get(obj.pk, '')
+    return objects
+
+
+class JobPostingIndex(SearchIndex):
+    table = 'jobs_jobposting_fts'
+    columns = (('title', 10.0), ('company', 5.0), ('description', 1.0))
+    snippet_column = 'description'
+
+    @property
+    def model(self):
+        from .models import JobPosting
+        return JobPosting
+
+
+job_index = register(JobPostingIndex())
+
+
+def search_jobs(queryset, query):
+    """Full-text search over job title, company and description"""
+    return search(queryset, query, job_index)
+
+
+def highlight_jobs(jobs, query):
+    """Attach description snippets with the query terms highlighted"""
+    return highlight(jobs, query, job_index)
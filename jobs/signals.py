@@ -1,7 +1,28 @@
 from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
 from django.urls import reverse
-from .models import JobApplication, ApplicationStatusHistory
+from .models import JobPosting, JobApplication, ApplicationStatusHistory
+from .search import job_index, get_backend
+from .geocoding import apply_cached_coordinates, needs_geocoding, request_geocode
+from profiles.models import JobSeekerProfile
+
+
+@receiver(post_save, sender=JobPosting)
+def count_job_posting(sender, instance, created, **kwargs):
+    """Add a new posting to today's usage metrics"""
+    if created:
+        from profiles.metrics import record_metric
+        from profiles.models import DailyMetric
+        record_metric(DailyMetric.JOB_POSTINGS, instance.posted_at)
+
+
+@receiver(post_save, sender=JobApplication)
+def count_application(sender, instance, created, **kwargs):
+    """Add a new application to today's usage metrics"""
+    if created:
+        from profiles.metrics import record_metric
+        from profiles.models import DailyMetric
+        record_metric(DailyMetric.APPLICATIONS, instance.applied_at)
 
 @receiver(post_save, sender=JobApplication)
 def update_application_count_on_create(sender, instance, created, **kwargs):
@@ -87,3 +108,27 @@ def track_status_change(sender, instance, **kwargs):
             job_application=instance,
             job_posting=instance.job
         )
+
+
+@receiver(post_save, sender=JobPosting)
+def update_job_search_index(sender, instance, update_fields=None, **kwargs):
+    """Keep the full-text index in sync with a job's searchable text"""
+    if update_fields is not None and not set(job_index.field_names) & set(update_fields):
+        return
+    get_backend(job_index).update(instance)
+
+
+@receiver(post_delete, sender=JobPosting)
+def remove_job_from_search_index(sender, instance, **kwargs):
+    """Drop a deleted job from the full-text index"""
+    get_backend(job_index).remove(instance.pk)
+
+
+@receiver(post_save, sender=JobPosting)
+@receiver(post_save, sender=JobSeekerProfile)
+def queue_geocoding(sender, instance, update_fields=None, **kwargs):
+    """Geocode a job or profile saved with a location but no coordinates, from the cache or the queue"""
+    if update_fields is not None and not {'location', 'latitude', 'longitude'} & set(update_fields):
+        return
+    if needs_geocoding(instance) and not apply_cached_coordinates(instance):
+        request_geocode('job' if sender is JobPosting else 'profile', instance.pk)
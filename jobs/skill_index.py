@@ -0,0 +1,151 @@
+"""
+Inverted skill index for job recommendations.
+
+Each JobSkill row stores a normalized ``token`` of its name (kept current
+in JobSkill.save) and the (token, job) pair is indexed, so the table acts
+as an inverted index from skill token to the jobs that list it. Ranking
+a seeker's recommendations then only touches the posting lists of tokens
+the seeker actually shares with a job:
+
+1. exact tokens: the seeker's own normalized skills
+2. partial tokens: indexed tokens that contain, or are contained in, one
+   of the seeker's skills (found by scanning the distinct vocabulary,
+   which is far smaller than the job table)
+3. the posting lists for those tokens are merged into per-job scores and
+   the top k are picked with a heap
+"""
+import heapq
+import re
+from collections import defaultdict
+
+# Weight of a skill in a job's match score
+REQUIRED_WEIGHT = 1.0
+OPTIONAL_WEIGHT = 0.5
+
+# Credit given for a partial (substring) match relative to an exact one
+PARTIAL_MATCH_CREDIT = 0.5
+
+# Score given to jobs that list no skills at all
+NO_SKILLS_SCORE = 0.1
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_skill(name):
+    """Normalize a skill name into its index token"""
+    return _WHITESPACE.sub(' ', (name or '').strip().lower())
+
+
+def expand_tokens(user_tokens, vocabulary):
+    """
+    Split the indexed vocabulary into exact and partial matches for a seeker.
+
+    Returns:
+        tuple: (exact tokens, partial tokens) drawn from ``vocabulary``
+    """
+    exact = user_tokens & vocabulary
+    partial = {
+        token for token in vocabulary - exact
+        if any(user_token in token or token in user_token for user_token in user_tokens)
+    }
+    return exact, partial
+
+
+def score_skills(job_skills, exact_tokens, partial_tokens):
+    """
+    Score one job's skills against a seeker's matching tokens.
+
+    Args:
+        job_skills: Iterable of (name, token, is_required) tuples
+        exact_tokens: Tokens the seeker has exactly
+        partial_tokens: Tokens that partially match one of the seeker's skills
+
+    Returns:
+        dict: match breakdown in the shape the recommendation templates use,
+        plus the raw ``score`` in [0, 1]
+    """
+    matched_skills = []
+    partial_matches = []
+    missing_skills = []
+    earned = 0.0
+    possible = 0.0
+
+    for name, token, is_required in job_skills:
+        weight = REQUIRED_WEIGHT if is_required else OPTIONAL_WEIGHT
+        possible += weight
+        if token in exact_tokens:
+            matched_skills.append(name)
+            earned += weight
+        elif token in partial_tokens:
+            partial_matches.append(name)
+            earned += weight * PARTIAL_MATCH_CREDIT
+        else:
+            missing_skills.append(name)
+
+    score = earned / possible if possible else NO_SKILLS_SCORE
+    return {
+        'matched_skills': matched_skills,
+        'partial_matches': partial_matches,
+        'missing_skills': missing_skills,
+        'match_percentage': round(score * 100, 1),
+        'total_required': len(matched_skills) + len(partial_matches) + len(missing_skills),
+        'score': score,
+    }
+
+
+def recommend_jobs(user_skills, limit=10, exclude_job_ids=()):
+    """
+    Rank active, published jobs by how well they match a seeker's skills.
+
+    Args:
+        user_skills: The seeker's skill names
+        limit: Number of recommendations to return
+        exclude_job_ids: Jobs to leave out (e.g. ones already applied to)
+
+    Returns:
+        tuple: (list of (job_id, score) best first, {job_id: match info})
+
+    If fewer than ``limit`` jobs share a skill with the seeker, the most
+    recent jobs that list no skills fill the remaining slots.
+    """
+    from .models import JobPosting, JobSkill
+
+    exclude_job_ids = set(exclude_job_ids)
+    user_tokens = {normalize_skill(skill) for skill in user_skills} - {''}
+    live_skills = JobSkill.objects.filter(job__is_active=True, job__status='published')
+
+    vocabulary = set(live_skills.values_list('token', flat=True).distinct())
+    exact_tokens, partial_tokens = expand_tokens(user_tokens, vocabulary)
+
+    # Merge the posting lists of every matching token into per-job skill lists
+    job_skills = defaultdict(list)
+    if exact_tokens or partial_tokens:
+        candidate_ids = live_skills.filter(
+            token__in=exact_tokens | partial_tokens
+        ).exclude(job_id__in=exclude_job_ids).values('job_id').distinct()
+        for job_id, name, token, is_required in JobSkill.objects.filter(
+            job_id__in=candidate_ids
+        ).values_list('job_id', 'name', 'token', 'is_required'):
+            job_skills[job_id].append((name, token, is_required))
+
+    match_info = {
+        job_id: score_skills(skills, exact_tokens, partial_tokens)
+        for job_id, skills in job_skills.items()
+    }
+    # Newer jobs (higher ids) win ties
+    ranked = heapq.nlargest(
+        limit,
+        ((info['score'], job_id) for job_id, info in match_info.items()),
+    )
+    top = [(job_id, score) for score, job_id in ranked]
+
+    if len(top) < limit:
+        fillers = JobPosting.objects.filter(
+            is_active=True, status='published', required_skills__isnull=True
+        ).exclude(id__in=exclude_job_ids).order_by('-posted_at').values_list('id', flat=True)[:limit - len(top)]
+        for job_id in fillers:
+            match_info[job_id] = score_skills([], exact_tokens, partial_tokens)
+            top.append((job_id, NO_SKILLS_SCORE))
+        top.sort(key=lambda item: item[1], reverse=True)
+
+    return top, {job_id: match_info[job_id] for job_id, _ in top}
@@ -0,0 +1,203 @@
+"""
+Spatial index for radius searches over job postings.
+
+Every JobPosting stores a geohash of its coordinates (kept current in
+JobPosting.save). A radius search is answered entirely in SQL:
+
+1. index range scans over the geohash cells that cover the search circle
+2. a latitude/longitude bounding-box filter on those candidates
+3. the exact haversine distance, computed only for the rows that remain
+
+The resulting queryset is annotated with ``distance`` (miles), ordered
+nearest first and stays lazy, so it can be handed straight to a Paginator.
+"""
+import math
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import ASin, Cast, Cos, Power, Radians, Sin, Sqrt
+
+# Radius of earth in miles
+EARTH_RADIUS_MILES = 3959
+
+# Precision stored on JobPosting.geohash (~5m x 5m cells)
+GEOHASH_PRECISION = 9
+
+# Upper bound on the number of cells a single radius query may scan
+MAX_COVERING_CELLS = 16
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+# Sorts immediately after the last base32 character ('z'), so
+# [cell, cell + _UPPER_BOUND) is the range of every geohash with that prefix
+_UPPER_BOUND = '{'
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    """
+    Encode a coordinate pair as a geohash string.
+
+    Returns an empty string when either coordinate is missing so that
+    postings without a location never fall inside a cell range.
+    """
+    if latitude is None or longitude is None:
+        return ''
+
+    latitude, longitude = float(latitude), float(longitude)
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    bit_count = 0
+    even = True
+
+    while len(geohash) < precision:
+        if even:
+            mid = (lon_range[0] + lon_range[1]) / 2
+            if longitude >= mid:
+                bits = (bits << 1) | 1
+                lon_range[0] = mid
+            else:
+                bits = bits << 1
+                lon_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= mid:
+                bits = (bits << 1) | 1
+                lat_range[0] = mid
+            else:
+                bits = bits << 1
+                lat_range[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(_BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return ''.join(geohash)
+
+
+def _cell_size(precision):
+    """Return the (lat, lon) size in degrees of a geohash cell"""
+    total_bits = precision * 5
+    lon_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lon_bits)
+
+
+def bounding_box(latitude, longitude, radius_miles):
+    """
+    Return (min_lat, max_lat, min_lon, max_lon) enclosing a search circle.
+
+    Near the poles or across the antimeridian the longitude span is widened
+    to the full [-180, 180] range rather than split into two boxes.
+    """
+    lat_delta = math.degrees(radius_miles / EARTH_RADIUS_MILES)
+    min_lat = max(latitude - lat_delta, -90.0)
+    max_lat = min(latitude + lat_delta, 90.0)
+
+    cos_lat = math.cos(math.radians(latitude))
+    if min_lat <= -90.0 or max_lat >= 90.0 or cos_lat <= 0:
+        return min_lat, max_lat, -180.0, 180.0
+
+    lon_delta = lat_delta / cos_lat
+    min_lon = longitude - lon_delta
+    max_lon = longitude + lon_delta
+    if min_lon < -180.0 or max_lon > 180.0:
+        return min_lat, max_lat, -180.0, 180.0
+
+    return min_lat, max_lat, min_lon, max_lon
+
+
+def covering_cells(min_lat, max_lat, min_lon, max_lon):
+    """
+    Return the geohash cells covering a bounding box.
+
+    Picks the finest precision whose cover stays within MAX_COVERING_CELLS.
+    Returns None when no useful cover exists (e.g. the box spans the globe),
+    meaning the caller should rely on the bounding box alone.
+    """
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        lat_size, lon_size = _cell_size(precision)
+        lat_start = math.floor((min_lat + 90.0) / lat_size)
+        lat_end = math.floor((max_lat + 90.0) / lat_size)
+        lon_start = math.floor((min_lon + 180.0) / lon_size)
+        lon_end = math.floor((max_lon + 180.0) / lon_size)
+
+        if (lat_end - lat_start + 1) * (lon_end - lon_start + 1) > MAX_COVERING_CELLS:
+            continue
+
+        cells = set()
+        for lat_index in range(lat_start, lat_end + 1):
+            for lon_index in range(lon_start, lon_end + 1):
+                # Encode the centre of each cell to get its prefix
+                cell_lat = min(-90.0 + (lat_index + 0.5) * lat_size, 90.0)
+                cell_lon = min(-180.0 + (lon_index + 0.5) * lon_size, 180.0)
+                cells.add(encode_geohash(cell_lat, cell_lon, precision))
+        return sorted(cells)
+
+    return None
+
+
+def haversine_expression(latitude, longitude, lat_field='latitude', lon_field='longitude'):
+    """Build a database expression for the great circle distance in miles"""
+    lat1 = Radians(Value(float(latitude)))
+    lon1 = Radians(Value(float(longitude)))
+    lat2 = Radians(Cast(F(lat_field), FloatField()))
+    lon2 = Radians(Cast(F(lon_field), FloatField()))
+
+    a = (
+        Power(Sin((lat2 - lat1) / 2), 2)
+        + Cos(lat1) * Cos(lat2) * Power(Sin((lon2 - lon1) / 2), 2)
+    )
+    return Value(2.0 * EARTH_RADIUS_MILES) * ASin(Sqrt(a), output_field=FloatField())
+
+
+def cells_filter(cells, field_prefix=''):
+    """Build the index range scans matching every geohash inside ``cells``"""
+    condition = Q()
+    for cell in cells:
+        condition |= Q(**{
+            f'{field_prefix}geohash__gte': cell,
+            f'{field_prefix}geohash__lt': cell + _UPPER_BOUND,
+        })
+    return condition
+
+
+def radius_filter(latitude, longitude, radius_miles, field_prefix=''):
+    """
+    Build the indexed prefilter for a radius search.
+
+    Combines geohash cell range scans with a bounding box on the raw
+    coordinates. The returned Q does not include the exact distance check.
+    """
+    min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, radius_miles)
+    condition = Q(**{
+        f'{field_prefix}latitude__gte': min_lat,
+        f'{field_prefix}latitude__lte': max_lat,
+        f'{field_prefix}longitude__gte': min_lon,
+        f'{field_prefix}longitude__lte': max_lon,
+    })
+
+    cells = covering_cells(min_lat, max_lat, min_lon, max_lon)
+    if cells:
+        condition &= cells_filter(cells, field_prefix)
+
+    return condition
+
+
+def within_radius(queryset, latitude, longitude, radius_miles, include_unlocated=False):
+    """
+    Restrict a JobPosting queryset to postings within ``radius_miles``.
+
+    The queryset is annotated with ``distance`` and ordered nearest first.
+    When ``include_unlocated`` is True, postings without coordinates are
+    kept (with a null distance) and listed after the located ones.
+    """
+    latitude, longitude, radius_miles = float(latitude), float(longitude), float(radius_miles)
+
+    nearby = radius_filter(latitude, longitude, radius_miles) & Q(distance__lte=radius_miles)
+    if include_unlocated:
+        nearby |= Q(latitude__isnull=True) | Q(longitude__isnull=True)
+
+    return queryset.annotate(
+        distance=haversine_expression(latitude, longitude)
+    ).filter(nearby).order_by(F('distance').asc(nulls_last=True), '-posted_at')
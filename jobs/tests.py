@@ -1,3 +1,499 @@
-from django.test import TestCase
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from jobs.clustering import parse_bbox, viewport_page
+from jobs.gazetteer import Gazetteer, bounded_edit_distance, get_gazetteer
+from jobs.geo import coordinate_arrays, haversine_distances, k_nearest, within_radius_mask
+from jobs.geocoding import (
+    GeocodingError, StaticGeocoder, cached_geocode, lru_cache, normalize_address, process_geocode_requests,
+    resolve_address
+)
+from jobs.models import GeocodeCache, GeocodeRequest, JobPosting, JobSkill
+from jobs.search import highlight_jobs, search_jobs
+from jobs.skill_index import recommend_jobs
+from jobs.spatial import encode_geohash, within_radius
+from jobs.view_counter import ViewCounter, get_view_counts, view_counter
+from profiles.models import CustomUser, JobSeekerProfile
+
+
+class FailingGeocoder(StaticGeocoder):
+    def geocode(self, address):
+        raise GeocodingError('service unavailable')
+
+
+class GeocodeQueueTests(TestCase):
+    """Jobs and profiles saved without coordinates are geocoded by the queue worker"""
+
+    def setUp(self):
+        lru_cache.clear()
+        self.recruiter = CustomUser.objects.create_user('recruiter', 'recruiter@example.com', 'pw', user_type='recruiter')
+        self.geocoder = StaticGeocoder({
+            'San Francisco, CA': (37.7749, -122.4194),
+            'Austin, TX': (30.2672, -97.7431),
+        })
+
+    def create_job(self, location, **kwargs):
+        return JobPosting.objects.create(title='Engineer', location=location, posted_by=self.recruiter, **kwargs)
+
+    def test_saving_without_coordinates_queues_a_lookup(self):
+        job = self.create_job('San Francisco, CA')
+        self.create_job('Austin, TX', latitude=30.2672, longitude=-97.7431)
+        self.create_job('')
+        self.assertEqual(list(GeocodeRequest.objects.values_list('target_type', 'target_id')), [('job', job.id)])
+
+    def test_worker_stores_coordinates(self):
+        job = self.create_job('san francisco, ca')
+        seeker = CustomUser.objects.create_user('seeker', 'seeker@example.com', 'pw')
+        profile = JobSeekerProfile.objects.create(user=seeker, headline='Developer', location='Austin, TX')
+
+        self.assertEqual(process_geocode_requests(self.geocoder, sleep=lambda seconds: None), (2, 0, 0))
+        job.refresh_from_db()
+        profile.refresh_from_db()
+        self.assertEqual((float(job.latitude), float(job.longitude)), (37.7749, -122.4194))
+        self.assertTrue(job.geohash)
+        self.assertEqual((float(profile.latitude), float(profile.longitude)), (30.2672, -97.7431))
+        self.assertFalse(GeocodeRequest.objects.exists())
+
+    def test_lookups_are_rate_limited(self):
+        for location in ['San Francisco, CA', 'Austin, TX', 'Nowhere']:
+            self.create_job(location)
+        self.geocoder.min_interval = 1
+        waits = []
+        self.assertEqual(process_geocode_requests(self.geocoder, sleep=waits.append), (2, 1, 0))
+        self.assertEqual(len(self.geocoder.lookups), 3)
+        self.assertEqual(len(waits), 2)
+        self.assertTrue(all(0.9 < wait <= 1 for wait in waits))
+
+    def test_failed_lookup_is_retried_later(self):
+        job = self.create_job('San Francisco, CA')
+        self.assertEqual(process_geocode_requests(FailingGeocoder()), (0, 0, 1))
+        request = GeocodeRequest.objects.get(target_id=job.id)
+        self.assertEqual(request.attempts, 1)
+        # Not due yet
+        self.assertEqual(process_geocode_requests(self.geocoder), (0, 0, 0))
+        self.assertIsNone(JobPosting.objects.get(id=job.id).latitude)
+
+
+class GeocodeCacheTests(TestCase):
+    """Repeated addresses are answered from the cache instead of the geocoder"""
+
+    def setUp(self):
+        lru_cache.clear()
+        self.geocoder = StaticGeocoder({'San Francisco, CA': (37.7749, -122.4194)})
+
+    def test_normalized_keys(self):
+        self.assertEqual(normalize_address('  San Francisco,CA '), 'san francisco ca')
+        self.assertEqual(normalize_address('SAN-FRANCISCO   ca.'), 'san francisco ca')
+
+    def test_repeat_lookups_skip_the_geocoder(self):
+        for address in ['San Francisco, CA', 'san francisco ca', 'SAN FRANCISCO,  CA']:
+            self.assertEqual(resolve_address(address, self.geocoder), (37.7749, -122.4194))
+        self.assertEqual(len(self.geocoder.lookups), 1)
+        self.assertEqual(GeocodeCache.objects.get().address_key, 'san francisco ca')
+
+        # A new process (empty LRU) reads the table
+        lru_cache.clear()
+        self.assertEqual(resolve_address('San Francisco, CA', self.geocoder), (37.7749, -122.4194))
+        self.assertEqual(len(self.geocoder.lookups), 1)
+
+    def test_addresses_not_found_are_cached(self):
+        self.assertIsNone(resolve_address('Atlantis', self.geocoder))
+        self.assertIsNone(resolve_address('atlantis', self.geocoder))
+        self.assertEqual(len(self.geocoder.lookups), 1)
+
+    @override_settings(GEOCODER_BACKEND='static', GEOCODER_STATIC_LOCATIONS={'Acme HQ': (39.7817, -89.6501)})
+    def test_geocode_endpoint_falls_back_to_the_geocoder(self):
+        cache.clear()
+        user = CustomUser.objects.create_user('recruiter', 'recruiter@example.com', 'pw', user_type='recruiter')
+        self.client.force_login(user)
+        resolve_address('San Francisco, CA', self.geocoder)
+
+        with mock.patch.object(StaticGeocoder, 'geocode', autospec=True, side_effect=StaticGeocoder.geocode) as geocode:
+            for query, found in [('san francisco ca', True), ('Austin, TX', True), ('Acme HQ', True), ('Atlantis', False)]:
+                response = self.client.get(reverse('jobs:geocode_location'), {'q': query})
+                self.assertEqual(response.json()['success'], found, query)
+            # Cache and gazetteer hits don't reach the geocoder
+            self.assertEqual([call.args[1] for call in geocode.call_args_list], ['Acme HQ', 'Atlantis'])
+        self.assertEqual(cached_geocode('acme hq'), (39.7817, -89.6501))
+
+    @override_settings(GEOCODER_BACKEND='static')
+    def test_geocode_endpoint_limits_lookups_per_user(self):
+        cache.clear()
+        user = CustomUser.objects.create_user('recruiter', 'recruiter@example.com', 'pw', user_type='recruiter')
+        self.client.force_login(user)
+        with mock.patch('jobs.geocoding.USER_LOOKUPS_PER_MINUTE', 2):
+            responses = [
+                self.client.get(reverse('jobs:geocode_location'), {'q': f'Nowhere {index}'}).json()
+                for index in range(3)
+            ]
+            self.assertEqual([response['message'] for response in responses[:2]], ['Location not found'] * 2)
+            self.assertIn('Too many', responses[2]['message'])
+            # Cached answers don't count against the limit
+            self.assertEqual(self.client.get(reverse('jobs:geocode_location'), {'q': 'nowhere 0'}).json()['message'], 'Location not found')
+
+    def test_job_saved_with_a_cached_address_gets_coordinates(self):
+        resolve_address('San Francisco, CA', self.geocoder)
+        recruiter = CustomUser.objects.create_user('recruiter', 'recruiter@example.com', 'pw', user_type='recruiter')
+        job = JobPosting.objects.create(title='Engineer', location='san francisco, ca', posted_by=recruiter)
+        job.refresh_from_db()
+        self.assertEqual((float(job.latitude), float(job.longitude)), (37.7749, -122.4194))
+        self.assertFalse(GeocodeRequest.objects.exists())
+
+
+class GazetteerTests(TestCase):
+    """Cities are resolved offline from the bundled gazetteer"""
+
+    def setUp(self):
+        lru_cache.clear()
+        self.gazetteer = get_gazetteer()
+
+    def assertPlace(self, address, name, admin_code):
+        place = self.gazetteer.lookup(address)
+        self.assertIsNotNone(place, address)
+        self.assertEqual((place.name, place.admin_code), (name, admin_code), address)
+
+    def test_exact_names(self):
+        self.assertPlace('Austin, TX', 'Austin', 'TX')
+        self.assertPlace('austin texas', 'Austin', 'TX')
+        self.assertPlace('Austin, TX, USA', 'Austin', 'TX')
+        self.assertPlace('Downtown Austin, TX 78701', 'Austin', 'TX')
+        self.assertPlace('NYC', 'New York', 'NY')
+
+    def test_ambiguous_names_prefer_the_most_populous_place(self):
+        self.assertPlace('Portland', 'Portland', 'OR')
+        self.assertPlace('Portland, ME', 'Portland', 'ME')
+
+    def test_prefix_and_typos(self):
+        self.assertPlace('Minneap', 'Minneapolis', 'MN')
+        self.assertPlace('San Fransisco, CA', 'San Francisco', 'CA')
+        self.assertPlace('Chicgo', 'Chicago', 'IL')
+
+    def test_unknown_places(self):
+        for address in [
+            'Remote', 'Anywhere', '', '12345',
+            'West Virginia', 'Northern Virginia', 'New Jersey', 'Upstate New York',
+            'Virginia', 'Indiana', 'Kansas', 'Jersey',
+        ]:
+            self.assertIsNone(self.gazetteer.lookup(address), address)
+
+    def test_bounded_edit_distance(self):
+        self.assertEqual(bounded_edit_distance('chicago', 'chicgo', 2), 1)
+        self.assertEqual(bounded_edit_distance('kitten', 'sitting', 3), 3)
+        self.assertEqual(bounded_edit_distance('austin', 'boston', 1), 2)
+
+    def test_extra_gazetteer_records(self):
+        from jobs.gazetteer import Place
+
+        gazetteer = Gazetteer([(Place('Springfield', 'IL', 'US', 39.8, -89.6, 100), ['Springfield'], ['IL', 'Illinois'])])
+        self.assertEqual(gazetteer.lookup('Springfield, Illinois').coords, (39.8, -89.6))
+        self.assertEqual(gazetteer.complete('spring')[0].name, 'Springfield')
+
+    def test_bulk_command_geocodes_existing_rows(self):
+        recruiter = CustomUser.objects.create_user('recruiter', 'recruiter@example.com', 'pw', user_type='recruiter')
+        job = JobPosting.objects.create(title='Engineer', location='Seattle, WA', posted_by=recruiter)
+        remote = JobPosting.objects.create(title='Engineer', location='Remote', posted_by=recruiter)
+        self.assertEqual(GeocodeRequest.objects.count(), 2)
+
+        call_command('geocode_locations', stdout=StringIO())
+        job.refresh_from_db()
+        remote.refresh_from_db()
+        self.assertAlmostEqual(float(job.latitude), 47.6062, places=2)
+        self.assertTrue(job.geohash.startswith('c23'))
+        self.assertIsNone(remote.latitude)
+        # Only the unresolved row is still queued for the network geocoder
+        self.assertEqual(list(GeocodeRequest.objects.values_list('target_id', flat=True)), [remote.pk])
+        self.assertEqual(GeocodeCache.objects.get().address_key, 'seattle wa')
+
+    def test_bulk_command_works_in_batches(self):
+        recruiter = CustomUser.objects.create_user('recruiter', 'recruiter@example.com', 'pw', user_type='recruiter')
+        jobs = [
+            JobPosting.objects.create(title='Engineer', location=location, posted_by=recruiter)
+            for location in ('Seattle, WA', 'Remote', 'Seattle, WA', 'Austin, TX', 'Remote')
+        ]
+        out = StringIO()
+        with mock.patch('jobs.management.commands.geocode_locations.BATCH_SIZE', 2):
+            call_command('geocode_locations', stdout=out)
+        self.assertIn('3 located, 2 unresolved', out.getvalue())
+        located = JobPosting.objects.filter(latitude__isnull=False).order_by('pk')
+        self.assertEqual(list(located), [jobs[0], jobs[2], jobs[3]])
+        self.assertEqual(
+            sorted(GeocodeRequest.objects.filter(target_type='job').values_list('target_id', flat=True)),
+            [jobs[1].pk, jobs[4].pk]
+        )
+
+
+class JobMapClusterTests(TestCase):
+    """The job map loads clustered markers for its viewport"""
+
+    def setUp(self):
+        self.recruiter = CustomUser.objects.create_user('recruiter', 'recruiter@example.com', 'pw', user_type='recruiter')
+        # Three jobs downtown, one across the bay, one in Austin
+        for latitude, longitude in [(37.7749, -122.4194), (37.7750, -122.4195), (37.7751, -122.4190), (37.8044, -122.2712)]:
+            self.create_job('San Francisco, CA', latitude, longitude)
+        self.austin = self.create_job('Austin, TX', 30.2672, -97.7431, employment_type='part_time')
+        self.client.force_login(self.recruiter)
+
+    def create_job(self, location, latitude, longitude, **kwargs):
+        return JobPosting.objects.create(
+            title='Engineer', location=location, latitude=latitude, longitude=longitude,
+            description='x' * 300, posted_by=self.recruiter, **kwargs
+        )
+
+    def clusters(self, bbox, zoom, **params):
+        response = self.client.get(reverse('jobs:job_map_clusters'), {'bbox': bbox, 'zoom': zoom, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_zoomed_out_jobs_are_clustered(self):
+        data = self.clusters('-130,20,-60,50', 4)
+        self.assertEqual(data['total'], 5)
+        self.assertEqual([cluster[2] for cluster in data['clusters']], [4])
+        self.assertEqual([marker[0] for marker in data['markers']], [self.austin.id])
+
+    def test_zoomed_in_jobs_are_markers(self):
+        data = self.clusters('-122.45,37.75,-122.38,37.79', 16)
+        self.assertEqual(data['clusters'], [])
+        self.assertEqual(len(data['markers']), 3)
+
+    def test_filters_apply(self):
+        data = self.clusters('-130,20,-60,50', 4, employment_type='part_time')
+        self.assertEqual(data['total'], 1)
+        data = self.clusters('-130,20,-60,50', 4, radius='25', user_lat='37.77', user_lon='-122.41')
+        self.assertEqual(data['total'], 4)
+
+    def test_bbox_and_zoom_are_required(self):
+        response = self.client.get(reverse('jobs:job_map_clusters'), {'bbox': 'nope', 'zoom': 4})
+        self.assertEqual(response.status_code, 400)
+
+    def test_markers_are_paged_with_a_cursor(self):
+        jobs = JobPosting.objects.all()
+        bbox = parse_bbox('-123,37,-122,38')
+        first, cursor = viewport_page(jobs, bbox, ('id', 'latitude', 'longitude'), limit=3)
+        second, last = viewport_page(jobs, bbox, ('id', 'latitude', 'longitude'), cursor=int(cursor), limit=3)
+        self.assertEqual((len(first), len(second), last), (3, 1, None))
+        self.assertEqual(first[0][1:], [37.7749, -122.4194])
+
+        response = self.client.get(reverse('jobs:job_map_markers'), {'bbox': '-130,20,-60,50', 'employment_type': 'part_time'})
+        self.assertEqual(response.json()['markers'], [[self.austin.id, 30.2672, -97.7431, 'Engineer', '']])
+
+    def test_marker_details(self):
+        response = self.client.get(reverse('jobs:job_map_marker', args=[self.austin.id]))
+        details = response.json()
+        self.assertEqual(details['location'], 'Austin, TX')
+        self.assertEqual(len(details['description']), 203)
+
+
+class SpatialIndexTests(TestCase):
+    """Radius searches go through the geohash kept on each posting"""
+
+    def setUp(self):
+        self.recruiter = CustomUser.objects.create_user('recruiter', 'recruiter@example.com', 'pw', user_type='recruiter')
+
+    def create_job(self, title, latitude=None, longitude=None):
+        return JobPosting.objects.create(
+            title=title, location=title, posted_by=self.recruiter, latitude=latitude, longitude=longitude
+        )
+
+    def test_geohash_follows_coordinates(self):
+        job = self.create_job('San Francisco', 37.7749, -122.4194)
+        self.assertEqual(job.geohash, '9q8yyk8yt')
+        self.assertEqual(JobPosting.objects.get(pk=job.pk).geohash, job.geohash)
+
+        job.latitude, job.longitude = 30.2672, -97.7431
+        job.save(update_fields=['latitude', 'longitude'])
+        self.assertEqual(JobPosting.objects.get(pk=job.pk).geohash, encode_geohash(30.2672, -97.7431))
+
+        job.latitude = job.longitude = None
+        job.save()
+        self.assertEqual(JobPosting.objects.get(pk=job.pk).geohash, '')
+
+    def test_within_radius_orders_by_distance(self):
+        oakland = self.create_job('Oakland', 37.8044, -122.2712)
+        san_francisco = self.create_job('San Francisco', 37.7749, -122.4194)
+        self.create_job('Los Angeles', 34.0522, -118.2437)
+        unlocated = self.create_job('Remote')
+
+        jobs = list(within_radius(JobPosting.objects.all(), 37.7749, -122.4194, 25))
+        self.assertEqual(jobs, [san_francisco, oakland])
+        self.assertAlmostEqual(jobs[0].distance, 0, places=3)
+        self.assertAlmostEqual(jobs[1].distance, 8.3, delta=0.5)
+
+        jobs = list(within_radius(JobPosting.objects.all(), 37.7749, -122.4194, 25, include_unlocated=True))
+        self.assertEqual(jobs, [san_francisco, oakland, unlocated])
+
+    def test_radius_edge(self):
+        # About 69 miles north of the origin
+        north = self.create_job('North', 38.7749, -122.4194)
+        self.assertEqual(list(within_radius(JobPosting.objects.all(), 37.7749, -122.4194, 68)), [])
+        self.assertEqual(list(within_radius(JobPosting.objects.all(), 37.7749, -122.4194, 70)), [north])
+
+
+class DistanceEngineTests(TestCase):
+    """NumPy distances match the scalar formula and skip missing coordinates"""
+
+    def setUp(self):
+        self.latitudes, self.longitudes = coordinate_arrays([
+            (Decimal('37.804400'), Decimal('-122.271200')),  # Oakland
+            (None, None),
+            (34.0522, -118.2437),  # Los Angeles
+            (37.7749, -122.4194),  # San Francisco
+        ])
+
+    def test_distances(self):
+        distances = haversine_distances(37.7749, -122.4194, self.latitudes, self.longitudes)
+        self.assertAlmostEqual(distances[0], 8.3, delta=0.5)
+        self.assertTrue(np.isnan(distances[1]))
+        self.assertAlmostEqual(distances[2], 347, delta=3)
+        self.assertAlmostEqual(distances[3], 0)
+
+    def test_within_radius_mask(self):
+        mask = within_radius_mask(37.7749, -122.4194, self.latitudes, self.longitudes, 25)
+        self.assertEqual(mask.tolist(), [True, False, False, True])
+
+    def test_k_nearest(self):
+        indices, distances = k_nearest(37.7749, -122.4194, self.latitudes, self.longitudes)
+        self.assertEqual(indices.tolist(), [3, 0, 2])
+        self.assertEqual(k_nearest(37.7749, -122.4194, self.latitudes, self.longitudes, k=2)[0].tolist(), [3, 0])
+        self.assertEqual(k_nearest(37.7749, -122.4194, self.latitudes, self.longitudes, radius_miles=25)[0].tolist(), [3, 0])
+        self.assertEqual(k_nearest(37.7749, -122.4194, self.latitudes, self.longitudes, k=0)[0].tolist(), [])
+
+
+class SkillIndexTests(TestCase):
+    """Job recommendations rank jobs through the JobSkill token index"""
+
+    def setUp(self):
+        self.recruiter = CustomUser.objects.create_user('recruiter', 'recruiter@example.com', 'pw', user_type='recruiter')
+
+    def create_job(self, title, required=(), optional=(), **kwargs):
+        job = JobPosting.objects.create(title=title, location='Remote', posted_by=self.recruiter, **kwargs)
+        for name in required:
+            JobSkill.objects.create(job=job, name=name)
+        for name in optional:
+            JobSkill.objects.create(job=job, name=name, is_required=False)
+        return job
+
+    def test_tokens_are_normalized(self):
+        job = self.create_job('Backend', required=['  Machine   Learning '])
+        self.assertEqual(job.required_skills.get().token, 'machine learning')
+
+    def test_ranking(self):
+        exact = self.create_job('Exact', required=['Python', 'Django'])
+        partial = self.create_job('Partial', required=['Python 3', 'Kubernetes'])
+        optional = self.create_job('Optional', required=['Rust'], optional=['Python'])
+        self.create_job('Unrelated', required=['COBOL'])
+        self.create_job('Draft', required=['Python'], status='draft')
+
+        top, info = recommend_jobs(['python', 'Django'])
+        self.assertEqual([job_id for job_id, score in top], [exact.id, optional.id, partial.id])
+        self.assertEqual(info[exact.id]['match_percentage'], 100.0)
+        self.assertEqual(info[partial.id]['partial_matches'], ['Python 3'])
+        self.assertEqual(info[optional.id]['missing_skills'], ['Rust'])
+
+    def test_exclusions_and_fillers(self):
+        applied = self.create_job('Applied', required=['Python'])
+        no_skills = self.create_job('No skills')
+        top, info = recommend_jobs(['Python'], exclude_job_ids=[applied.id])
+        self.assertEqual(top, [(no_skills.id, 0.1)])
+        self.assertEqual(info[no_skills.id]['total_required'], 0)
+
+
+class JobSearchTests(TestCase):
+    """Job search goes through the full-text index, best match first"""
+
+    def setUp(self):
+        self.recruiter = CustomUser.objects.create_user('recruiter', 'recruiter@example.com', 'pw', user_type='recruiter')
+        self.title_match = self.create_job('Python Developer', 'Build APIs.')
+        self.description_match = self.create_job('Backend Engineer', 'Services written in Python and Go.')
+        self.create_job('Designer', 'Figma and user research.')
+
+    def create_job(self, title, description, company='Acme'):
+        return JobPosting.objects.create(
+            title=title, description=description, company=company, location='Remote', posted_by=self.recruiter
+        )
+
+    def search(self, query):
+        return list(search_jobs(JobPosting.objects.all(), query))
+
+    def test_results_ranked_by_relevance(self):
+        self.assertEqual(self.search('python'), [self.title_match, self.description_match])
+
+    def test_prefix_and_all_terms(self):
+        self.assertEqual(self.search('pyth'), [self.title_match, self.description_match])
+        self.assertEqual(self.search('python go'), [self.description_match])
+        self.assertEqual(self.search('"python*'), [self.title_match, self.description_match])
+
+    def test_index_follows_edits_and_deletes(self):
+        self.title_match.title = 'Rust Developer'
+        self.title_match.save()
+        self.assertEqual(self.search('python'), [self.description_match])
+        self.assertEqual(self.search('rust'), [self.title_match])
+
+        self.description_match.delete()
+        self.assertEqual(self.search('python'), [])
+
+    def test_job_list_search(self):
+        self.client.force_login(self.recruiter)
+        response = self.client.get(reverse('jobs:job_list'), {'search': 'python'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['jobs']), [self.title_match, self.description_match])
+
+    def test_snippets(self):
+        jobs = highlight_jobs(self.search('python'), 'python')
+        self.assertEqual(jobs[0].search_snippet, '')
+        self.assertIn('<mark>Python</mark>', jobs[1].search_snippet)
+
+
+class ViewCounterTests(TestCase):
+    """Job views are buffered and written in batches"""
+
+    def setUp(self):
+        recruiter = CustomUser.objects.create_user('recruiter', 'recruiter@example.com', 'pw', user_type='recruiter')
+        self.jobs = [
+            JobPosting.objects.create(title=f'Job {index}', location='Remote', posted_by=recruiter)
+            for index in range(3)
+        ]
+        # Flush by hand instead of from the background thread
+        patcher = mock.patch.object(ViewCounter, '_start_flusher')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.counter = ViewCounter()
+
+    def view_counts(self):
+        return list(JobPosting.objects.order_by('id').values_list('view_count', flat=True))
+
+    def test_views_are_buffered_then_flushed(self):
+        for job, views in zip(self.jobs, (2, 2, 1)):
+            self.counter.increment(job.id, views)
+        self.assertEqual(self.view_counts(), [0, 0, 0])
+        self.assertEqual(self.counter.pending(self.jobs[0].id), 2)
+
+        # One UPDATE per distinct increment, in one transaction
+        with self.assertNumQueries(4):
+            self.assertEqual(self.counter.flush(), 5)
+        self.assertEqual(self.view_counts(), [2, 2, 1])
+        self.assertEqual(self.counter.flush(), 0)
+
+    def test_failed_flush_keeps_views(self):
+        self.counter.increment(self.jobs[0].id, 3)
+        with mock.patch.object(JobPosting.objects, 'filter', side_effect=RuntimeError('locked')):
+            with self.assertRaises(RuntimeError):
+                self.counter.flush()
+        self.assertEqual(self.counter.pending(self.jobs[0].id), 3)
+        self.counter.flush()
+        self.assertEqual(self.view_counts()[0], 3)
+
+    def test_job_detail_records_views(self):
+        self.client.force_login(self.jobs[0].posted_by)
+        self.addCleanup(view_counter.flush)
+        # The profiles app serves /jobs/<id>/
+        for _ in range(2):
+            self.assertEqual(self.client.get(reverse('job_detail', args=[self.jobs[0].id])).status_code, 200)
+        self.assertEqual(get_view_counts(JobPosting.objects.filter(pk=self.jobs[0].pk)), {self.jobs[0].id: 2})
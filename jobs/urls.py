@@ -25,6 +25,10 @@ urlpatterns = [
     
     # Interactive map
     path('map/', views.job_map, name='job_map'),
+    path('map/clusters/', views.job_map_clusters, name='job_map_clusters'),
+    path('map/markers/', views.job_map_markers, name='job_map_markers'),
+    path('map/jobs/<int:job_id>/', views.job_map_marker, name='job_map_marker'),
+    path('geocode/', views.geocode_location, name='geocode_location'),
     
     # AJAX endpoints
     path('applications/<int:application_id>/update-status/', views.update_application_status, name='update_application_status'),
@@ -33,4 +37,5 @@ urlpatterns = [
     path('admin/delete/<int:job_id>/', views.admin_delete_job, name='admin_delete_job'),
     path('admin/deactivate/<int:job_id>/', views.admin_deactivate_job, name='admin_deactivate_job'),
     path('admin/activate/<int:job_id>/', views.admin_activate_job, name='admin_activate_job'),
+    path('admin/view-counts/', views.admin_view_counts, name='admin_view_counts'),
 ]
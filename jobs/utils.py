@@ -8,7 +8,10 @@ from django.conf import settings
 def geocode_address(address):
     """
     Convert an address to latitude and longitude coordinates.
-    This is a basic implementation that can be extended with real geocoding services.
+    
+    Resolved through the geocode cache (see jobs.geocoding), so only an
+    address that isn't cached reaches a geocoder: the offline gazetteer
+    first, then the geocoding service.
     
     Args:
         address (str): The address to geocode
@@ -19,19 +22,12 @@ def geocode_address(address):
     if not address or not address.strip():
         return None, None
     
-    # For now, return None to indicate geocoding is not implemented
-    # In a real implementation, you would use a service like:
-    # - Google Maps Geocoding API
-    # - OpenStreetMap Nominatim
-    # - MapBox Geocoding API
-    
-    # Example implementation with a free service (Nominatim):
+    from .geocoding import GeocodingError, resolve_address
     try:
-        # This is a placeholder - you would need to implement actual geocoding
-        # For now, we'll return None to indicate coordinates need to be entered manually
-        return None, None
-    except Exception:
+        coords = resolve_address(address)
+    except GeocodingError:
         return None, None
+    return coords or (None, None)
 
 def get_user_location_from_profile(user):
     """
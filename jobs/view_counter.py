@@ -0,0 +1,141 @@
+"""
+Buffered job view counter.
+
+Page views are added to an in-process buffer instead of writing
+JobPosting.view_count on every request. A background thread flushes the
+buffer every VIEW_COUNT_FLUSH_INTERVAL seconds (and once more at exit)
+with one ``UPDATE ... SET view_count = view_count + n`` per distinct
+increment, so readers never queue behind a per-view write lock and
+concurrent requests can't lose increments.
+
+Counts that are still buffered can be read with get_view_count(s), which
+is what the admin dashboard shows.
+
+The buffer is per-process memory. Under several worker processes each
+one only adds its own pending views, so a reader can lag the true count
+by up to FLUSH_INTERVAL seconds of the other processes' views. A process
+that is killed without running its exit hook loses up to one interval of
+views. Counts are for display and ranking, so this is accepted instead of
+a shared store; lower VIEW_COUNT_FLUSH_INTERVAL to narrow the window.
+"""
+import atexit
+import threading
+import time
+from collections import Counter, defaultdict
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+
+# Seconds between background flushes
+FLUSH_INTERVAL = getattr(settings, 'VIEW_COUNT_FLUSH_INTERVAL', 10)
+
+
+class ViewCounter:
+    """Thread-safe buffer of pending view count increments"""
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self._pending = Counter()
+        self._lock = threading.Lock()
+        self._flusher = None
+
+    def increment(self, job_id, amount=1):
+        """Buffer ``amount`` views of a job"""
+        with self._lock:
+            self._pending[job_id] += amount
+            if self._flusher is None:
+                self._start_flusher()
+
+    def pending(self, job_id):
+        """Return the views of a job that haven't been written yet"""
+        with self._lock:
+            return self._pending.get(job_id, 0)
+
+    def pending_counts(self, job_ids):
+        """Return {job_id: buffered views} for the given jobs"""
+        with self._lock:
+            return {job_id: self._pending[job_id] for job_id in job_ids if job_id in self._pending}
+
+    def flush(self):
+        """
+        Write buffered views to the database.
+
+        Jobs with the same increment share one UPDATE. If the write fails
+        the increments go back into the buffer for the next flush.
+        Returns the number of views written.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+        if not pending:
+            return 0
+
+        from .models import JobPosting
+
+        by_amount = defaultdict(list)
+        for job_id, amount in pending.items():
+            by_amount[amount].append(job_id)
+
+        try:
+            with transaction.atomic():
+                for amount, job_ids in by_amount.items():
+                    JobPosting.objects.filter(id__in=job_ids).update(view_count=F('view_count') + amount)
+        except Exception:
+            with self._lock:
+                self._pending.update(pending)
+            raise
+        return sum(pending.values())
+
+    def _start_flusher(self):
+        # Called with the lock held
+        self._flusher = threading.Thread(target=self._run_flusher, name='view-count-flusher', daemon=True)
+        self._flusher.start()
+
+    def _run_flusher(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                # Increments were put back; try again on the next tick
+                pass
+            finally:
+                connection.close()
+
+
+view_counter = ViewCounter()
+
+
+def record_view(job):
+    """Count one view of a job posting"""
+    view_counter.increment(job.id)
+
+
+def get_view_count(job):
+    """Return a job's view count including this process's views not yet flushed"""
+    return job.view_count + view_counter.pending(job.id)
+
+
+def get_view_counts(jobs):
+    """
+    Return {job_id: view count} including views not yet flushed.
+
+    Only this process's buffer is added; views buffered in other worker
+    processes show up once they flush (see the module docstring).
+    ``jobs`` is an iterable of JobPosting instances.
+    """
+    jobs = list(jobs)
+    pending = view_counter.pending_counts([job.id for job in jobs])
+    return {job.id: job.view_count + pending.get(job.id, 0) for job in jobs}
+
+
+def flush_view_counts():
+    """Write all buffered views now"""
+    return view_counter.flush()
+
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        view_counter.flush()
+    except Exception:
+        pass
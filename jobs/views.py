@@ -2,32 +2,19 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.core.paginator import Paginator
-from django.db.models import Q, Count, Case, When, IntegerField
+from django.db.models import Count, Case, When, IntegerField
 from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
 from .models import JobPosting, JobCategory, JobApplication, JobSkill
 from .forms import JobPostingForm, JobApplicationForm
 from .utils import get_user_location_from_request
+from .spatial import within_radius
+from .geo import haversine_distances
+from .clustering import CLUSTER_MAX_ZOOM, cluster_jobs, parse_bbox, parse_cursor, parse_zoom, viewport_page
+from .skill_index import recommend_jobs
+from .search import search_jobs, highlight_jobs
+from .view_counter import record_view, get_view_count, get_view_counts
 from profiles.models import JobSeekerProfile, Skill
-import math
-
-def calculate_distance(lat1, lon1, lat2, lon2):
-    """Calculate the great circle distance between two points on Earth in miles"""
-    if not all([lat1, lon1, lat2, lon2]):
-        return None
-    
-    # Convert latitude and longitude from degrees to radians
-    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
-    
-    # Haversine formula
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-    c = 2 * math.asin(math.sqrt(a))
-    
-    # Radius of earth in miles
-    r = 3959
-    return c * r
 
 def job_list(request):
     """List all active job postings with filtering"""
@@ -45,11 +32,8 @@ def job_list(request):
     user_lon = request.GET.get('user_lon', '')
     
     if search:
-        jobs = jobs.filter(
-            Q(title__icontains=search) | 
-            Q(company__icontains=search) | 
-            Q(description__icontains=search)
-        )
+        # Full-text match, most relevant first
+        jobs = search_jobs(jobs, search)
     
     if category:
         jobs = jobs.filter(category__name__icontains=category)
@@ -76,29 +60,9 @@ def job_list(request):
         
         if user_lat and user_lon:
             try:
-                radius_miles = float(radius)
-                
-                # Get all jobs first, then filter by distance
-                all_jobs = list(jobs)
-                jobs_within_radius = []
-                
-                for job in all_jobs:
-                    if job.latitude and job.longitude:
-                        distance = calculate_distance(user_lat, user_lon, float(job.latitude), float(job.longitude))
-                        if distance is not None and distance <= radius_miles:
-                            jobs_within_radius.append(job)
-                    else:
-                        # If job doesn't have coordinates, include it if location text matches
-                        if location and location.lower() in job.location.lower():
-                            jobs_within_radius.append(job)
-                
-                # Create a new queryset with the filtered job IDs
-                if jobs_within_radius:
-                    job_ids = [job.id for job in jobs_within_radius]
-                    jobs = JobPosting.objects.filter(id__in=job_ids, is_active=True, status='published')
-                else:
-                    jobs = JobPosting.objects.none()
-                    
+                # Indexed bounding-box prefilter + exact distance, nearest first.
+                # Jobs without coordinates are kept if the location text matched.
+                jobs = within_radius(jobs, user_lat, user_lon, float(radius), include_unlocated=bool(location))
             except (ValueError, TypeError):
                 # If radius/location parameters are invalid, ignore location filtering
                 pass
@@ -108,6 +72,9 @@ def job_list(request):
     page_number = request.GET.get('page')
     jobs = paginator.get_page(page_number)
     
+    if search:
+        highlight_jobs(jobs, search)
+    
     # Get filter options
     categories = JobCategory.objects.all()
     employment_types = JobPosting.EMPLOYMENT_TYPES
@@ -139,9 +106,9 @@ def job_detail(request, job_id):
     """View job posting details"""
     job = get_object_or_404(JobPosting, id=job_id, is_active=True, status='published')
     
-    # Increment view count
-    job.view_count += 1
-    job.save(update_fields=['view_count'])
+    # Buffered increment, written to view_count by a background flush
+    record_view(job)
+    job.view_count = get_view_count(job)
     
     # Check if user has applied
     has_applied = False
@@ -447,78 +414,18 @@ def job_recommendations(request):
         }
         return render(request, 'jobs/job_recommendations.html', context)
     
-    # Get all active jobs with their required skills
-    all_jobs = JobPosting.objects.filter(
-        is_active=True, 
-        status='published'
-    ).select_related('posted_by', 'category').prefetch_related('required_skills')
-    
-    # Calculate skill match scores for each job
-    job_scores = []
-    skill_match_info = {}
-    
-    for job in all_jobs:
-        job_skills = list(job.required_skills.values_list('name', flat=True))
-        
-        if not job_skills:
-            # Jobs without specified skills get a low default score
-            match_score = 0.1
-            matched_skills = []
-            missing_skills = []
-        else:
-            # Calculate exact matches (case-insensitive)
-            matched_skills = []
-            for job_skill in job_skills:
-                for user_skill in user_skills:
-                    if job_skill.lower() == user_skill.lower():
-                        matched_skills.append(job_skill)
-                        break
-            
-            # Calculate partial matches (substring matching)
-            partial_matches = []
-            for job_skill in job_skills:
-                if job_skill not in matched_skills:
-                    for user_skill in user_skills:
-                        if (user_skill.lower() in job_skill.lower() or 
-                            job_skill.lower() in user_skill.lower()):
-                            partial_matches.append(job_skill)
-                            break
-            
-            # Calculate match score
-            total_job_skills = len(job_skills)
-            exact_matches = len(matched_skills)
-            partial_match_count = len(partial_matches)
-            
-            # Scoring: exact matches = 1 point, partial matches = 0.5 points
-            match_score = (exact_matches + (partial_match_count * 0.5)) / total_job_skills
-            
-            # Missing skills
-            missing_skills = [skill for skill in job_skills 
-                            if skill not in matched_skills and skill not in partial_matches]
-        
-        # Store match information
-        skill_match_info[job.id] = {
-            'matched_skills': matched_skills,
-            'partial_matches': partial_matches if 'partial_matches' in locals() else [],
-            'missing_skills': missing_skills,
-            'match_percentage': round(match_score * 100, 1),
-            'total_required': len(job_skills)
-        }
-        
-        job_scores.append((job, match_score))
-    
-    # Sort jobs by match score (highest first)
-    job_scores.sort(key=lambda x: x[1], reverse=True)
-    
-    # Get top recommendations
-    recommended_jobs = [job for job, score in job_scores[:20]]  # Top 20 matches
-    
     # Filter out jobs user has already applied to
     applied_job_ids = JobApplication.objects.filter(
         applicant=request.user
     ).values_list('job_id', flat=True)
     
-    recommended_jobs = [job for job in recommended_jobs if job.id not in applied_job_ids][:10]
+    # Score only the jobs that share a skill token with the user
+    top_jobs, skill_match_info = recommend_jobs(user_skills, limit=10, exclude_job_ids=applied_job_ids)
+    
+    jobs_by_id = JobPosting.objects.select_related('posted_by', 'category').prefetch_related(
+        'required_skills'
+    ).in_bulk([job_id for job_id, score in top_jobs])
+    recommended_jobs = [jobs_by_id[job_id] for job_id, score in top_jobs if job_id in jobs_by_id]
     
     # Categorize recommendations
     high_match_jobs = [job for job in recommended_jobs 
@@ -541,19 +448,57 @@ def job_recommendations(request):
     
     return render(request, 'jobs/job_recommendations.html', context)
 
-@login_required
-def job_map(request):
-    """Interactive map view showing all jobs with location filtering"""
-    from jobs.utils import get_user_location_from_request
-
-    # Get all active jobs with coordinates
+def _map_jobs(request):
+    """Published, geocoded jobs matching the job map's filter parameters"""
     jobs = JobPosting.objects.filter(
         is_active=True,
         status='published',
         latitude__isnull=False,
         longitude__isnull=False
-    ).select_related('posted_by', 'category').prefetch_related('required_skills')
+    )
+
+    search = request.GET.get('search', '')
+    category = request.GET.get('category', '')
+    location = request.GET.get('location', '')
+    employment_type = request.GET.get('employment_type', '')
+    experience_level = request.GET.get('experience_level', '')
+    skills = request.GET.get('skills', '')
+    radius = request.GET.get('radius', '')
+
+    if search:
+        jobs = search_jobs(jobs, search)
+
+    if category:
+        jobs = jobs.filter(category__name__icontains=category)
+
+    if location:
+        jobs = jobs.filter(location__icontains=location)
+
+    if employment_type:
+        jobs = jobs.filter(employment_type=employment_type)
 
+    if experience_level:
+        jobs = jobs.filter(experience_level=experience_level)
+
+    if skills:
+        skills_list = [skill.strip() for skill in skills.split(',') if skill.strip()]
+        if skills_list:
+            jobs = jobs.filter(required_skills__name__in=skills_list).distinct()
+
+    if radius:
+        user_lat, user_lon = get_user_location_from_request(request)
+        if user_lat and user_lon:
+            try:
+                jobs = within_radius(jobs, user_lat, user_lon, float(radius))
+            except (ValueError, TypeError):
+                pass
+
+    return jobs
+
+
+@login_required
+def job_map(request):
+    """Interactive map of jobs; markers are loaded per viewport by job_map_clusters and job_map_markers"""
     # Get user's preferred commute radius and location from profile (Story 9)
     user_profile = None
     default_radius = ''
@@ -580,116 +525,116 @@ def job_map(request):
             user_profile.save()
         except (ValueError, TypeError):
             pass
-    location = request.GET.get('location', '')
-    search = request.GET.get('search', '')
-    category = request.GET.get('category', '')
-    employment_type = request.GET.get('employment_type', '')
-    experience_level = request.GET.get('experience_level', '')
-    skills = request.GET.get('skills', '')
-    
-    # Apply text-based filters first
-    if search:
-        jobs = jobs.filter(
-            Q(title__icontains=search) | 
-            Q(company__icontains=search) | 
-            Q(description__icontains=search)
-        )
-    
-    if category:
-        jobs = jobs.filter(category__name__icontains=category)
-    
-    if location:
-        jobs = jobs.filter(location__icontains=location)
-    
-    if employment_type:
-        jobs = jobs.filter(employment_type=employment_type)
-    
-    if experience_level:
-        jobs = jobs.filter(experience_level=experience_level)
-    
-    if skills:
-        skills_list = [skill.strip() for skill in skills.split(',') if skill.strip()]
-        if skills_list:
-            jobs = jobs.filter(required_skills__name__in=skills_list).distinct()
-    
-    # Apply location-based filtering with radius
-    if radius:
-        user_lat, user_lon = get_user_location_from_request(request)
-        
-        if user_lat and user_lon:
-            try:
-                radius_miles = float(radius)
-                
-                # Get all jobs first, then filter by distance
-                all_jobs = list(jobs)
-                jobs_within_radius = []
-                
-                for job in all_jobs:
-                    if job.latitude and job.longitude:
-                        distance = calculate_distance(user_lat, user_lon, float(job.latitude), float(job.longitude))
-                        if distance is not None and distance <= radius_miles:
-                            jobs_within_radius.append(job)
-                    else:
-                        # If job doesn't have coordinates, include it if location text matches
-                        if location and location.lower() in job.location.lower():
-                            jobs_within_radius.append(job)
-                
-                # Create a new queryset with the filtered job IDs
-                if jobs_within_radius:
-                    job_ids = [job.id for job in jobs_within_radius]
-                    jobs = JobPosting.objects.filter(id__in=job_ids, is_active=True, status='published')
-                else:
-                    jobs = JobPosting.objects.none()
-                    
-            except (ValueError, TypeError):
-                pass
-    
-    # Get filter options
-    categories = JobCategory.objects.all()
-    employment_types = JobPosting.EMPLOYMENT_TYPES
-    experience_levels = JobPosting.EXPERIENCE_LEVELS
-    
-    # Get all unique skills for the skills filter dropdown
-    all_skills = JobSkill.objects.values_list('name', flat=True).distinct().order_by('name')
-    
-    # Prepare job data for the map
-    job_markers = []
-    for job in jobs:
-        job_markers.append({
-            'id': job.id,
-            'title': job.title,
-            'company': job.company,
-            'location': job.location,
-            'latitude': float(job.latitude),
-            'longitude': float(job.longitude),
-            'employment_type': job.get_employment_type_display(),
-            'experience_level': job.get_experience_level_display(),
-            'salary_range': job.salary_range,
-            'url': f'/jobs/{job.id}/',
-            'description': job.description[:200] + '...' if len(job.description) > 200 else job.description,
-        })
-    
+
     context = {
-        'jobs': jobs,
-        'job_markers': job_markers,
-        'categories': categories,
-        'employment_types': employment_types,
-        'experience_levels': experience_levels,
-        'all_skills': all_skills,
-        'search': search,
-        'selected_category': category,
-        'selected_location': location,
-        'selected_employment_type': employment_type,
-        'selected_experience_level': experience_level,
-        'selected_skills': skills,
+        'categories': JobCategory.objects.all(),
+        'employment_types': JobPosting.EMPLOYMENT_TYPES,
+        'experience_levels': JobPosting.EXPERIENCE_LEVELS,
+        # Get all unique skills for the skills filter dropdown
+        'all_skills': JobSkill.objects.values_list('name', flat=True).distinct().order_by('name'),
+        'search': request.GET.get('search', ''),
+        'selected_category': request.GET.get('category', ''),
+        'selected_location': request.GET.get('location', ''),
+        'selected_employment_type': request.GET.get('employment_type', ''),
+        'selected_experience_level': request.GET.get('experience_level', ''),
+        'selected_skills': request.GET.get('skills', ''),
         'selected_radius': radius,
         'user_lat': user_lat,
         'user_lon': user_lon,
+        'cluster_max_zoom': CLUSTER_MAX_ZOOM,
     }
-    
+
     return render(request, 'jobs/job_map.html', context)
 
 
+@login_required
+def job_map_clusters(request):
+    """
+    AJAX endpoint for the job map: jobs in the ``bbox`` viewport at
+    ``zoom``, aggregated into grid clusters (see jobs.clustering). Takes
+    the same filter parameters as job_map.
+    """
+    bbox = parse_bbox(request.GET.get('bbox'))
+    zoom = parse_zoom(request.GET.get('zoom'))
+    if bbox is None or zoom is None:
+        return JsonResponse({'success': False, 'message': 'bbox and zoom are required'}, status=400)
+
+    result = cluster_jobs(_map_jobs(request), bbox, zoom)
+    return JsonResponse({'success': True, **result})
+
+
+@login_required
+def job_map_markers(request):
+    """
+    AJAX endpoint for the job map: one page of the individual jobs in the
+    ``bbox`` viewport as ``[id, latitude, longitude, title, company]``.
+    Takes the same filter parameters as job_map, plus the ``cursor``
+    returned by the previous page.
+    """
+    bbox = parse_bbox(request.GET.get('bbox'))
+    if bbox is None:
+        return JsonResponse({'success': False, 'message': 'bbox is required'}, status=400)
+
+    jobs = _map_jobs(request)
+    # Match on ids, so search ranking and DISTINCT don't interfere with paging
+    jobs = JobPosting.objects.filter(pk__in=jobs.order_by().values('pk'))
+    markers, cursor = viewport_page(
+        jobs, bbox, ('id', 'latitude', 'longitude', 'title', 'company'),
+        cursor=parse_cursor(request.GET.get('cursor'))
+    )
+    return JsonResponse({'success': True, 'markers': markers, 'cursor': cursor})
+
+
+@login_required
+def job_map_marker(request, job_id):
+    """AJAX endpoint for the popup details of one job map marker"""
+    job = get_object_or_404(
+        JobPosting.objects.select_related('category'),
+        id=job_id, is_active=True, status='published'
+    )
+    details = {
+        'success': True,
+        'id': job.id,
+        'title': job.title,
+        'company': job.company,
+        'location': job.location,
+        'employment_type': job.get_employment_type_display(),
+        'experience_level': job.get_experience_level_display(),
+        'salary_range': job.salary_range,
+        'url': f'/jobs/{job.id}/',
+        'description': job.description[:200] + '...' if len(job.description) > 200 else job.description,
+    }
+
+    user_lat, user_lon = get_user_location_from_request(request)
+    if user_lat and user_lon and job.latitude is not None and job.longitude is not None:
+        distance = haversine_distances(user_lat, user_lon, [job.latitude], [job.longitude])[0]
+        details['distance'] = round(float(distance), 1)
+    return JsonResponse(details)
+
+
+@login_required
+def geocode_location(request):
+    """
+    AJAX endpoint to find coordinates for a location. Answered from the
+    geocode cache and the offline gazetteer when possible, otherwise by
+    the geocoder with a per-user rate limit (see
+    jobs.geocoding.resolve_address_for_user).
+    """
+    from .geocoding import GeocodingError, resolve_address_for_user
+
+    query = request.GET.get('q', '')[:200]
+    if not query.strip():
+        return JsonResponse({'success': False, 'message': 'Enter a location to search for'})
+    try:
+        coords = resolve_address_for_user(query, request.user.id)
+    except GeocodingError as e:
+        return JsonResponse({'success': False, 'message': str(e)})
+    if coords is None:
+        return JsonResponse({'success': False, 'message': 'Location not found'})
+    latitude, longitude = coords
+    return JsonResponse({'success': True, 'latitude': latitude, 'longitude': longitude})
+
+
 # Admin moderation views
 def admin_required(view_func):
     """Decorator to require admin access"""
@@ -728,4 +673,13 @@ def admin_activate_job(request, job_id):
     job.is_active = True
     job.save()
     messages.success(request, f'Job "{job.title}" has been reactivated.')
-    return redirect('profiles:admin_dashboard')
\ No newline at end of file
+    return redirect('profiles:admin_dashboard')
+
+
+@admin_required
+def admin_view_counts(request):
+    """Near-real-time view counts (including unflushed views) for the admin dashboard"""
+    job_ids = [int(job_id) for job_id in request.GET.get('ids', '').split(',') if job_id.strip().isdigit()]
+    jobs = JobPosting.objects.filter(id__in=job_ids).only('id', 'view_count')
+    counts = get_view_counts(jobs)
+    return JsonResponse({'success': True, 'view_counts': {str(job_id): count for job_id, count in counts.items()}})
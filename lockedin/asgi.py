@@ -3,6 +3,11 @@ ASGI config for lockedin project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve the site with an ASGI server (e.g. ``uvicorn lockedin.asgi:application``)
+to get live unread badges: the badge stream (profiles.badges) holds a
+server-sent events connection open per page, which a WSGI worker can't
+afford. Under WSGI the pages poll the badge counts instead.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 """
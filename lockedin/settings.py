@@ -151,3 +151,8 @@ DEFAULT_FROM_EMAIL = 'noreply@lockedin.com'
 
 # Site URL for email links
 SITE_URL = 'http://localhost:8000'
+
+# Events the activity logger couldn't write yet (see profiles.activity_log).
+# Test runs use a temporary file instead (see lockedin.test_runner).
+ACTIVITY_SPILL_FILE = BASE_DIR / 'var' / 'activity_spill.jsonl'
+TEST_RUNNER = 'lockedin.test_runner.LockedInTestRunner'
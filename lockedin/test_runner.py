@@ -0,0 +1,31 @@
+"""
+Test runner that keeps test activity out of the real spill file
+"""
+import os
+import tempfile
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class LockedInTestRunner(DiscoverRunner):
+    """
+    Points ACTIVITY_SPILL_FILE at a temporary directory for the run, so
+    events logged by tests are never replayed into the real database.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.spill_directory = tempfile.TemporaryDirectory(prefix='lockedin-test-')
+        self.spill_override = override_settings(
+            ACTIVITY_SPILL_FILE=os.path.join(self.spill_directory.name, 'activity_spill.jsonl')
+        )
+        self.spill_override.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        from profiles.activity_log import activity_logger
+
+        # Drop what the tests left queued instead of spilling it at exit
+        activity_logger.drain()
+        self.spill_override.disable()
+        self.spill_directory.cleanup()
+        super().teardown_test_environment(**kwargs)
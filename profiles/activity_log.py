@@ -0,0 +1,284 @@
+"""
+Write-behind pipeline for UserActivity rows.
+
+Tracked actions are put on a bounded in-memory queue and a background
+thread writes them with bulk_create, so a request no longer pays for an
+INSERT per action. Events that can't reach the database (queue full,
+database error, process exiting) are appended to a JSON-lines spill
+file, which is replayed by the flusher and by the flush_activity_log
+command.
+"""
+import atexit
+import json
+import os
+import queue
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+# Maximum number of events waiting in memory
+MAX_QUEUE_SIZE = getattr(settings, 'ACTIVITY_QUEUE_SIZE', 10000)
+
+# Maximum number of rows per bulk_create
+BATCH_SIZE = getattr(settings, 'ACTIVITY_BATCH_SIZE', 500)
+
+# Seconds the flusher waits to fill a batch before writing what it has
+FLUSH_INTERVAL = getattr(settings, 'ACTIVITY_FLUSH_INTERVAL', 2)
+
+
+def spill_file():
+    """Path of the spill file, read from settings on each use"""
+    # Kept out of the source tree (var/ is gitignored)
+    return str(getattr(settings, 'ACTIVITY_SPILL_FILE', os.path.join(settings.BASE_DIR, 'var', 'activity_spill.jsonl')))
+
+
+def _build_activities(events):
+    from .models import UserActivity
+    return [
+        UserActivity(
+            user_id=event['user_id'],
+            activity_type=event['activity_type'],
+            ip_address=event['ip_address'],
+            details=event['details'],
+            timestamp=datetime.fromisoformat(event['timestamp']),
+        )
+        for event in events
+    ]
+
+
+def _record_activity_metrics(activities):
+    from .metrics import activity_metric, record_metrics
+    record_metrics(Counter(
+        (timezone.localdate(activity.timestamp), activity_metric(activity.activity_type))
+        for activity in activities
+    ))
+
+
+def write_events(events):
+    """
+    Insert events into UserActivity and add them to the daily metrics.
+
+    A batch that violates a constraint (e.g. a user deleted meanwhile) is
+    retried row by row and the offending rows are dropped. Returns the
+    number of rows written.
+    """
+    from .models import UserActivity
+
+    activities = _build_activities(events)
+    try:
+        with transaction.atomic():
+            UserActivity.objects.bulk_create(activities, batch_size=BATCH_SIZE)
+            _record_activity_metrics(activities)
+        return len(activities)
+    except IntegrityError:
+        written = []
+        for activity in activities:
+            try:
+                with transaction.atomic():
+                    activity.save()
+                written.append(activity)
+            except IntegrityError:
+                pass
+        _record_activity_metrics(written)
+        return len(written)
+
+
+def spill_events(events):
+    """Append events to the spill file"""
+    if not events:
+        return
+    path = spill_file()
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as spill:
+        for event in events:
+            spill.write(json.dumps(event) + '\n')
+
+
+@contextmanager
+def _replay_lock():
+    """Yield True if this process may replay, holding the lock until exit"""
+    try:
+        import fcntl
+    except ImportError:
+        # No advisory locks (Windows): rely on os.replace alone
+        yield True
+        return
+    path = spill_file()
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(f'{path}.lock', 'a') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _read_progress(path):
+    try:
+        with open(path, encoding='utf-8') as progress:
+            return int(progress.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def _write_progress(path, done):
+    with open(f'{path}.tmp', 'w', encoding='utf-8') as progress:
+        progress.write(str(done))
+    os.replace(f'{path}.tmp', path)
+
+
+def _replay_file(path):
+    """
+    Write the events in one claimed spill file, then delete it.
+
+    The number of events already written is recorded after each batch,
+    so a replay that fails part way through resumes where it stopped
+    instead of inserting the earlier batches again.
+    """
+    progress = f'{path}.progress'
+    done = _read_progress(progress)
+    with open(path, encoding='utf-8') as spill:
+        events = [json.loads(line) for line in spill if line.strip()]
+
+    written = 0
+    for offset in range(done, len(events), BATCH_SIZE):
+        batch = events[offset:offset + BATCH_SIZE]
+        written += write_events(batch)
+        _write_progress(progress, offset + len(batch))
+    os.remove(path)
+    if os.path.exists(progress):
+        os.remove(progress)
+    return written
+
+
+def replay_spill_file():
+    """
+    Write spilled events to the database and remove the spill file.
+
+    Returns the number of rows written.
+    """
+    path = spill_file()
+    replaying = f'{path}.replaying'
+    with _replay_lock() as locked:
+        if not locked:
+            # Another process is replaying
+            return 0
+
+        written = 0
+        # Finish a replay that failed or crashed before claiming new events,
+        # so the claimed file is never overwritten
+        if os.path.exists(replaying):
+            written += _replay_file(replaying)
+        try:
+            # Claim the file; events spilled from now on start a new one
+            os.replace(path, replaying)
+        except FileNotFoundError:
+            return written
+        return written + _replay_file(replaying)
+
+
+class ActivityLogger:
+    """Bounded queue of activity events with a background bulk writer"""
+
+    def __init__(self, max_size=MAX_QUEUE_SIZE):
+        self._queue = queue.Queue(maxsize=max_size)
+        self._lock = threading.Lock()
+        self._flusher = None
+
+    def log(self, user_id, activity_type, ip_address=None, details=''):
+        """Queue one event; never blocks the caller"""
+        event = {
+            'user_id': user_id,
+            'activity_type': activity_type,
+            'ip_address': ip_address,
+            'details': details,
+            'timestamp': timezone.now().isoformat(),
+        }
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            spill_events([event])
+        self._ensure_flusher()
+
+    def drain(self, limit=None):
+        """Remove and return up to ``limit`` queued events without waiting"""
+        events = []
+        while limit is None or len(events) < limit:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return events
+
+    def flush(self):
+        """Write everything currently queued. Returns the number of rows written."""
+        written = 0
+        while True:
+            events = self.drain(BATCH_SIZE)
+            if not events:
+                return written
+            try:
+                written += write_events(events)
+            except Exception:
+                spill_events(events)
+                raise
+
+    def _ensure_flusher(self):
+        if self._flusher is not None:
+            return
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._run_flusher, name='activity-log-flusher', daemon=True)
+                self._flusher.start()
+
+    def _next_batch(self):
+        """Block until at least one event arrives, then gather a batch"""
+        events = [self._queue.get()]
+        try:
+            while len(events) < BATCH_SIZE:
+                events.append(self._queue.get(timeout=FLUSH_INTERVAL))
+        except queue.Empty:
+            pass
+        return events
+
+    def _run_flusher(self):
+        try:
+            replay_spill_file()
+        except Exception:
+            pass
+        while True:
+            events = self._next_batch()
+            try:
+                write_events(events)
+            except Exception:
+                # Keep the events; they are replayed on the next start
+                spill_events(events)
+            finally:
+                connection.close()
+
+
+activity_logger = ActivityLogger()
+
+
+def log_activity(user, activity_type, request=None, details=''):
+    """Record a user action without writing to the database in the request"""
+    activity_logger.log(
+        user.pk,
+        activity_type,
+        ip_address=request.META.get('REMOTE_ADDR') if request else None,
+        details=details,
+    )
+
+
+@atexit.register
+def _spill_at_exit():
+    # Don't touch the database while the interpreter shuts down
+    spill_events(activity_logger.drain())
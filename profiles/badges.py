@@ -0,0 +1,150 @@
+"""
+Live unread badges.
+
+Whenever a notification or message is created, read or deleted, a
+BadgeEvent row records the change to the user's unread counts. Pages
+keep a server-sent events stream open (badge_stream, served by the ASGI
+application in lockedin/asgi.py). Each ASGI process has one BadgeBroker,
+which polls BadgeEvent once per BADGE_POLL_INTERVAL for all of its
+connected users and pushes the deltas to their streams. Before, every
+open tab recounted both badges every 30 seconds. Pages that cannot keep
+a stream open fall back to that polling.
+"""
+import asyncio
+import json
+from collections import OrderedDict, defaultdict
+from datetime import timedelta
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+from .models import BadgeEvent
+
+# Seconds between BadgeEvent polls
+POLL_INTERVAL = getattr(settings, 'BADGE_POLL_INTERVAL', 1)
+
+# Seconds between keepalive comments on an idle stream
+KEEPALIVE_INTERVAL = getattr(settings, 'BADGE_KEEPALIVE_INTERVAL', 15)
+
+# Seconds between full counts sent down a stream, to correct any missed deltas
+SNAPSHOT_INTERVAL = getattr(settings, 'BADGE_SNAPSHOT_INTERVAL', 300)
+
+# Events are re-read for this long, so rows from transactions that
+# committed after a poll has moved past their created_at still arrive
+EVENT_OVERLAP = timedelta(seconds=5)
+
+# BadgeEvent rows older than this are deleted
+EVENT_RETENTION = timedelta(minutes=10)
+
+# Deltas buffered per stream before they are dropped (the next snapshot corrects the badge)
+QUEUE_SIZE = 100
+
+
+def publish_badge_delta(user_id, notifications=0, messages=0):
+    """Record a change to a user's unread counts for their open streams"""
+    if notifications or messages:
+        BadgeEvent.objects.create(user_id=user_id, notifications=notifications, messages=messages)
+
+
+class BadgeBroker:
+    """
+    Fans BadgeEvents out to the streams open in this process.
+
+    One poller task runs while any stream is subscribed. It reads recent
+    events for everyone and drops those for users with no open stream, so
+    the query doesn't grow with the number of connections.
+    """
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._task = None
+        self._since = None
+        self._seen = OrderedDict()
+        self._last_prune = None
+
+    def subscribe(self, user_id):
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self._subscribers[user_id].add(queue)
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        queues = self._subscribers.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[user_id]
+
+    async def _run(self):
+        self._since = timezone.now()
+        while self._subscribers:
+            await asyncio.sleep(POLL_INTERVAL)
+            try:
+                events = await sync_to_async(self._fetch)()
+            except Exception:
+                # Keep streams open through a database hiccup; the next poll retries
+                continue
+            for user_id, delta in events:
+                for queue in list(self._subscribers.get(user_id, ())):
+                    try:
+                        queue.put_nowait(delta)
+                    except asyncio.QueueFull:
+                        pass
+
+    def _fetch(self):
+        """New events since the last poll, as (user_id, delta) pairs"""
+        now = timezone.now()
+        rows = BadgeEvent.objects.filter(
+            created_at__gte=self._since - EVENT_OVERLAP
+        ).order_by('id').values_list('id', 'user_id', 'notifications', 'messages')
+        self._since = now
+
+        events = []
+        for event_id, user_id, notifications, messages in rows:
+            if event_id in self._seen:
+                continue
+            self._seen[event_id] = now
+            events.append((user_id, {'notifications': notifications, 'messages': messages}))
+        while self._seen and next(iter(self._seen.values())) < now - EVENT_OVERLAP * 2:
+            self._seen.popitem(last=False)
+
+        if self._last_prune is None or now - self._last_prune > EVENT_RETENTION / 2:
+            BadgeEvent.objects.filter(created_at__lt=now - EVENT_RETENTION).delete()
+            self._last_prune = now
+        return events
+
+
+broker = BadgeBroker()
+
+
+def _sse(event, data):
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+async def badge_events(user):
+    """
+    Server-sent events for one user's badges: a ``snapshot`` of both
+    counts, then a ``delta`` per change, with a fresh snapshot every
+    SNAPSHOT_INTERVAL and keepalive comments while idle.
+    """
+    from .unread import get_unread_counts
+
+    queue = broker.subscribe(user.id)
+    loop = asyncio.get_running_loop()
+    try:
+        # Tell EventSource how soon to reconnect after a dropped connection
+        yield 'retry: 5000\n\n'
+        yield _sse('snapshot', await sync_to_async(get_unread_counts)(user.id))
+        last_snapshot = loop.time()
+        while True:
+            try:
+                delta = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+            else:
+                yield _sse('delta', delta)
+            if loop.time() - last_snapshot > SNAPSHOT_INTERVAL:
+                yield _sse('snapshot', await sync_to_async(get_unread_counts)(user.id))
+                last_snapshot = loop.time()
+    finally:
+        broker.unsubscribe(user.id, queue)
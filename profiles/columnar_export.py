@@ -0,0 +1,198 @@
+"""
+Columnar (Parquet / Arrow IPC) exports for the analytics pipeline.
+
+Each dataset is a queryset plus a list of (column, lookup) pairs. Column
+types come from the model fields, so timestamps stay timestamps, money
+stays decimal and choice fields become dictionary-encoded enums with the
+choices as a fixed dictionary. Rows are read through ``.iterator()`` and
+written as record batches, so memory use stays flat.
+
+Requires pyarrow.
+"""
+from django.conf import settings
+from django.db import models
+
+# Rows per record batch
+BATCH_SIZE = getattr(settings, 'EXPORT_BATCH_SIZE', 10000)
+
+# File extension per format
+FORMATS = {
+    'parquet': '.parquet',
+    'arrow': '.arrow',
+}
+
+# Datasets available in the columnar formats
+COLUMNAR_DATA_TYPES = ('job_postings', 'applications', 'status_history', 'user_activity')
+
+
+def _datasets():
+    from jobs.models import JobPosting, JobApplication, ApplicationStatusHistory
+    from .models import UserActivity
+
+    return {
+        'job_postings': (JobPosting.objects.order_by('id'), [
+            ('id', 'id'),
+            ('title', 'title'),
+            ('company', 'company'),
+            ('location', 'location'),
+            ('latitude', 'latitude'),
+            ('longitude', 'longitude'),
+            ('category', 'category__name'),
+            ('employment_type', 'employment_type'),
+            ('experience_level', 'experience_level'),
+            ('work_location', 'work_location'),
+            ('status', 'status'),
+            ('is_active', 'is_active'),
+            ('is_featured', 'is_featured'),
+            ('salary_min', 'salary_min'),
+            ('salary_max', 'salary_max'),
+            ('salary_currency', 'salary_currency'),
+            ('salary_period', 'salary_period'),
+            ('visa_sponsorship', 'visa_sponsorship'),
+            ('application_count', 'application_count'),
+            ('view_count', 'view_count'),
+            ('application_deadline', 'application_deadline'),
+            ('posted_by_id', 'posted_by_id'),
+            ('posted_at', 'posted_at'),
+            ('updated_at', 'updated_at'),
+        ]),
+        'applications': (JobApplication.objects.order_by('id'), [
+            ('id', 'id'),
+            ('job_id', 'job_id'),
+            ('applicant_id', 'applicant_id'),
+            ('status', 'status'),
+            ('outcome', 'outcome'),
+            ('applied_at', 'applied_at'),
+            ('updated_at', 'updated_at'),
+            ('reviewed_at', 'reviewed_at'),
+            ('interview_date', 'interview_date'),
+        ]),
+        'status_history': (ApplicationStatusHistory.objects.order_by('id'), [
+            ('id', 'id'),
+            ('application_id', 'application_id'),
+            ('job_id', 'application__job_id'),
+            ('status', 'status'),
+            ('changed_at', 'changed_at'),
+            ('changed_by_id', 'changed_by_id'),
+        ]),
+        'user_activity': (UserActivity.objects.order_by('id'), [
+            ('id', 'id'),
+            ('user_id', 'user_id'),
+            ('activity_type', 'activity_type'),
+            ('timestamp', 'timestamp'),
+            ('ip_address', 'ip_address'),
+        ]),
+    }
+
+
+def _resolve_field(model, lookup):
+    """Model field a values_list lookup such as ``application__job_id`` reads"""
+    *relations, name = lookup.split('__')
+    for relation in relations:
+        model = model._meta.get_field(relation).related_model
+    field = model._meta.get_field(name)
+    while isinstance(field, models.ForeignKey):
+        field = field.target_field
+    return field
+
+
+def _arrow_type(field):
+    import pyarrow as pa
+
+    if field.choices:
+        return pa.dictionary(pa.int16(), pa.string())
+    if isinstance(field, models.BooleanField):
+        return pa.bool_()
+    if isinstance(field, models.DateTimeField):
+        return pa.timestamp('us', tz='UTC')
+    if isinstance(field, models.DateField):
+        return pa.date32()
+    if isinstance(field, models.DecimalField):
+        return pa.decimal128(field.max_digits, field.decimal_places)
+    if isinstance(field, (models.AutoField, models.IntegerField)):
+        return pa.int64()
+    if isinstance(field, models.FloatField):
+        return pa.float64()
+    return pa.string()
+
+
+class ColumnarExport:
+    """Schema and record batches for one dataset"""
+
+    def __init__(self, data_type):
+        import pyarrow as pa
+
+        self.queryset, columns = _datasets()[data_type]
+        self.lookups = [lookup for name, lookup in columns]
+        fields = [_resolve_field(self.queryset.model, lookup) for lookup in self.lookups]
+        self.schema = pa.schema([pa.field(name, _arrow_type(field)) for (name, lookup), field in zip(columns, fields)])
+        # Fixed dictionaries, so every batch (and every file) agrees on the codes
+        self.enums = {
+            index: [str(value) for value, label in field.flatchoices]
+            for index, field in enumerate(fields) if field.choices
+        }
+
+    def count(self):
+        return self.queryset.count()
+
+    def _column(self, index, values):
+        import pyarrow as pa
+
+        arrow_type = self.schema.field(index).type
+        if index in self.enums:
+            dictionary = self.enums[index]
+            codes = {value: code for code, value in enumerate(dictionary)}
+            # Values outside the field's choices are exported as null
+            indices = pa.array([codes.get(value) for value in values], type=pa.int16())
+            return pa.DictionaryArray.from_arrays(indices, pa.array(dictionary, type=pa.string()))
+        if pa.types.is_string(arrow_type):
+            values = [None if value is None else str(value) for value in values]
+        return pa.array(values, type=arrow_type)
+
+    def batches(self, batch_size=BATCH_SIZE):
+        """Yield RecordBatches read through a chunked cursor"""
+        rows = []
+        for row in self.queryset.values_list(*self.lookups).iterator(chunk_size=batch_size):
+            rows.append(row)
+            if len(rows) >= batch_size:
+                yield self._batch(rows)
+                rows = []
+        if rows:
+            yield self._batch(rows)
+
+    def _batch(self, rows):
+        import pyarrow as pa
+
+        columns = list(zip(*rows))
+        return pa.RecordBatch.from_arrays(
+            [self._column(index, columns[index]) for index in range(len(self.lookups))],
+            schema=self.schema,
+        )
+
+
+def write_columnar(data_type, path, file_format='parquet', progress=None):
+    """
+    Write a dataset to ``path`` as Parquet or an Arrow IPC file.
+
+    ``progress`` is called with the running row count after each batch.
+    Returns the number of rows written.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    export = ColumnarExport(data_type)
+    if file_format == 'parquet':
+        writer = pq.ParquetWriter(path, export.schema, compression='zstd')
+    else:
+        writer = pa.ipc.new_file(path, export.schema, options=pa.ipc.IpcWriteOptions(compression='zstd'))
+
+    rows_written = 0
+    try:
+        for batch in export.batches():
+            writer.write_batch(batch)
+            rows_written += batch.num_rows
+            if progress:
+                progress(rows_written)
+    finally:
+        writer.close()
+    return rows_written
@@ -0,0 +1,306 @@
+"""
+Streaming CSV exports for the admin dashboard and the Django admin.
+
+Each ``*_rows`` function yields a header row followed by one row per
+record. Rows are read with ``values_list`` through ``.iterator()``, so
+only one chunk of plain tuples is in memory at a time, and csv_response
+streams the encoded rows to the client as they are produced.
+"""
+import csv
+from django.conf import settings
+from django.db.models import Exists, OuterRef
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+# Rows fetched from the database per round trip
+CHUNK_SIZE = getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+
+# CSV lines joined into each chunk sent to the client
+LINES_PER_WRITE = 500
+
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class Echo:
+    """File-like object whose write() hands back the line instead of storing it"""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    """Encode rows as CSV text chunks, starting with a BOM for Excel"""
+    writer = csv.writer(Echo())
+    yield '\ufeff'
+    lines = []
+    for row in rows:
+        lines.append(writer.writerow(row))
+        if len(lines) >= LINES_PER_WRITE:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
+
+
+def csv_response(name, rows):
+    """StreamingHttpResponse downloading rows as ``<name>_<timestamp>.csv``"""
+    response = StreamingHttpResponse(stream_csv(rows), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{name}_{timezone.now().strftime("%Y%m%d_%H%M%S")}.csv"'
+    return response
+
+
+def _choices(model, field_name):
+    return dict(model._meta.get_field(field_name).flatchoices)
+
+
+def _datetime(value, default=''):
+    return value.strftime(DATETIME_FORMAT) if value else default
+
+
+def _yes_no(value):
+    return 'Yes' if value else 'No'
+
+
+def user_rows(queryset):
+    """
+    Rows for a CustomUser queryset.
+
+    Profile flags are Exists() subqueries, so the whole export is a single
+    query read in chunks however many users there are.
+    """
+    from recruiters.models import RecruiterProfile
+    from .models import CustomUser, JobSeekerProfile
+
+    user_types = _choices(CustomUser, 'user_type')
+    statuses = _choices(CustomUser, 'status')
+
+    yield [
+        'Username', 'Email', 'First Name', 'Last Name', 'User Type',
+        'Status', 'Is Superuser', 'Is Staff', 'Date Joined', 'Last Login',
+        'Has Job Seeker Profile', 'Has Recruiter Profile'
+    ]
+    users = queryset.annotate(
+        has_job_seeker_profile=Exists(JobSeekerProfile.objects.filter(user=OuterRef('pk'))),
+        has_recruiter_profile=Exists(RecruiterProfile.objects.filter(user=OuterRef('pk'))),
+    ).order_by('-date_joined').values_list(
+        'username', 'email', 'first_name', 'last_name', 'user_type', 'status',
+        'is_superuser', 'is_staff', 'date_joined', 'last_login',
+        'has_job_seeker_profile', 'has_recruiter_profile',
+    )
+    for (username, email, first_name, last_name, user_type, status, is_superuser, is_staff,
+         date_joined, last_login, has_job_seeker_profile, has_recruiter_profile) in users.iterator(chunk_size=CHUNK_SIZE):
+        yield [
+            username,
+            email,
+            first_name or '',
+            last_name or '',
+            user_types.get(user_type, user_type),
+            statuses.get(status, status),
+            _yes_no(is_superuser),
+            _yes_no(is_staff),
+            _datetime(date_joined),
+            _datetime(last_login, 'Never'),
+            _yes_no(has_job_seeker_profile),
+            _yes_no(has_recruiter_profile),
+        ]
+
+
+def job_posting_rows(queryset):
+    """Rows for a JobPosting queryset"""
+    from jobs.models import JobPosting
+
+    employment_types = _choices(JobPosting, 'employment_type')
+    experience_levels = _choices(JobPosting, 'experience_level')
+    work_locations = _choices(JobPosting, 'work_location')
+    statuses = _choices(JobPosting, 'status')
+
+    yield [
+        'ID', 'Title', 'Company', 'Location', 'Category', 'Employment Type',
+        'Experience Level', 'Work Location', 'Status', 'Is Active',
+        'Salary Min', 'Salary Max', 'Salary Currency', 'Salary Period',
+        'Visa Sponsorship', 'Application Count', 'View Count',
+        'Posted By (Email)', 'Posted By (Username)', 'Posted At', 'Updated At'
+    ]
+    jobs = queryset.order_by('-posted_at').values_list(
+        'id', 'title', 'company', 'location', 'category__name', 'employment_type',
+        'experience_level', 'work_location', 'status', 'is_active',
+        'salary_min', 'salary_max', 'salary_currency', 'salary_period',
+        'visa_sponsorship', 'application_count', 'view_count',
+        'posted_by__email', 'posted_by__username', 'posted_at', 'updated_at',
+    )
+    for (job_id, title, company, location, category, employment_type, experience_level, work_location,
+         status, is_active, salary_min, salary_max, salary_currency, salary_period, visa_sponsorship,
+         application_count, view_count, posted_by_email, posted_by_username, posted_at,
+         updated_at) in jobs.iterator(chunk_size=CHUNK_SIZE):
+        yield [
+            job_id,
+            title or '',
+            company or '',
+            location or '',
+            category or '',
+            employment_types.get(employment_type, employment_type),
+            experience_levels.get(experience_level, experience_level),
+            work_locations.get(work_location, work_location),
+            statuses.get(status, status),
+            _yes_no(is_active),
+            str(salary_min) if salary_min else '',
+            str(salary_max) if salary_max else '',
+            salary_currency,
+            salary_period,
+            _yes_no(visa_sponsorship),
+            application_count,
+            view_count,
+            posted_by_email or '',
+            posted_by_username or '',
+            _datetime(posted_at),
+            _datetime(updated_at),
+        ]
+
+
+def application_rows(queryset):
+    """Rows for a JobApplication queryset"""
+    from jobs.models import JobApplication
+
+    statuses = _choices(JobApplication, 'status')
+    outcomes = _choices(JobApplication, 'outcome')
+
+    yield [
+        'ID', 'Job Title', 'Job Company', 'Applicant Email', 'Applicant Username',
+        'Applicant Name', 'Status', 'Outcome', 'Applied At', 'Interview Date',
+        'Has Resume', 'Has Cover Letter'
+    ]
+    applications = queryset.order_by('-applied_at').values_list(
+        'id', 'job__title', 'job__company', 'applicant__email', 'applicant__username',
+        'applicant__first_name', 'applicant__last_name', 'status', 'outcome',
+        'applied_at', 'interview_date', 'resume', 'cover_letter',
+    )
+    for (application_id, job_title, job_company, email, username, first_name, last_name, status,
+         outcome, applied_at, interview_date, resume, cover_letter) in applications.iterator(chunk_size=CHUNK_SIZE):
+        yield [
+            application_id,
+            job_title or '',
+            job_company or '',
+            email or '',
+            username or '',
+            f'{first_name} {last_name}'.strip() or username,
+            statuses.get(status, status),
+            outcomes.get(outcome, outcome),
+            _datetime(applied_at),
+            _datetime(interview_date),
+            _yes_no(resume),
+            _yes_no(cover_letter),
+        ]
+
+
+def admin_action_rows(queryset):
+    """Rows for an AdminActionLog queryset"""
+    from .models import AdminActionLog
+
+    action_types = _choices(AdminActionLog, 'action_type')
+
+    yield [
+        'ID', 'Admin User', 'Admin Email', 'Target User', 'Target Email',
+        'Action Type', 'Description', 'Previous Value', 'New Value',
+        'IP Address', 'User Agent', 'Created At'
+    ]
+    logs = queryset.order_by('-created_at').values_list(
+        'id', 'admin_user__username', 'admin_user__email', 'target_user__username', 'target_user__email',
+        'action_type', 'description', 'previous_value', 'new_value',
+        'ip_address', 'user_agent', 'created_at',
+    )
+    for (log_id, admin_username, admin_email, target_username, target_email, action_type, description,
+         previous_value, new_value, ip_address, user_agent, created_at) in logs.iterator(chunk_size=CHUNK_SIZE):
+        yield [
+            log_id,
+            admin_username or '',
+            admin_email or '',
+            target_username or '',
+            target_email or '',
+            action_types.get(action_type, action_type),
+            description,
+            previous_value,
+            new_value,
+            ip_address or '',
+            user_agent[:200] if user_agent else '',  # Truncate long user agents
+            _datetime(created_at),
+        ]
+
+
+def activity_rows(queryset):
+    """Rows for a UserActivity queryset"""
+    from .models import UserActivity
+
+    activity_types = _choices(UserActivity, 'activity_type')
+
+    yield ['ID', 'User', 'Email', 'Activity Type', 'Timestamp', 'IP Address', 'Details']
+    activities = queryset.order_by('-timestamp').values_list(
+        'id', 'user__username', 'user__email', 'activity_type', 'timestamp', 'ip_address', 'details',
+    )
+    for (activity_id, username, email, activity_type, timestamp, ip_address,
+         details) in activities.iterator(chunk_size=CHUNK_SIZE):
+        yield [
+            activity_id,
+            username or '',
+            email or '',
+            activity_types.get(activity_type, activity_type),
+            _datetime(timestamp),
+            ip_address or '',
+            details[:500] if details else '',  # Limit details length
+        ]
+
+
+def status_history_rows(queryset):
+    """Rows for an ApplicationStatusHistory queryset"""
+    from jobs.models import ApplicationStatusHistory
+
+    statuses = _choices(ApplicationStatusHistory, 'status')
+
+    yield ['ID', 'Application ID', 'Job ID', 'Job Title', 'Applicant Username', 'Status', 'Changed At', 'Changed By', 'Notes']
+    history = queryset.order_by('-changed_at').values_list(
+        'id', 'application_id', 'application__job_id', 'application__job__title', 'application__applicant__username',
+        'status', 'changed_at', 'changed_by__username', 'notes',
+    )
+    for (entry_id, application_id, job_id, job_title, applicant_username, status, changed_at,
+         changed_by_username, notes) in history.iterator(chunk_size=CHUNK_SIZE):
+        yield [
+            entry_id,
+            application_id,
+            job_id,
+            job_title or '',
+            applicant_username or '',
+            statuses.get(status, status),
+            _datetime(changed_at),
+            changed_by_username or '',
+            notes,
+        ]
+
+
+def _export_querysets():
+    from jobs.models import JobPosting, JobApplication, ApplicationStatusHistory
+    from .models import CustomUser, AdminActionLog, UserActivity
+
+    return {
+        'users': (CustomUser.objects.all(), user_rows),
+        'job_postings': (JobPosting.objects.all(), job_posting_rows),
+        'applications': (JobApplication.objects.all(), application_rows),
+        'admin_actions': (AdminActionLog.objects.all(), admin_action_rows),
+        'status_history': (ApplicationStatusHistory.objects.all(), status_history_rows),
+        'user_activity': (UserActivity.objects.all(), activity_rows),
+    }
+
+
+def export_rows(data_type):
+    """Rows of one of the admin dashboard exports (ExportJob.DATA_TYPES)"""
+    if data_type == 'usage_metrics':
+        from .metrics import usage_metrics_rows
+        return usage_metrics_rows()
+    queryset, rows = _export_querysets()[data_type]
+    return rows(queryset)
+
+
+def count_export_rows(data_type):
+    """Number of data rows an export will have, or None if not known up front"""
+    querysets = _export_querysets()
+    if data_type not in querysets:
+        return None
+    return querysets[data_type][0].count()
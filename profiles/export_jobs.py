@@ -0,0 +1,226 @@
+"""
+Background export jobs.
+
+An admin queues an ExportJob from the dashboard and the
+process_export_jobs worker writes the export under MEDIA_ROOT/exports/,
+as gzip-compressed CSV or in a columnar format (see columnar_export),
+reporting progress on the job row as it goes.
+
+A running job writes a heartbeat at least every HEARTBEAT_EVERY seconds
+while rows are produced, whatever the export. A job whose heartbeat is
+older than STALE_AFTER is requeued. The claim's started_at identifies the
+run, so a worker whose job was requeued and claimed again stops at its
+next heartbeat and never overwrites the new run's result.
+Finished files are downloaded through file_range_response, which honours
+Range requests so an interrupted download can be resumed.
+"""
+import csv
+import gzip
+import os
+import re
+import time
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from .columnar_export import COLUMNAR_DATA_TYPES, FORMATS as COLUMNAR_FORMATS, ColumnarExport, write_columnar
+from .csv_export import export_rows, count_export_rows
+from .models import ExportJob
+
+EXPORT_DIR = 'exports'
+
+EXTENSIONS = dict(COLUMNAR_FORMATS, csv='.csv.gz')
+
+CONTENT_TYPES = {
+    'csv': 'application/gzip',
+    'parquet': 'application/vnd.apache.parquet',
+    'arrow': 'application/vnd.apache.arrow.file',
+}
+
+# Seconds between progress updates (heartbeats) of a running job
+HEARTBEAT_EVERY = getattr(settings, 'EXPORT_HEARTBEAT_SECONDS', 30)
+
+# Running jobs without a heartbeat for this long are requeued
+STALE_AFTER = timedelta(seconds=getattr(settings, 'EXPORT_JOB_TIMEOUT', 600))
+
+# Bytes read per chunk when serving a file
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class ExportJobLost(Exception):
+    """The job was requeued and claimed again while this worker ran it"""
+
+
+def request_export(user, data_type, file_format='csv'):
+    """Queue an export for the worker"""
+    return ExportJob.objects.create(requested_by=user, data_type=data_type, file_format=file_format)
+
+
+def is_valid_export(data_type, file_format):
+    """True if ``data_type`` can be exported as ``file_format``"""
+    if data_type not in dict(ExportJob.DATA_TYPES):
+        return False
+    if file_format == 'csv':
+        return True
+    return file_format in COLUMNAR_FORMATS and data_type in COLUMNAR_DATA_TYPES
+
+
+def claim_next_job():
+    """Mark the oldest pending job as running and return it, or None"""
+    pending = ExportJob.objects.filter(status='pending').order_by('created_at')
+    for job_id in pending.values_list('id', flat=True)[:10]:
+        now = timezone.now()
+        # Only one worker wins the conditional update
+        if ExportJob.objects.filter(id=job_id, status='pending').update(status='running', started_at=now, heartbeat_at=now):
+            return ExportJob.objects.get(id=job_id)
+    return None
+
+
+def requeue_stale_jobs():
+    """Put running jobs whose worker stopped reporting back in the queue"""
+    return ExportJob.objects.filter(
+        status='running',
+        heartbeat_at__lt=timezone.now() - STALE_AFTER
+    ).update(status='pending', rows_written=0)
+
+
+def write_csv_gzip(data_type, path, progress=None):
+    """
+    Write an export as gzip-compressed CSV.
+
+    ``progress`` is called with the running row count after every row.
+    Returns the number of data rows written.
+    """
+    rows_written = 0
+    with gzip.open(path, 'wt', compresslevel=6, encoding='utf-8', newline='') as output:
+        output.write('\ufeff')  # BOM for Excel
+        writer = csv.writer(output)
+        rows = export_rows(data_type)
+        writer.writerow(next(rows))  # Header
+        for row in rows:
+            writer.writerow(row)
+            rows_written += 1
+            if progress:
+                progress(rows_written)
+    return rows_written
+
+
+def run_export_job(job):
+    """
+    Write one export file, updating the job's progress as rows are written.
+
+    The file is written under a temporary name and moved into place when
+    complete. Returns the refreshed job.
+    """
+    extension = EXTENSIONS[job.file_format]
+    name = f'{EXPORT_DIR}/{job.data_type}_export_{timezone.now().strftime("%Y%m%d_%H%M%S")}_{uuid.uuid4().hex[:12]}{extension}'
+    path = os.path.join(settings.MEDIA_ROOT, name)
+    partial = f'{path}.part'
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # Only this run's claim: still running and not claimed again since
+    owned = ExportJob.objects.filter(id=job.id, status='running', started_at=job.started_at)
+    last_beat = time.monotonic()
+
+    def report(rows_written=0, force=False, **fields):
+        nonlocal last_beat
+        if not force and time.monotonic() - last_beat < HEARTBEAT_EVERY:
+            return
+        last_beat = time.monotonic()
+        if not owned.update(rows_written=rows_written, heartbeat_at=timezone.now(), **fields):
+            raise ExportJobLost(f'Export #{job.id} was requeued')
+
+    try:
+        if job.file_format == 'csv':
+            report(force=True, total_rows=count_export_rows(job.data_type))
+            rows_written = write_csv_gzip(job.data_type, partial, report)
+        else:
+            report(force=True, total_rows=ColumnarExport(job.data_type).count())
+            rows_written = write_columnar(job.data_type, partial, job.file_format, report)
+        os.replace(partial, path)
+    except Exception as e:
+        if os.path.exists(partial):
+            os.remove(partial)
+        if not isinstance(e, ExportJobLost):
+            owned.update(
+                status='failed',
+                error=str(e),
+                finished_at=timezone.now()
+            )
+    else:
+        completed = owned.update(
+            status='completed',
+            rows_written=rows_written,
+            file=name,
+            file_size=os.path.getsize(path),
+            finished_at=timezone.now()
+        )
+        if not completed:
+            # Another worker owns the job now and writes its own file
+            os.remove(path)
+
+    job.refresh_from_db()
+    return job
+
+
+def process_export_jobs(limit=None):
+    """Run pending export jobs until the queue is empty. Returns the jobs run."""
+    requeue_stale_jobs()
+    finished = []
+    while limit is None or len(finished) < limit:
+        job = claim_next_job()
+        if job is None:
+            break
+        finished.append(run_export_job(job))
+    return finished
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as source:
+        source.seek(start)
+        while length > 0:
+            chunk = source.read(min(DOWNLOAD_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def file_range_response(request, path, filename, content_type='application/gzip'):
+    """
+    Serve a file as an attachment, honouring a single ``Range: bytes=``
+    request (with ``If-Range``) so interrupted downloads can resume.
+    """
+    stat = os.stat(path)
+    size = stat.st_size
+    etag = f'"{int(stat.st_mtime)}-{size}"'
+    start, end = 0, size - 1
+    status = 200
+
+    match = RANGE_RE.match(request.headers.get('Range', '').strip())
+    if_range = request.headers.get('If-Range')
+    if match and any(match.groups()) and (not if_range or if_range == etag):
+        first, last = match.groups()
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        else:
+            # Suffix range: the last N bytes
+            start = max(0, size - int(last))
+        if start > end:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        status = 206
+
+    response = StreamingHttpResponse(_read_range(path, start, end - start + 1), status=status, content_type=content_type)
+    response['Content-Length'] = str(end - start + 1)
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    if status == 206:
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
@@ -0,0 +1,78 @@
+"""
+Management command to benchmark the streaming users CSV export
+"""
+import time
+import tracemalloc
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from profiles.csv_export import stream_csv, user_rows
+from profiles.models import CustomUser, JobSeekerProfile
+from recruiters.models import RecruiterProfile
+
+
+class Rollback(Exception):
+    pass
+
+
+def create_benchmark_users(count, batch_size=5000):
+    """Bulk insert ``count`` users with profiles, without sending signals"""
+    prefix = f'export-benchmark-{int(time.time())}'
+    for offset in range(0, count, batch_size):
+        users = CustomUser.objects.bulk_create([
+            CustomUser(
+                username=f'{prefix}-{number}',
+                email=f'{prefix}-{number}@example.com',
+                password='!',
+                user_type='recruiter' if number % 3 == 1 else 'job_seeker',
+            )
+            for number in range(offset, min(offset + batch_size, count))
+        ])
+        # One third job seekers with a profile, one third recruiters with a profile
+        JobSeekerProfile.objects.bulk_create([
+            JobSeekerProfile(user=user, headline='Benchmark candidate')
+            for number, user in enumerate(users, offset) if number % 3 == 0
+        ])
+        RecruiterProfile.objects.bulk_create([
+            RecruiterProfile(user=user, company='Benchmark Co')
+            for number, user in enumerate(users, offset) if number % 3 == 1
+        ])
+
+
+class Command(BaseCommand):
+    help = 'Time the users CSV export against generated users and count its queries (changes are rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=100000,
+            help='Number of users to generate',
+        )
+
+    def handle(self, *args, **options):
+        count = options['users']
+
+        try:
+            with transaction.atomic():
+                self.stdout.write(f'Creating {count} users...')
+                start = time.perf_counter()
+                create_benchmark_users(count)
+                self.stdout.write(f'  Created in {time.perf_counter() - start:.2f}s')
+
+                tracemalloc.start()
+                start = time.perf_counter()
+                with CaptureQueriesContext(connection) as queries:
+                    size = sum(len(chunk) for chunk in stream_csv(user_rows(CustomUser.objects.all())))
+                elapsed = time.perf_counter() - start
+                current, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+                total = CustomUser.objects.count()
+                self.stdout.write(self.style.SUCCESS(
+                    f'Exported {total} users ({size / 1024 / 1024:.1f} MB of CSV) in {elapsed:.2f}s '
+                    f'with {len(queries.captured_queries)} queries, peak Python memory {peak / 1024 / 1024:.1f} MB.'
+                ))
+                raise Rollback
+        except Rollback:
+            self.stdout.write('Generated users rolled back.')
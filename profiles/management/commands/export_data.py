@@ -0,0 +1,48 @@
+"""
+Management command to write an export straight to a file
+"""
+import time
+from django.core.management.base import BaseCommand, CommandError
+from profiles.export_jobs import EXTENSIONS, is_valid_export, write_csv_gzip
+from profiles.models import ExportJob
+
+
+class Command(BaseCommand):
+    help = 'Export a dataset to a file as gzip CSV, Parquet or Arrow IPC (for the analytics pipeline)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'data_type',
+            choices=[data_type for data_type, label in ExportJob.DATA_TYPES],
+        )
+        parser.add_argument(
+            '--format',
+            default='parquet',
+            choices=[file_format for file_format, label in ExportJob.FORMAT_CHOICES],
+            help='Output format (default: parquet)',
+        )
+        parser.add_argument(
+            '--output',
+            help='File to write (default: <data_type><extension> in the current directory)',
+        )
+
+    def handle(self, *args, **options):
+        data_type = options['data_type']
+        file_format = options['format']
+        if not is_valid_export(data_type, file_format):
+            raise CommandError(f'{data_type} can only be exported as csv')
+        output = options.get('output') or f'{data_type}{EXTENSIONS[file_format]}'
+
+        start = time.perf_counter()
+        if file_format == 'csv':
+            rows = write_csv_gzip(data_type, output)
+        else:
+            try:
+                from profiles.columnar_export import write_columnar
+                rows = write_columnar(data_type, output, file_format)
+            except ImportError:
+                raise CommandError('Columnar exports require pyarrow (pip install pyarrow)')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {rows} {data_type} rows to {output} in {time.perf_counter() - start:.2f}s'
+        ))
@@ -0,0 +1,16 @@
+"""
+Management command to write spilled user activity events to the database
+"""
+from django.core.management.base import BaseCommand
+from profiles.activity_log import replay_spill_file, spill_file
+
+
+class Command(BaseCommand):
+    help = 'Replay user activity events spilled to disk by the background activity logger'
+
+    def handle(self, *args, **options):
+        written = replay_spill_file()
+        if written:
+            self.stdout.write(self.style.SUCCESS(f'Wrote {written} spilled activity events from {spill_file()}.'))
+        else:
+            self.stdout.write('No spilled activity events to replay.')
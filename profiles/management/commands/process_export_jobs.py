@@ -0,0 +1,48 @@
+"""
+Management command to run queued admin CSV exports
+"""
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection
+from profiles.export_jobs import process_export_jobs
+
+
+class Command(BaseCommand):
+    help = 'Write queued admin dashboard exports to gzip files under MEDIA_ROOT/exports/'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep polling for new jobs instead of exiting when the queue is empty',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5,
+            help='Seconds between polls with --loop',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            help='Run at most this many jobs per poll',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            for job in process_export_jobs(limit=options.get('limit')):
+                if job.status == 'completed':
+                    self.stdout.write(self.style.SUCCESS(
+                        f'Export #{job.id} ({job.data_type}): {job.rows_written} rows, '
+                        f'{job.file_size / 1024:.0f} KB in {(job.finished_at - job.started_at).total_seconds():.1f}s'
+                    ))
+                elif job.status == 'failed':
+                    self.stdout.write(self.style.WARNING(f'Export #{job.id} ({job.data_type}) failed: {job.error}'))
+                else:
+                    self.stdout.write(self.style.WARNING(f'Export #{job.id} ({job.data_type}) was requeued; left to its new run'))
+
+            if not options['loop']:
+                return
+            # Don't hold a connection open while idle
+            connection.close()
+            time.sleep(options['interval'])
@@ -0,0 +1,17 @@
+"""
+Management command to repair drifted unread message and notification counters
+"""
+from django.core.management.base import BaseCommand
+from profiles.unread import reconcile_conversations, reconcile_users
+
+
+class Command(BaseCommand):
+    help = 'Recount unread messages and notifications and fix any counters that have drifted (safe to run any time)'
+
+    def handle(self, *args, **options):
+        conversations = reconcile_conversations()
+        users = reconcile_users()
+        style = self.style.WARNING if conversations or users else self.style.SUCCESS
+        self.stdout.write(style(
+            f'Fixed unread counts on {conversations} conversation(s) and {users} user(s).'
+        ))
@@ -0,0 +1,76 @@
+"""
+Management command to recompute daily usage metrics from the source tables
+"""
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+from profiles.models import CustomUser, UserActivity
+from profiles.metrics import rollup_daily_metrics
+
+
+def parse_date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f'Invalid date "{value}", expected YYYY-MM-DD')
+
+
+class Command(BaseCommand):
+    help = 'Recompute daily usage metrics (yesterday by default; run nightly, or with --all to backfill history)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            help='Recompute a single day (YYYY-MM-DD)',
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            help='Recompute the last N days, including today',
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Rebuild every day since the first registration, job or activity',
+        )
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        end = today + timedelta(days=1)
+
+        if options['all']:
+            start = self.first_day() or today
+        elif options.get('days'):
+            start = today - timedelta(days=max(1, options['days']) - 1)
+        elif options.get('date'):
+            start = parse_date(options['date'])
+            end = start + timedelta(days=1)
+        else:
+            start = today - timedelta(days=1)
+            end = today
+
+        # Roll up a month at a time to keep each transaction short
+        rows = 0
+        chunk_start = start
+        while chunk_start < end:
+            chunk_end = min(chunk_start + timedelta(days=31), end)
+            rows += rollup_daily_metrics(chunk_start, chunk_end)
+            chunk_start = chunk_end
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rolled up {(end - start).days} day(s) from {start} to {end - timedelta(days=1)}: {rows} metric rows.'
+        ))
+
+    def first_day(self):
+        """Earliest date any metric source has a row for"""
+        from jobs.models import JobPosting, JobApplication
+
+        earliest = [
+            CustomUser.objects.aggregate(first=Min('date_joined'))['first'],
+            JobPosting.objects.aggregate(first=Min('posted_at'))['first'],
+            JobApplication.objects.aggregate(first=Min('applied_at'))['first'],
+            UserActivity.objects.aggregate(first=Min('timestamp'))['first'],
+        ]
+        earliest = [timezone.localdate(value) for value in earliest if value]
+        return min(earliest) if earliest else None
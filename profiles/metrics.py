@@ -0,0 +1,192 @@
+"""
+Daily usage metric rollups.
+
+Usage reports used to count the user, job and application tables once per
+metric and again for every day of the report. DailyMetric keeps one row
+per (date, metric) instead:
+
+- registrations, registrations_<user type>
+- job_postings
+- applications
+- activity_<activity type>
+
+Signals and the activity log bump today's rows as events happen, and the
+rollup_daily_metrics command recomputes whole days from the source tables
+(nightly for yesterday, or with --all to rebuild history). Reports read a
+date range of rows in a single query.
+"""
+from collections import Counter
+from datetime import datetime, time, timedelta
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .models import CustomUser, DailyMetric, UserActivity
+
+
+def registration_metric(user_type):
+    return f'{DailyMetric.REGISTRATIONS}_{user_type}'
+
+
+def activity_metric(activity_type):
+    return f'activity_{activity_type}'
+
+
+def record_metrics(counts):
+    """
+    Add to daily metrics.
+
+    ``counts`` maps (date, metric) to the amount to add.
+    """
+    for (date, metric), amount in counts.items():
+        if not amount:
+            continue
+        if DailyMetric.objects.filter(date=date, metric=metric).update(value=F('value') + amount):
+            continue
+        try:
+            with transaction.atomic():
+                DailyMetric.objects.create(date=date, metric=metric, value=amount)
+        except IntegrityError:
+            # Another process created the row first
+            DailyMetric.objects.filter(date=date, metric=metric).update(value=F('value') + amount)
+
+
+def record_metric(metric, when=None, amount=1):
+    """Add ``amount`` to a metric for the day of ``when`` (default today)"""
+    date = timezone.localdate(when) if when else timezone.localdate()
+    record_metrics({(date, metric): amount})
+
+
+def _day_start(date):
+    return timezone.make_aware(datetime.combine(date, time.min))
+
+
+def _count_by_day(queryset, field, start, end, *group_by):
+    """Yield (date, *group_by values, count) rows for ``field`` in [start, end)"""
+    rows = queryset.filter(**{
+        f'{field}__gte': _day_start(start),
+        f'{field}__lt': _day_start(end),
+    }).annotate(day=TruncDate(field)).values('day', *group_by).annotate(total=Count('pk')).order_by()
+    for row in rows:
+        yield (row['day'],) + tuple(row[name] for name in group_by) + (row['total'],)
+
+
+def compute_daily_metrics(start, end):
+    """
+    Count every metric for the days in [start, end) from the source tables.
+
+    Returns a Counter of (date, metric) -> value.
+    """
+    from jobs.models import JobPosting, JobApplication
+
+    counts = Counter()
+    for date, user_type, total in _count_by_day(CustomUser.objects.all(), 'date_joined', start, end, 'user_type'):
+        counts[date, DailyMetric.REGISTRATIONS] += total
+        counts[date, registration_metric(user_type)] += total
+    for date, total in _count_by_day(JobPosting.objects.all(), 'posted_at', start, end):
+        counts[date, DailyMetric.JOB_POSTINGS] += total
+    for date, total in _count_by_day(JobApplication.objects.all(), 'applied_at', start, end):
+        counts[date, DailyMetric.APPLICATIONS] += total
+    for date, activity_type, total in _count_by_day(UserActivity.objects.all(), 'timestamp', start, end, 'activity_type'):
+        counts[date, activity_metric(activity_type)] += total
+    return counts
+
+
+def rollup_daily_metrics(start, end):
+    """
+    Replace the stored metrics for the days in [start, end) with fresh counts.
+
+    Returns the number of rows written.
+    """
+    counts = compute_daily_metrics(start, end)
+    with transaction.atomic():
+        DailyMetric.objects.filter(date__gte=start, date__lt=end).delete()
+        DailyMetric.objects.bulk_create(
+            [DailyMetric(date=date, metric=metric, value=value) for (date, metric), value in counts.items()],
+            batch_size=500,
+        )
+    return len(counts)
+
+
+def get_daily_series(start, end):
+    """
+    Return [(date, {metric: value})] for every day in [start, end), newest first.
+
+    Days without any rows are included with an empty dict.
+    """
+    series = {start + timedelta(days=offset): {} for offset in range((end - start).days)}
+    rows = DailyMetric.objects.filter(date__gte=start, date__lt=end).values_list('date', 'metric', 'value')
+    for date, metric, value in rows:
+        series[date][metric] = value
+    return sorted(series.items(), reverse=True)
+
+
+def get_usage_totals():
+    """Current user and job totals, one query per table"""
+    from jobs.models import JobPosting, JobApplication
+
+    totals = CustomUser.objects.aggregate(
+        total_users=Count('pk'),
+        active_users=Count('pk', filter=Q(status='active')),
+        suspended_users=Count('pk', filter=Q(status='suspended')),
+        flagged_users=Count('pk', filter=Q(status='flagged')),
+        job_seekers=Count('pk', filter=Q(user_type='job_seeker')),
+        recruiters=Count('pk', filter=Q(user_type='recruiter')),
+    )
+    totals.update(JobPosting.objects.aggregate(
+        total_jobs=Count('pk'),
+        active_jobs=Count('pk', filter=Q(is_active=True)),
+        inactive_jobs=Count('pk', filter=Q(is_active=False)),
+        published_jobs=Count('pk', filter=Q(status='published')),
+    ))
+    totals['total_applications'] = JobApplication.objects.count()
+    return totals
+
+
+def usage_metrics_rows(days=30):
+    """Yield the rows of the usage metrics CSV report"""
+    yield ['Metric', 'Value', 'Period', 'Date']
+
+    today = timezone.localdate()
+    first_day_of_month = today.replace(day=1)
+    start = min(first_day_of_month, today - timedelta(days=days - 1))
+    series = get_daily_series(start, today + timedelta(days=1))
+
+    def total_since(since, metric):
+        return sum(values.get(metric, 0) for date, values in series if date >= since)
+
+    totals = get_usage_totals()
+    date = today.strftime('%Y-%m-%d')
+    metrics = [
+        ('Total Users', totals['total_users'], 'All Time', date),
+        ('Active Users', totals['active_users'], 'All Time', date),
+        ('Job Seekers', totals['job_seekers'], 'All Time', date),
+        ('Recruiters', totals['recruiters'], 'All Time', date),
+        ('Total Job Postings', totals['total_jobs'], 'All Time', date),
+        ('Active Job Postings', totals['active_jobs'], 'All Time', date),
+        ('Published Job Postings', totals['published_jobs'], 'All Time', date),
+        ('Total Applications', totals['total_applications'], 'All Time', date),
+        ('Applications This Month', total_since(first_day_of_month, DailyMetric.APPLICATIONS), 'This Month', date),
+        ('New Users Today', total_since(today, DailyMetric.REGISTRATIONS), 'Today', date),
+        ('New Users This Week', total_since(today - timedelta(days=6), DailyMetric.REGISTRATIONS), 'This Week', date),
+        ('New Users This Month', total_since(first_day_of_month, DailyMetric.REGISTRATIONS), 'This Month', date),
+    ]
+    yield from metrics
+
+    # Time series, newest day first
+    activity_types = [activity_type for activity_type, label in UserActivity.ACTIVITY_TYPES]
+    yield []
+    yield (
+        ['Date', 'New Registrations', 'New Job Postings', 'New Applications']
+        + [label for activity_type, label in UserActivity.ACTIVITY_TYPES]
+    )
+    for date, values in series[:days]:
+        yield (
+            [
+                date.strftime('%Y-%m-%d'),
+                values.get(DailyMetric.REGISTRATIONS, 0),
+                values.get(DailyMetric.JOB_POSTINGS, 0),
+                values.get(DailyMetric.APPLICATIONS, 0),
+            ]
+            + [values.get(activity_metric(activity_type), 0) for activity_type in activity_types]
+        )
@@ -0,0 +1,66 @@
+# Generated by Django 5.0 on 2026-10-17 09:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_search_documents(apps, schema_editor):
+    JobSeekerProfile = apps.get_model('profiles', 'JobSeekerProfile')
+    CandidateSearchDocument = apps.get_model('profiles', 'CandidateSearchDocument')
+    documents = []
+    for profile in JobSeekerProfile.objects.select_related('user').prefetch_related('skills', 'work_experience', 'education'):
+        documents.append(CandidateSearchDocument(
+            profile=profile,
+            name=f'{profile.user.first_name} {profile.user.last_name}'.strip(),
+            headline=profile.headline,
+            bio=profile.bio,
+            skills='\n'.join(skill.name for skill in profile.skills.all()),
+            experience='\n'.join(experience.position for experience in profile.work_experience.all()),
+            education='\n'.join(
+                f'{education.degree} {education.field_of_study}'.strip() for education in profile.education.all()
+            ),
+        ))
+    CandidateSearchDocument.objects.bulk_create(documents, batch_size=1000)
+
+    # Only SQLite needs a side table; other databases search natively
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS profiles_candidatesearchdocument_fts "
+        "USING fts5(name, skills, headline, experience, education, bio, "
+        "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    )
+    schema_editor.execute(
+        "INSERT INTO profiles_candidatesearchdocument_fts (rowid, name, skills, headline, experience, education, bio) "
+        "SELECT profile_id, name, skills, headline, experience, education, bio FROM profiles_candidatesearchdocument"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS profiles_candidatesearchdocument_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0009_useractivity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CandidateSearchDocument',
+            fields=[
+                ('profile', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='profiles.jobseekerprofile')),
+                ('name', models.CharField(blank=True, max_length=301)),
+                ('headline', models.CharField(blank=True, max_length=200)),
+                ('bio', models.TextField(blank=True)),
+                ('skills', models.TextField(blank=True, help_text='Skill names, one per line')),
+                ('experience', models.TextField(blank=True, help_text='Work experience positions, one per line')),
+                ('education', models.TextField(blank=True, help_text='Degrees and fields of study, one per line')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(build_search_documents, drop_search_index),
+    ]
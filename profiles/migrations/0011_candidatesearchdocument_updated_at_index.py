@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-17 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0010_candidatesearchdocument'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='candidatesearchdocument',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, help_text='Bumped whenever the profile or a related row changes'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.0 on 2026-10-17 06:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0012_useractivity_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyMetric',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('metric', models.CharField(help_text='e.g. registrations, registrations_recruiter, activity_login', max_length=50)),
+                ('value', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-date', 'metric'],
+                'constraints': [models.UniqueConstraint(fields=('date', 'metric'), name='unique_daily_metric')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0 on 2026-10-17 07:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0014_exportjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportjob',
+            name='file_format',
+            field=models.CharField(choices=[('csv', 'CSV (gzip)'), ('parquet', 'Parquet'), ('arrow', 'Arrow IPC')], default='csv', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='exportjob',
+            name='data_type',
+            field=models.CharField(choices=[('users', 'Users'), ('job_postings', 'Job Postings'), ('applications', 'Applications'), ('usage_metrics', 'Usage Metrics'), ('admin_actions', 'Admin Actions'), ('status_history', 'Application Status History'), ('user_activity', 'User Activity')], max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='exportjob',
+            name='file',
+            field=models.FileField(blank=True, upload_to='exports/'),
+        ),
+    ]
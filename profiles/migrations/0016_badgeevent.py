@@ -0,0 +1,26 @@
+# Generated by Django 5.0 on 2026-10-17 06:54
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0015_exportjob_file_format'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BadgeEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('notifications', models.IntegerField(default=0)),
+                ('messages', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='badge_events', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.0 on 2026-10-17 06:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Q
+
+
+def count_conversation_unread(apps, schema_editor):
+    Conversation = apps.get_model('profiles', 'Conversation')
+    conversations = Conversation.objects.annotate(
+        recruiter_unread=Count('messages', filter=Q(messages__is_read=False) & ~Q(messages__sender=F('recruiter'))),
+        job_seeker_unread=Count('messages', filter=Q(messages__is_read=False) & ~Q(messages__sender=F('job_seeker'))),
+    )
+    for conversation in conversations.iterator():
+        conversation.recruiter_unread_count = conversation.recruiter_unread
+        conversation.job_seeker_unread_count = conversation.job_seeker_unread
+        conversation.save(update_fields=['recruiter_unread_count', 'job_seeker_unread_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0016_badgeevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnreadCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='unread_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('notifications', models.PositiveIntegerField(default=0)),
+                ('messages', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='job_seeker_unread_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='recruiter_unread_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_conversation_unread, migrations.RunPython.noop),
+    ]
@@ -133,6 +133,20 @@ class Link(models.Model):
     def __str__(self):
         return f"{self.title} ({self.link_type})"
 
+class CandidateSearchDocument(models.Model):
+    """Denormalized searchable text for a job seeker, one row per profile"""
+    profile = models.OneToOneField(JobSeekerProfile, on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    name = models.CharField(max_length=301, blank=True)
+    headline = models.CharField(max_length=200, blank=True)
+    bio = models.TextField(blank=True)
+    skills = models.TextField(blank=True, help_text="Skill names, one per line")
+    experience = models.TextField(blank=True, help_text="Work experience positions, one per line")
+    education = models.TextField(blank=True, help_text="Degrees and fields of study, one per line")
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, help_text="Bumped whenever the profile or a related row changes")
+    
+    def __str__(self):
+        return f"Search document for {self.name or self.profile_id}"
+
 class AdminActionLog(models.Model):
     ACTION_TYPES = [
         ('suspend', 'Suspend User'),
@@ -161,6 +175,63 @@ class AdminActionLog(models.Model):
     def __str__(self):
         return f"{self.admin_user.username} {self.get_action_type_display()} {self.target_user.username} on {self.created_at.strftime('%Y-%m-%d %H:%M')}"
 
+class ExportJob(models.Model):
+    """A dashboard export written to MEDIA_ROOT/exports/ by a background worker"""
+    DATA_TYPES = [
+        ('users', 'Users'),
+        ('job_postings', 'Job Postings'),
+        ('applications', 'Applications'),
+        ('usage_metrics', 'Usage Metrics'),
+        ('admin_actions', 'Admin Actions'),
+        ('status_history', 'Application Status History'),
+        ('user_activity', 'User Activity'),
+    ]
+    
+    FORMAT_CHOICES = [
+        ('csv', 'CSV (gzip)'),
+        ('parquet', 'Parquet'),
+        ('arrow', 'Arrow IPC'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
+    requested_by = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='export_jobs')
+    data_type = models.CharField(max_length=20, choices=DATA_TYPES)
+    file_format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default='csv')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    total_rows = models.PositiveIntegerField(null=True, blank=True, help_text="Rows expected, counted when the job starts")
+    rows_written = models.PositiveIntegerField(default=0)
+    file = models.FileField(upload_to='exports/', blank=True)
+    file_size = models.PositiveBigIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True, help_text="Last progress update from the worker")
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_data_type_display()} {self.get_file_format_display()} export ({self.get_status_display()})"
+    
+    @property
+    def progress(self):
+        """Percentage of rows written, or None while the total is unknown"""
+        if self.status == 'completed':
+            return 100
+        if not self.total_rows:
+            return None
+        return min(99, self.rows_written * 100 // self.total_rows)
+
 class PrivacySettings(models.Model):
     """Privacy settings for job seeker profiles"""
 
@@ -300,6 +371,9 @@ class Conversation(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
+    # Unread messages sent to each participant, kept up to date by profiles.unread
+    recruiter_unread_count = models.PositiveIntegerField(default=0)
+    job_seeker_unread_count = models.PositiveIntegerField(default=0)
     
     class Meta:
         unique_together = ['recruiter', 'job_seeker', 'job_posting']
@@ -321,6 +395,14 @@ class Conversation(models.Model):
     def get_latest_message(self):
         """Get the latest message in this conversation"""
         return self.messages.first()
+    
+    def unread_count_field(self, user_id):
+        """Name of the unread counter for one participant"""
+        return 'recruiter_unread_count' if user_id == self.recruiter_id else 'job_seeker_unread_count'
+    
+    def get_unread_count(self, user):
+        """Unread messages sent to ``user``"""
+        return getattr(self, self.unread_count_field(user.id))
 
 class Message(models.Model):
     """Represents a message within a conversation"""
@@ -341,12 +423,23 @@ class Message(models.Model):
     def __str__(self):
         return f"Message from {self.sender.get_full_name()} in {self.conversation}"
     
+    @property
+    def recipient_id(self):
+        """ID of the participant this message was sent to"""
+        conversation = self.conversation
+        if self.sender_id == conversation.recruiter_id:
+            return conversation.job_seeker_id
+        return conversation.recruiter_id
+    
     def mark_as_read(self):
         """Mark this message as read"""
         if not self.is_read:
             self.is_read = True
             self.read_at = timezone.now()
-            self.save(update_fields=['is_read', 'read_at'])
+            # Conditional update, so a message read twice at once is only uncounted once
+            if Message.objects.filter(pk=self.pk, is_read=False).update(is_read=True, read_at=self.read_at):
+                from .unread import adjust_conversation_unread
+                adjust_conversation_unread(self.conversation, self.recipient_id, -1)
 
 class Notification(models.Model):
     """Notifications for job seekers about application updates, offers, interviews"""
@@ -389,7 +482,41 @@ class Notification(models.Model):
         if not self.is_read:
             self.is_read = True
             self.read_at = timezone.now()
-            self.save()
+            if Notification.objects.filter(pk=self.pk, is_read=False).update(is_read=True, read_at=self.read_at):
+                from .unread import adjust_unread
+                adjust_unread(self.recipient_id, notifications=-1)
+
+class BadgeEvent(models.Model):
+    """
+    A change to a user's unread notification and message counts.
+
+    Written whenever notifications or messages are created, read or
+    deleted, and pushed to the user's open pages by the badge stream.
+    Rows are only kept for a few minutes.
+    """
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='badge_events')
+    notifications = models.IntegerField(default=0)
+    messages = models.IntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.user_id}: notifications {self.notifications:+d}, messages {self.messages:+d}"
+
+class UnreadCounter(models.Model):
+    """
+    A user's unread notification and message totals.
+
+    Maintained by profiles.unread as notifications and messages are
+    created, read and deleted, so the badges don't recount rows. Messages
+    only count in active conversations. reconcile_unread_counts repairs
+    any drift.
+    """
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, primary_key=True, related_name='unread_counter')
+    notifications = models.PositiveIntegerField(default=0)
+    messages = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.notifications} notifications, {self.messages} messages unread"
 
 class UserActivity(models.Model):
     """Track user activities for usage analytics"""
@@ -406,7 +533,8 @@ class UserActivity(models.Model):
     
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='activities')
     activity_type = models.CharField(max_length=20, choices=ACTIVITY_TYPES)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add: rows are written in batches after the action happened
+    timestamp = models.DateTimeField(default=timezone.now)
     ip_address = models.GenericIPAddressField(blank=True, null=True)
     details = models.TextField(blank=True, help_text="Additional context like job ID, search terms, etc.")
     
@@ -422,3 +550,27 @@ class UserActivity(models.Model):
     
     def __str__(self):
         return f"{self.user.username} - {self.get_activity_type_display()} at {self.timestamp.strftime('%Y-%m-%d %H:%M')}"
+
+class DailyMetric(models.Model):
+    """
+    Per-day usage counter, e.g. registrations or logins on one date.
+
+    Signals and the activity log bump today's rows as things happen;
+    rollup_daily_metrics recomputes whole days from the source tables.
+    """
+    REGISTRATIONS = 'registrations'
+    JOB_POSTINGS = 'job_postings'
+    APPLICATIONS = 'applications'
+
+    date = models.DateField()
+    metric = models.CharField(max_length=50, help_text="e.g. registrations, registrations_recruiter, activity_login")
+    value = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        ordering = ['-date', 'metric']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'metric'], name='unique_daily_metric'),
+        ]
+    
+    def __str__(self):
+        return f"{self.metric} on {self.date}: {self.value}"
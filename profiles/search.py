@@ -0,0 +1,68 @@
+"""
+Full-text candidate search.
+
+Each JobSeekerProfile has a CandidateSearchDocument holding its name,
+headline, bio, skills, work-experience positions and degrees as plain
+text. Signals rebuild a profile's document whenever the profile or one
+of its related rows changes, so a candidate search only touches the
+document index instead of joining through every related table.
+"""
+from jobs.search import SearchIndex, register, get_backend, search
+from .models import JobSeekerProfile, CandidateSearchDocument
+
+
+class CandidateDocumentIndex(SearchIndex):
+    model = CandidateSearchDocument
+    table = 'profiles_candidatesearchdocument_fts'
+    columns = (
+        ('name', 10.0),
+        ('skills', 8.0),
+        ('headline', 6.0),
+        ('experience', 4.0),
+        ('education', 3.0),
+        ('bio', 1.0),
+    )
+    snippet_column = 'bio'
+    lookup_prefix = 'search_document__'
+
+    def rebuild_documents(self):
+        for profile_id in JobSeekerProfile.objects.values_list('id', flat=True).iterator():
+            build_document(profile_id, update_index=False)
+
+
+candidate_index = register(CandidateDocumentIndex())
+
+
+def build_document(profile_id, update_index=True):
+    """
+    Regenerate the search document for one profile.
+
+    Returns the document, or None if the profile no longer exists.
+    """
+    profile = JobSeekerProfile.objects.select_related('user').filter(id=profile_id).first()
+    if profile is None:
+        return None
+
+    education = []
+    for degree, field_of_study in profile.education.values_list('degree', 'field_of_study'):
+        education.append(f'{degree} {field_of_study}'.strip())
+
+    document, _ = CandidateSearchDocument.objects.update_or_create(
+        profile=profile,
+        defaults={
+            'name': profile.user.get_full_name(),
+            'headline': profile.headline,
+            'bio': profile.bio,
+            'skills': '\n'.join(profile.skills.values_list('name', flat=True)),
+            'experience': '\n'.join(profile.work_experience.values_list('position', flat=True)),
+            'education': '\n'.join(education),
+        },
+    )
+    if update_index:
+        get_backend(candidate_index).update(document)
+    return document
+
+
+def search_profiles(queryset, query):
+    """Full-text search over JobSeekerProfile search documents, best first"""
+    return search(queryset, query, candidate_index)
@@ -1,18 +1,131 @@
 from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
 from django.dispatch import receiver
-from .models import UserActivity
+from jobs.search import get_backend
+from .models import CustomUser, JobSeekerProfile, Skill, WorkExperience, Education, CandidateSearchDocument, DailyMetric, ExportJob, Conversation, Message, Notification
+from .search import build_document, candidate_index
+from .activity_log import log_activity
+from .unread import adjust_conversation_unread, adjust_unread, conversation_activity_changed, uncount_messages_from
+from .metrics import record_metric, registration_metric
 
 @receiver(user_logged_in)
 def log_user_login(sender, request, user, **kwargs):
     """Log user login activity"""
     try:
-        UserActivity.objects.create(
-            user=user,
-            activity_type='login',
-            ip_address=request.META.get('REMOTE_ADDR') if request else None,
-            details='User logged in'
-        )
+        log_activity(user, 'login', request, 'User logged in')
     except Exception:
         # Silently fail if logging fails to avoid breaking user experience
         pass
 
+
+
+@receiver(post_save, sender=CustomUser)
+def count_registration(sender, instance, created, **kwargs):
+    """Add a new account to today's registration metrics"""
+    if created:
+        record_metric(DailyMetric.REGISTRATIONS, instance.date_joined)
+        record_metric(registration_metric(instance.user_type), instance.date_joined)
+
+
+def _is_cascade(origin):
+    """True when a row is deleted because its profile or user is being deleted"""
+    return isinstance(origin, (JobSeekerProfile, CustomUser))
+
+
+@receiver(post_save, sender=JobSeekerProfile)
+def update_search_document_on_profile_save(sender, instance, **kwargs):
+    """Rebuild a candidate's search document when their profile changes"""
+    build_document(instance.id)
+
+
+@receiver(post_save, sender=CustomUser)
+def update_search_document_on_user_save(sender, instance, update_fields=None, **kwargs):
+    """Rebuild a candidate's search document when their name changes"""
+    if update_fields is not None and not {'first_name', 'last_name'} & set(update_fields):
+        return
+    profile_id = JobSeekerProfile.objects.filter(user=instance).values_list('id', flat=True).first()
+    if profile_id:
+        build_document(profile_id)
+
+
+@receiver(post_save, sender=Skill)
+@receiver(post_save, sender=WorkExperience)
+@receiver(post_save, sender=Education)
+def update_search_document_on_related_save(sender, instance, **kwargs):
+    """Rebuild a candidate's search document when a skill, job or degree is saved"""
+    build_document(instance.profile_id)
+
+
+@receiver(post_delete, sender=Skill)
+@receiver(post_delete, sender=WorkExperience)
+@receiver(post_delete, sender=Education)
+def update_search_document_on_related_delete(sender, instance, origin=None, **kwargs):
+    """Rebuild a candidate's search document when a skill, job or degree is removed"""
+    if _is_cascade(origin):
+        return
+    build_document(instance.profile_id)
+
+
+@receiver(post_delete, sender=CandidateSearchDocument)
+def remove_search_document_from_index(sender, instance, **kwargs):
+    """Drop a deleted profile from the full-text index"""
+    get_backend(candidate_index).remove(instance.pk)
+
+
+@receiver(post_delete, sender=ExportJob)
+def delete_export_file(sender, instance, **kwargs):
+    """Remove an export's file along with the job"""
+    if instance.file:
+        instance.file.delete(save=False)
+
+
+@receiver(post_save, sender=Notification)
+def count_new_notification(sender, instance, created, **kwargs):
+    """Add a new notification to the recipient's unread count"""
+    if created and not instance.is_read:
+        adjust_unread(instance.recipient_id, notifications=1)
+
+
+@receiver(post_save, sender=Message)
+def count_new_message(sender, instance, created, **kwargs):
+    """Add a new message to the recipient's unread counts"""
+    if created and not instance.is_read:
+        adjust_conversation_unread(instance.conversation, instance.recipient_id, 1)
+
+
+@receiver(post_delete, sender=Notification)
+@receiver(post_delete, sender=Message)
+def uncount_deleted_unread(sender, instance, origin=None, **kwargs):
+    """Take a deleted unread notification or message off the recipient's counts"""
+    # Skip account deletions: the recipient may be the user being deleted,
+    # and uncount_unread_from_deleted_user covers everyone else
+    if instance.is_read or isinstance(origin, CustomUser):
+        return
+    if sender is Notification:
+        adjust_unread(instance.recipient_id, notifications=-1)
+    else:
+        adjust_conversation_unread(instance.conversation, instance.recipient_id, -1)
+
+
+@receiver(pre_delete, sender=CustomUser)
+def uncount_unread_from_deleted_user(sender, instance, **kwargs):
+    """Take a deleted user's unread messages off the other participants' counts"""
+    uncount_messages_from(instance.pk)
+
+
+@receiver(pre_save, sender=Conversation)
+def remember_conversation_activity(sender, instance, update_fields=None, **kwargs):
+    """Note whether a conversation was active, and its unread counts, before a save"""
+    if not instance.pk or (update_fields is not None and 'is_active' not in update_fields):
+        return
+    instance._previous_activity = Conversation.objects.filter(pk=instance.pk).values_list(
+        'is_active', 'recruiter_unread_count', 'job_seeker_unread_count'
+    ).first()
+
+
+@receiver(post_save, sender=Conversation)
+def count_conversation_activity_change(sender, instance, **kwargs):
+    """Add or remove a conversation's unread messages when it is (de)activated"""
+    previous = instance.__dict__.pop('_previous_activity', None)
+    if previous and previous[0] != instance.is_active:
+        conversation_activity_changed(instance, previous[1], previous[2])
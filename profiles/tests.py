@@ -1,3 +1,614 @@
-from django.test import TestCase
+import asyncio
+import csv
+import datetime
+import importlib.util
+import io
+import json
+import os
+import tempfile
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from profiles import activity_log, badges, columnar_export, export_jobs
+
+from profiles import csv_export
+from profiles.csv_export import user_rows
+from profiles.metrics import get_daily_series, rollup_daily_metrics, usage_metrics_rows
+from profiles.search import search_profiles
+from profiles.unread import get_unread_counts, mark_conversation_read, reconcile_conversations, reconcile_users
+from profiles.management.commands.benchmark_user_export import create_benchmark_users
+from profiles.models import (
+    BadgeEvent, CandidateSearchDocument, Conversation, CustomUser, DailyMetric, Education, ExportJob, JobSeekerProfile, Message, Notification, Skill,
+    UserActivity, WorkExperience
+)
+
+
+class CsvStreamingTests(TestCase):
+    """CSV exports stream chunks as rows are read"""
+
+    def setUp(self):
+        self.admin = CustomUser.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        create_benchmark_users(5)
+
+    def test_rows_are_written_in_chunks(self):
+        rows = [['Name']] + [[f'row {index}'] for index in range(5)]
+        with mock.patch.object(csv_export, 'LINES_PER_WRITE', 2):
+            chunks = list(csv_export.stream_csv(iter(rows)))
+        self.assertEqual(chunks[0], '\ufeff')
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual(list(csv.reader(io.StringIO(''.join(chunks[1:])))), rows)
+
+    def test_export_view_streams(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('admin_export_csv', args=['users']))
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment; filename="users_export_', response['Content-Disposition'])
+        content = b''.join(response.streaming_content).decode('utf-8-sig')
+        rows = list(csv.reader(io.StringIO(content)))
+        self.assertEqual(len(rows), 1 + 6)
+
+    def test_every_export_type(self):
+        for data_type, label in ExportJob.DATA_TYPES:
+            rows = list(csv_export.export_rows(data_type))
+            self.assertTrue(rows[0], data_type)
+            total = csv_export.count_export_rows(data_type)
+            if total is not None:
+                self.assertEqual(len(rows) - 1, total, data_type)
+
+    def test_unknown_export_is_rejected(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('admin_export_csv', args=['passwords']))
+        self.assertRedirects(response, reverse('admin_dashboard'), fetch_redirect_response=False)
+
+
+class UserExportQueryCountTests(TestCase):
+    """The users CSV export runs one query however many users there are"""
+
+    def export(self):
+        return list(user_rows(CustomUser.objects.all()))
+
+    def test_export_is_one_query(self):
+        # The 100k-user run lives in the benchmark_user_export command
+        create_benchmark_users(300)
+        with self.assertNumQueries(1):
+            rows = self.export()
+        self.assertEqual(len(rows), 301)
+
+    def test_profile_flags(self):
+        create_benchmark_users(3)
+        flags = {row[0].rsplit('-', 1)[1]: (row[10], row[11]) for row in self.export()[1:]}
+        self.assertEqual(flags, {'0': ('Yes', 'No'), '1': ('No', 'Yes'), '2': ('No', 'No')})
+
+
+def temporary_directory(test):
+    """A directory removed when ``test`` finishes"""
+    directory = tempfile.TemporaryDirectory()
+    test.addCleanup(directory.cleanup)
+    return directory.name
+
+
+def use_temporary_spill_file(test):
+    """Point ACTIVITY_SPILL_FILE at a temporary file for the duration of ``test``"""
+    spill_file = os.path.join(temporary_directory(test), 'activity_spill.jsonl')
+    override = override_settings(ACTIVITY_SPILL_FILE=spill_file)
+    override.enable()
+    test.addCleanup(override.disable)
+    return spill_file
+
+
+class ActivityLoggerTests(TestCase):
+    """Activity is queued in the request and written in batches"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('seeker', 'seeker@example.com', 'pw', user_type='job_seeker')
+        self.spill_file = use_temporary_spill_file(self)
+        # Flush by hand instead of from the background thread
+        patcher = mock.patch.object(activity_log.ActivityLogger, '_ensure_flusher')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_log_queues_and_flush_writes_in_batches(self):
+        logger = activity_log.ActivityLogger()
+        with self.assertNumQueries(0):
+            for index in range(5):
+                logger.log(self.user.id, 'login', '127.0.0.1', f'login {index}')
+        self.assertFalse(UserActivity.objects.exists())
+
+        with mock.patch.object(activity_log, 'BATCH_SIZE', 2):
+            self.assertEqual(logger.flush(), 5)
+        self.assertEqual(UserActivity.objects.filter(user=self.user, activity_type='login').count(), 5)
+        self.assertEqual(DailyMetric.objects.get(metric='activity_login').value, 5)
+
+    def test_full_queue_spills(self):
+        logger = activity_log.ActivityLogger(max_size=1)
+        logger.log(self.user.id, 'login')
+        logger.log(self.user.id, 'logout')
+        self.assertEqual(logger.flush(), 1)
+        self.assertEqual(activity_log.replay_spill_file(), 1)
+        self.assertEqual(
+            sorted(UserActivity.objects.values_list('activity_type', flat=True)), ['login', 'logout']
+        )
+
+    def test_failed_write_spills(self):
+        logger = activity_log.ActivityLogger()
+        logger.log(self.user.id, 'login')
+        with mock.patch.object(activity_log, 'write_events', side_effect=RuntimeError('database is locked')):
+            with self.assertRaises(RuntimeError):
+                logger.flush()
+        self.assertEqual(activity_log.replay_spill_file(), 1)
+
+
+class ActivitySpillReplayTests(TestCase):
+    """Spilled activity events are replayed once, even after a failed replay"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('seeker', 'seeker@example.com', 'pw', user_type='job_seeker')
+        self.spill_file = use_temporary_spill_file(self)
+
+    def events(self, count, details='spilled'):
+        return [{
+            'user_id': self.user.id,
+            'activity_type': 'login',
+            'ip_address': None,
+            'details': f'{details} {index}',
+            'timestamp': timezone.now().isoformat(),
+        } for index in range(count)]
+
+    def test_replay_writes_and_removes_the_file(self):
+        activity_log.spill_events(self.events(3))
+        self.assertEqual(activity_log.replay_spill_file(), 3)
+        self.assertEqual(UserActivity.objects.count(), 3)
+        self.assertFalse(os.path.exists(self.spill_file))
+        self.assertEqual(activity_log.replay_spill_file(), 0)
+
+    def test_leftover_replaying_file_is_not_overwritten(self):
+        # A crashed replay left its claimed file behind
+        with open(f'{self.spill_file}.replaying', 'w', encoding='utf-8') as leftover:
+            for event in self.events(2, 'leftover'):
+                leftover.write(json.dumps(event) + '\n')
+        activity_log.spill_events(self.events(1, 'new'))
+
+        self.assertEqual(activity_log.replay_spill_file(), 3)
+        self.assertEqual(
+            sorted(UserActivity.objects.values_list('details', flat=True)),
+            ['leftover 0', 'leftover 1', 'new 0']
+        )
+
+    def test_failed_replay_resumes_without_duplicates(self):
+        activity_log.spill_events(self.events(3))
+        write_events = activity_log.write_events
+        calls = []
+
+        def fail_on_second_batch(events):
+            calls.append(len(events))
+            if len(calls) == 2:
+                raise RuntimeError('database went away')
+            return write_events(events)
+
+        with mock.patch.object(activity_log, 'BATCH_SIZE', 1), \
+                mock.patch.object(activity_log, 'write_events', fail_on_second_batch):
+            with self.assertRaises(RuntimeError):
+                activity_log.replay_spill_file()
+        self.assertEqual(UserActivity.objects.count(), 1)
+
+        with mock.patch.object(activity_log, 'BATCH_SIZE', 1):
+            self.assertEqual(activity_log.replay_spill_file(), 2)
+        self.assertEqual(
+            sorted(UserActivity.objects.values_list('details', flat=True)),
+            ['spilled 0', 'spilled 1', 'spilled 2']
+        )
+
+
+class ExportJobTests(TestCase):
+    """Export jobs heartbeat while running and never finish someone else's run"""
+
+    def setUp(self):
+        self.admin = CustomUser.objects.create_user('admin', 'admin@example.com', 'pw', user_type='admin')
+        media_root = temporary_directory(self)
+        override = override_settings(MEDIA_ROOT=media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.export_dir = os.path.join(media_root, export_jobs.EXPORT_DIR)
+
+    def claim(self, data_type='users', file_format='csv'):
+        export_jobs.request_export(self.admin, data_type, file_format)
+        return export_jobs.claim_next_job()
+
+    def reclaim_while_running(self, job):
+        """Make export_rows requeue and reclaim the job after its first row"""
+        rows = export_jobs.export_rows(job.data_type)
+
+        def export_rows(data_type):
+            yield next(rows)
+            yield next(rows)
+            ExportJob.objects.filter(id=job.id).update(status='pending')
+            export_jobs.claim_next_job()
+            yield from rows
+
+        return mock.patch.object(export_jobs, 'export_rows', export_rows)
+
+    def test_usage_metrics_export_writes_heartbeats(self):
+        job = self.claim('usage_metrics')
+        ExportJob.objects.filter(id=job.id).update(heartbeat_at=None)
+        with mock.patch.object(export_jobs, 'HEARTBEAT_EVERY', 0):
+            job = export_jobs.run_export_job(job)
+        self.assertEqual(job.status, 'completed')
+        self.assertIsNotNone(job.heartbeat_at)
+        self.assertGreater(job.rows_written, 0)
+
+    def test_download_resumes_with_range(self):
+        admin = CustomUser.objects.create_superuser('superuser', 'superuser@example.com', 'pw')
+        job = export_jobs.run_export_job(self.claim())
+        self.assertEqual(job.status, 'completed')
+        with open(job.file.path, 'rb') as export:
+            content = export.read()
+
+        self.client.force_login(admin)
+        url = reverse('admin_download_export', args=[job.id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), content)
+
+        response = self.client.get(url, HTTP_RANGE='bytes=10-', HTTP_IF_RANGE=response['ETag'])
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-{len(content) - 1}/{len(content)}')
+        self.assertEqual(b''.join(response.streaming_content), content[10:])
+
+        # A stale validator gets the whole file again
+        response = self.client.get(url, HTTP_RANGE='bytes=10-', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(url, HTTP_RANGE=f'bytes={len(content)}-')
+        self.assertEqual(response.status_code, 416)
+
+    def test_live_job_is_not_requeued(self):
+        job = self.claim()
+        self.assertEqual(export_jobs.requeue_stale_jobs(), 0)
+        ExportJob.objects.filter(id=job.id).update(heartbeat_at=timezone.now() - export_jobs.STALE_AFTER * 2)
+        self.assertEqual(export_jobs.requeue_stale_jobs(), 1)
+
+    def test_requeued_job_stops_at_next_heartbeat(self):
+        CustomUser.objects.create_user('seeker', 'seeker@example.com', 'pw', user_type='job_seeker')
+        job = self.claim()
+        started_at = job.started_at
+        with self.reclaim_while_running(job), mock.patch.object(export_jobs, 'HEARTBEAT_EVERY', 0), \
+                mock.patch.object(export_jobs.os, 'replace', wraps=os.replace) as replace:
+            finished = export_jobs.run_export_job(job)
+        replace.assert_not_called()
+        self.assertEqual(finished.status, 'running')
+        self.assertNotEqual(finished.started_at, started_at)
+        self.assertEqual(os.listdir(self.export_dir), [])
+
+    def test_requeued_job_does_not_overwrite_new_run(self):
+        job = self.claim()
+        with self.reclaim_while_running(job), mock.patch.object(export_jobs, 'HEARTBEAT_EVERY', 3600):
+            finished = export_jobs.run_export_job(job)
+        self.assertEqual(finished.status, 'running')
+        self.assertEqual(finished.file.name, '')
+        self.assertEqual(os.listdir(self.export_dir), [])
+
+
+class UnreadCounterTests(TestCase):
+    """Unread counters follow messages and notifications without recounting"""
+
+    def setUp(self):
+        self.recruiter = CustomUser.objects.create_user('recruiter', 'recruiter@example.com', 'pw', user_type='recruiter')
+        self.seeker = CustomUser.objects.create_user('seeker', 'seeker@example.com', 'pw', user_type='job_seeker')
+        self.conversation = Conversation.objects.create(recruiter=self.recruiter, job_seeker=self.seeker)
+
+    def send(self, sender, count=1):
+        return [
+            Message.objects.create(conversation=self.conversation, sender=sender, content=f'Message {index}')
+            for index in range(count)
+        ]
+
+    def unread_messages(self, user):
+        return get_unread_counts(user.id)['messages']
+
+    def assertNoDrift(self):
+        self.assertEqual((reconcile_conversations(), reconcile_users()), (0, 0))
+
+    def test_new_message_is_counted(self):
+        self.send(self.recruiter, 2)
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.get_unread_count(self.seeker), 2)
+        self.assertEqual(self.unread_messages(self.seeker), 2)
+        self.assertEqual(self.unread_messages(self.recruiter), 0)
+        self.assertNoDrift()
+
+    def test_mark_read_clears_count(self):
+        self.send(self.recruiter, 3)
+        self.assertEqual(mark_conversation_read(self.conversation, self.seeker.id), 3)
+        self.assertEqual(self.unread_messages(self.seeker), 0)
+        self.assertNoDrift()
+
+    def test_deleted_message_is_uncounted(self):
+        message, _ = self.send(self.recruiter, 2)
+        message.delete()
+        self.assertEqual(self.unread_messages(self.seeker), 1)
+        self.assertNoDrift()
+
+    def test_notifications_are_counted_and_read(self):
+        notification = Notification.objects.create(
+            recipient=self.seeker, notification_type='message', title='Hello', message='Hello'
+        )
+        self.assertEqual(get_unread_counts(self.seeker.id)['notifications'], 1)
+        notification.mark_as_read()
+        self.assertEqual(get_unread_counts(self.seeker.id)['notifications'], 0)
+        self.assertNoDrift()
+
+    def test_deleting_sender_uncounts_their_messages(self):
+        other = CustomUser.objects.create_user('other', 'other@example.com', 'pw', user_type='recruiter')
+        Message.objects.create(
+            conversation=Conversation.objects.create(recruiter=other, job_seeker=self.seeker),
+            sender=other, content='Hi'
+        )
+        self.send(self.recruiter, 2)
+        self.send(self.seeker)
+        self.assertEqual(self.unread_messages(self.seeker), 3)
+
+        self.recruiter.delete()
+        self.assertEqual(self.unread_messages(self.seeker), 1)
+        self.assertNoDrift()
+
+    def test_deactivating_conversation_moves_its_unread_messages(self):
+        self.send(self.recruiter, 2)
+        self.send(self.seeker)
+
+        self.conversation.is_active = False
+        self.conversation.save(update_fields=['is_active'])
+        self.assertEqual((self.unread_messages(self.seeker), self.unread_messages(self.recruiter)), (0, 0))
+        self.assertNoDrift()
+
+        self.conversation.is_active = True
+        self.conversation.save(update_fields=['is_active'])
+        self.assertEqual((self.unread_messages(self.seeker), self.unread_messages(self.recruiter)), (2, 1))
+        self.assertNoDrift()
+
+
+class CandidateSearchTests(TestCase):
+    """Candidate search reads the denormalized search documents"""
+
+    def setUp(self):
+        self.ada = self.create_candidate('ada', 'Ada', 'Lovelace', 'Mathematician')
+        self.grace = self.create_candidate('grace', 'Grace', 'Hopper', 'Compiler engineer')
+
+    def create_candidate(self, username, first_name, last_name, headline):
+        user = CustomUser.objects.create_user(
+            username, f'{username}@example.com', 'pw', user_type='job_seeker', first_name=first_name, last_name=last_name
+        )
+        return JobSeekerProfile.objects.create(user=user, headline=headline)
+
+    def search(self, query):
+        return list(search_profiles(JobSeekerProfile.objects.all(), query))
+
+    def test_document_follows_related_rows(self):
+        Skill.objects.create(profile=self.ada, name='Analytical Engines')
+        WorkExperience.objects.create(profile=self.ada, company='Babbage', position='Programmer', start_date=datetime.date(1842, 1, 1))
+        Education.objects.create(profile=self.ada, institution='Home', degree='Tutoring', field_of_study='Mathematics', start_date=datetime.date(1830, 1, 1))
+
+        document = CandidateSearchDocument.objects.get(profile=self.ada)
+        self.assertEqual(document.name, 'Ada Lovelace')
+        self.assertEqual(document.skills, 'Analytical Engines')
+        self.assertEqual(document.experience, 'Programmer')
+        self.assertEqual(document.education, 'Tutoring Mathematics')
+
+        self.ada.skills.get().delete()
+        self.assertEqual(CandidateSearchDocument.objects.get(profile=self.ada).skills, '')
+
+    def test_search_matches_every_field(self):
+        Skill.objects.create(profile=self.grace, name='COBOL')
+        self.assertEqual(self.search('hopper'), [self.grace])
+        self.assertEqual(self.search('cob'), [self.grace])
+        self.assertEqual(self.search('mathematician'), [self.ada])
+        self.assertEqual(self.search('grace compiler'), [self.grace])
+        self.assertEqual(self.search('grace mathematician'), [])
+
+    def test_name_change_is_searchable(self):
+        self.ada.user.last_name = 'King'
+        self.ada.user.save()
+        self.assertEqual(self.search('king'), [self.ada])
+        self.assertEqual(self.search('lovelace'), [])
+
+
+class DailyMetricTests(TestCase):
+    """Usage metrics are kept as per-day rollups"""
+
+    def setUp(self):
+        self.today = timezone.localdate()
+        self.yesterday = self.today - datetime.timedelta(days=1)
+
+    def metrics(self, date):
+        return dict(DailyMetric.objects.filter(date=date).values_list('metric', 'value'))
+
+    def test_signals_count_today(self):
+        CustomUser.objects.create_user('seeker', 'seeker@example.com', 'pw', user_type='job_seeker')
+        CustomUser.objects.create_user('recruiter', 'recruiter@example.com', 'pw', user_type='recruiter')
+        self.assertEqual(self.metrics(self.today), {
+            'registrations': 2, 'registrations_job_seeker': 1, 'registrations_recruiter': 1,
+        })
+
+    def test_rollup_recounts_days(self):
+        user = CustomUser.objects.create_user('seeker', 'seeker@example.com', 'pw', user_type='job_seeker')
+        CustomUser.objects.filter(pk=user.pk).update(date_joined=timezone.now() - datetime.timedelta(days=1))
+        UserActivity.objects.create(user=user, activity_type='login')
+        DailyMetric.objects.create(date=self.yesterday, metric='registrations', value=99)
+
+        rollup_daily_metrics(self.yesterday, self.today + datetime.timedelta(days=1))
+        self.assertEqual(self.metrics(self.yesterday), {'registrations': 1, 'registrations_job_seeker': 1})
+        self.assertEqual(self.metrics(self.today), {'activity_login': 1})
+
+    def test_series_and_report(self):
+        DailyMetric.objects.create(date=self.yesterday, metric='registrations', value=3)
+        series = get_daily_series(self.yesterday - datetime.timedelta(days=1), self.today + datetime.timedelta(days=1))
+        self.assertEqual([date for date, values in series], [
+            self.today, self.yesterday, self.yesterday - datetime.timedelta(days=1)
+        ])
+        self.assertEqual(series[1][1], {'registrations': 3})
+
+        rows = list(usage_metrics_rows(days=2))
+        self.assertEqual(rows[0], ['Metric', 'Value', 'Period', 'Date'])
+        self.assertEqual(rows[-1][:2], [self.yesterday.strftime('%Y-%m-%d'), 3])
+
+
+@skipUnless(importlib.util.find_spec('pyarrow'), 'pyarrow is not installed')
+class ColumnarExportTests(TestCase):
+    """Parquet and Arrow exports keep the model's column types"""
+
+    def setUp(self):
+        from jobs.models import JobPosting
+
+        recruiter = CustomUser.objects.create_user('recruiter', 'recruiter@example.com', 'pw', user_type='recruiter')
+        self.jobs = [
+            JobPosting.objects.create(
+                title='Engineer', location='Remote', posted_by=recruiter, employment_type=employment_type,
+                salary_min=salary_min
+            )
+            for employment_type, salary_min in (('full_time', '95000.00'), ('contract', None))
+        ]
+        self.directory = temporary_directory(self)
+
+    def write(self, file_format):
+        path = os.path.join(self.directory, f'jobs{columnar_export.FORMATS[file_format]}')
+        progress = []
+        written = columnar_export.write_columnar('job_postings', path, file_format, progress.append)
+        self.assertEqual((written, progress[-1]), (2, 2))
+        return path
+
+    def check_table(self, table):
+        import pyarrow as pa
+
+        self.assertEqual(table.num_rows, 2)
+        self.assertEqual(table.column('id').to_pylist(), [job.id for job in self.jobs])
+        self.assertEqual(table.column('employment_type').to_pylist(), ['full_time', 'contract'])
+        self.assertTrue(pa.types.is_dictionary(table.schema.field('employment_type').type))
+        self.assertTrue(pa.types.is_timestamp(table.schema.field('posted_at').type))
+        self.assertEqual(table.column('salary_min').to_pylist(), [Decimal('95000.00'), None])
+
+    def test_batches_share_dictionaries(self):
+        batches = list(columnar_export.ColumnarExport('job_postings').batches(batch_size=1))
+        self.assertEqual(len(batches), 2)
+        dictionaries = [batch.column(batch.schema.get_field_index('employment_type')).dictionary for batch in batches]
+        self.assertTrue(dictionaries[0].equals(dictionaries[1]))
+
+    def test_parquet(self):
+        import pyarrow.parquet as pq
+        self.check_table(pq.read_table(self.write('parquet')))
+
+    def test_arrow(self):
+        import pyarrow as pa
+        with pa.memory_map(self.write('arrow')) as source:
+            self.check_table(pa.ipc.open_file(source).read_all())
+
+    def test_export_job(self):
+        admin = CustomUser.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        with override_settings(MEDIA_ROOT=self.directory):
+            export_jobs.request_export(admin, 'job_postings', 'parquet')
+            job = export_jobs.run_export_job(export_jobs.claim_next_job())
+        self.assertEqual((job.status, job.total_rows, job.rows_written), ('completed', 2, 2))
+        self.assertTrue(job.file.name.endswith('.parquet'))
+        self.assertFalse(export_jobs.is_valid_export('users', 'parquet'))
+
+
+class ReadReceiptTests(TestCase):
+    """Opening a conversation marks it read in one UPDATE, however long it is"""
+
+    def setUp(self):
+        self.recruiter = CustomUser.objects.create_user('recruiter', 'recruiter@example.com', 'pw', user_type='recruiter')
+        self.seeker = CustomUser.objects.create_user('seeker', 'seeker@example.com', 'pw', user_type='job_seeker')
+        self.client.force_login(self.seeker)
+
+    def open_conversation(self, unread):
+        conversation = Conversation.objects.create(recruiter=self.recruiter, job_seeker=self.seeker)
+        Message.objects.bulk_create([
+            Message(conversation=conversation, sender=self.recruiter, content=f'Message {index}') for index in range(unread)
+        ])
+        Conversation.objects.filter(pk=conversation.pk).update(job_seeker_unread_count=unread)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('conversation_detail', args=[conversation.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(conversation.messages.filter(is_read=False).exists())
+        conversation.refresh_from_db()
+        self.assertEqual(conversation.job_seeker_unread_count, 0)
+        return [query['sql'] for query in queries.captured_queries]
+
+    def test_query_count_does_not_grow_with_messages(self):
+        # The first request also creates per-user rows (e.g. the unread counter)
+        self.open_conversation(1)
+        short = self.open_conversation(2)
+        long = self.open_conversation(40)
+        self.assertEqual(len(short), len(long))
+        self.assertEqual(sum(sql.startswith('UPDATE "profiles_message"') for sql in long), 1)
+
+    def test_unread_messages_are_marked_read_even_if_the_counter_drifted(self):
+        self.open_conversation(1)
+        conversation = Conversation.objects.get()
+        Message.objects.create(conversation=conversation, sender=self.recruiter, content='Late')
+        Conversation.objects.filter(pk=conversation.pk).update(job_seeker_unread_count=0)
+        self.client.get(reverse('conversation_detail', args=[conversation.id]))
+        self.assertFalse(conversation.messages.filter(is_read=False).exists())
+        conversation.refresh_from_db()
+        self.assertEqual(conversation.job_seeker_unread_count, 0)
+
+
+class BadgeStreamTests(TestCase):
+    """Unread badge changes are pushed to open streams"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('seeker', 'seeker@example.com', 'pw', user_type='job_seeker')
+
+    def notify(self):
+        return Notification.objects.create(recipient=self.user, notification_type='message', title='Hi', message='Hi')
+
+    def test_changes_publish_events(self):
+        notification = self.notify()
+        notification.mark_as_read()
+        self.assertEqual(
+            list(BadgeEvent.objects.order_by('id').values_list('user_id', 'notifications', 'messages')),
+            [(self.user.id, 1, 0), (self.user.id, -1, 0)]
+        )
+
+    def test_broker_reads_each_event_once(self):
+        broker = badges.BadgeBroker()
+        broker._since = timezone.now()
+        self.notify()
+        self.assertEqual(broker._fetch(), [(self.user.id, {'notifications': 1, 'messages': 0})])
+        # Overlapping polls don't repeat events
+        self.assertEqual(broker._fetch(), [])
+
+    def test_broker_prunes_old_events(self):
+        BadgeEvent.objects.create(user=self.user, notifications=1, created_at=timezone.now() - badges.EVENT_RETENTION * 2)
+        broker = badges.BadgeBroker()
+        broker._since = timezone.now()
+        broker._fetch()
+        self.assertFalse(BadgeEvent.objects.exists())
+
+    async def test_stream_sends_snapshot_then_deltas(self):
+        broker = badges.BadgeBroker()
+        with mock.patch.object(badges, 'broker', broker), mock.patch.object(badges, 'POLL_INTERVAL', 0.01):
+            stream = badges.badge_events(self.user)
+            try:
+                self.assertEqual(await stream.__anext__(), 'retry: 5000\n\n')
+                snapshot = await stream.__anext__()
+                self.assertEqual(snapshot, 'event: snapshot\ndata: {"notifications": 0, "messages": 0}\n\n')
+
+                # Let the poller start before the change
+                await asyncio.sleep(0.05)
+                await sync_to_async(self.notify)()
+                delta = await asyncio.wait_for(stream.__anext__(), timeout=5)
+                self.assertEqual(delta, 'event: delta\ndata: {"notifications": 1, "messages": 0}\n\n')
+            finally:
+                await stream.aclose()
+                broker._task.cancel()
+
+    def test_stream_view_outside_asgi(self):
+        self.assertEqual(self.client.get(reverse('badge_stream')).status_code, 401)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('badge_stream')).status_code, 204)
@@ -0,0 +1,178 @@
+"""
+Maintained unread counts.
+
+The badges and the conversations list used to COUNT unread rows on every
+request. These counters are kept instead:
+
+- Conversation.recruiter_unread_count / job_seeker_unread_count: unread
+  messages sent to each participant
+- UnreadCounter: a user's unread notifications, and unread messages
+  across their active conversations
+
+Counters are adjusted with a single ``UPDATE ... SET n = n + delta`` when
+a message or notification is created, read or deleted, so concurrent
+changes don't lose updates. Deleting a user takes their unread messages
+off the other participants' totals, and saving a conversation with a new
+is_active moves its unread messages in or out of both participants'
+totals. Every adjustment is also pushed to the user's badge stream (see
+badges).
+
+Bulk queryset updates and deletes bypass the counters. The
+reconcile_unread_counts command recounts from the rows to repair that
+drift, and is meant to run on a schedule.
+"""
+from django.db.models import Count, F, Q
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from .badges import publish_badge_delta
+from .models import Conversation, Message, Notification, UnreadCounter
+
+
+def _add(field, delta):
+    # Never below zero, even if the counter has drifted
+    return Greatest(F(field) + delta, 0)
+
+
+def count_unread_notifications(user_id):
+    return Notification.objects.filter(recipient_id=user_id, is_read=False).count()
+
+
+def count_unread_messages(user_id):
+    """Unread messages sent to a user in their active conversations"""
+    return Message.objects.filter(
+        Q(conversation__recruiter_id=user_id) | Q(conversation__job_seeker_id=user_id),
+        conversation__is_active=True,
+        is_read=False
+    ).exclude(sender_id=user_id).count()
+
+
+def recount_unread(user_id):
+    """Set a user's totals from the notification and message rows"""
+    counts = {
+        'notifications': count_unread_notifications(user_id),
+        'messages': count_unread_messages(user_id),
+    }
+    UnreadCounter.objects.update_or_create(user_id=user_id, defaults=counts)
+    return counts
+
+
+def get_unread_counts(user_id):
+    """A user's unread totals as ``{'notifications': n, 'messages': n}``"""
+    counts = UnreadCounter.objects.filter(user_id=user_id).values('notifications', 'messages').first()
+    if counts is None:
+        counts = recount_unread(user_id)
+    return counts
+
+
+def adjust_unread(user_id, notifications=0, messages=0):
+    """
+    Add to a user's unread totals (negative to subtract).
+
+    Call after the rows themselves have changed.
+    """
+    if not (notifications or messages):
+        return
+    updates = {}
+    if notifications:
+        updates['notifications'] = _add('notifications', notifications)
+    if messages:
+        updates['messages'] = _add('messages', messages)
+    if not UnreadCounter.objects.filter(user_id=user_id).update(**updates):
+        # No counter yet: start from a recount, which already includes this change
+        recount_unread(user_id)
+    publish_badge_delta(user_id, notifications=notifications, messages=messages)
+
+
+def adjust_conversation_unread(conversation, recipient_id, delta):
+    """Add to the unread messages for one participant of a conversation"""
+    if not delta:
+        return
+    field = conversation.unread_count_field(recipient_id)
+    Conversation.objects.filter(pk=conversation.pk).update(**{field: _add(field, delta)})
+    if conversation.is_active:
+        adjust_unread(recipient_id, messages=delta)
+
+
+def uncount_messages_from(user_id):
+    """
+    Take a user's unread messages off the totals of the people they wrote to.
+
+    Call before the user is deleted: the cascade removes their messages
+    without adjusting anyone else's totals.
+    """
+    unread = Message.objects.filter(sender_id=user_id, conversation__is_active=True, is_read=False)
+    for participant, other in (('recruiter', 'job_seeker'), ('job_seeker', 'recruiter')):
+        for recipient_id, count in unread.filter(**{f'conversation__{other}': user_id}).values(
+            f'conversation__{participant}'
+        ).annotate(n=Count('id')).values_list(f'conversation__{participant}', 'n'):
+            adjust_unread(recipient_id, messages=-count)
+
+
+def conversation_activity_changed(conversation, recruiter_unread, job_seeker_unread):
+    """
+    Move a conversation's unread messages into or out of both participants'
+    totals after its is_active changed. Pass the counts it had before.
+    """
+    sign = 1 if conversation.is_active else -1
+    adjust_unread(conversation.recruiter_id, messages=sign * recruiter_unread)
+    adjust_unread(conversation.job_seeker_id, messages=sign * job_seeker_unread)
+
+
+def mark_conversation_read(conversation, user_id):
+    """
+    Mark every message sent to ``user_id`` in a conversation as read with
+    one UPDATE, however long the thread. Returns the number marked.
+    """
+    count = conversation.messages.filter(is_read=False).exclude(sender_id=user_id).update(
+        is_read=True,
+        read_at=timezone.now()
+    )
+    adjust_conversation_unread(conversation, user_id, -count)
+    return count
+
+
+def reconcile_conversations():
+    """Recount every conversation's unread counters. Returns the number fixed."""
+    def unread_for(participant):
+        # Unread messages the other participant sent
+        return Count('messages', filter=Q(messages__is_read=False) & ~Q(messages__sender=F(participant)))
+
+    rows = Conversation.objects.annotate(
+        actual_recruiter=unread_for('recruiter'),
+        actual_job_seeker=unread_for('job_seeker'),
+    ).values_list('id', 'recruiter_unread_count', 'job_seeker_unread_count', 'actual_recruiter', 'actual_job_seeker')
+
+    fixed = 0
+    for conversation_id, recruiter, job_seeker, actual_recruiter, actual_job_seeker in rows.iterator():
+        if (recruiter, job_seeker) != (actual_recruiter, actual_job_seeker):
+            Conversation.objects.filter(id=conversation_id).update(
+                recruiter_unread_count=actual_recruiter,
+                job_seeker_unread_count=actual_job_seeker
+            )
+            fixed += 1
+    return fixed
+
+
+def reconcile_users():
+    """Recount users whose totals have drifted. Returns the number fixed."""
+    actual = {}
+    for user_id, count in Notification.objects.filter(is_read=False).values('recipient').annotate(
+        n=Count('id')
+    ).values_list('recipient', 'n'):
+        actual[user_id] = {'notifications': count, 'messages': 0}
+
+    active = Message.objects.filter(conversation__is_active=True, is_read=False)
+    for participant, other in (('recruiter', 'job_seeker'), ('job_seeker', 'recruiter')):
+        # Messages sent by the other participant are unread for this one
+        for user_id, count in active.filter(sender=F(f'conversation__{other}')).values(
+            f'conversation__{participant}'
+        ).annotate(n=Count('id')).values_list(f'conversation__{participant}', 'n'):
+            actual.setdefault(user_id, {'notifications': 0, 'messages': 0})['messages'] += count
+
+    fixed = 0
+    for user_id, notifications, messages in UnreadCounter.objects.values_list('user_id', 'notifications', 'messages').iterator():
+        if actual.get(user_id, {'notifications': 0, 'messages': 0}) != {'notifications': notifications, 'messages': messages}:
+            recount_unread(user_id)
+            fixed += 1
+    # Users without a counter get one, from a recount, on first use
+    return fixed
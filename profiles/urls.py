@@ -49,6 +49,9 @@ urlpatterns = [
     path('dashboard/update-user-role/<int:user_id>/', views.admin_update_user_role, name='admin_update_user_role'),
     path('dashboard/delete-user/<int:user_id>/', views.admin_delete_user, name='admin_delete_user'),
     path('dashboard/export/<str:data_type>/', views.export_data_csv, name='admin_export_csv'),
+    path('dashboard/exports/request/<str:data_type>/', views.admin_request_export, name='admin_request_export'),
+    path('dashboard/exports/status/', views.admin_export_jobs_status, name='admin_export_jobs_status'),
+    path('dashboard/exports/<int:job_id>/download/', views.admin_download_export, name='admin_download_export'),
 
     # Messaging URLs
     path('conversations/', views.conversations_list, name='conversations_list'),
@@ -64,6 +67,7 @@ urlpatterns = [
     path('notifications/<int:notification_id>/mark-read/', views.mark_notification_read, name='mark_notification_read'),
     path('notifications/mark-all-read/', views.mark_all_notifications_read, name='mark_all_notifications_read'),
     path('notifications/count/', views.get_unread_notification_count, name='get_unread_notification_count'),
+    path('badges/stream/', views.badge_stream, name='badge_stream'),
 
 ]
 
@@ -3,12 +3,13 @@ from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db import transaction, models
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, Http404
+from django.urls import reverse
 from django.views.decorators.http import require_http_methods
 from django.utils import timezone
-import csv
-from datetime import datetime, timedelta
-from .models import CustomUser, JobSeekerProfile, AdminActionLog, PrivacySettings, Conversation, Message, Notification, UserActivity
+import os
+from datetime import timedelta
+from .models import CustomUser, JobSeekerProfile, AdminActionLog, ExportJob, PrivacySettings, Conversation, Message, Notification
 from .forms import (
     UserRegistrationForm, JobSeekerRegistrationForm, JobSeekerProfileForm,
     SkillFormSet, EducationFormSet, WorkExperienceFormSet, LinkFormSet,
@@ -17,6 +18,7 @@ from .forms import (
 )
 from jobs.models import JobPosting, JobApplication, JobCategory
 from jobs.forms import JobPostingForm, JobApplicationForm
+from .activity_log import log_activity
 
 def create_professional_profile(request):
     """Create a comprehensive professional profile for new users"""
@@ -246,7 +248,7 @@ def view_profile(request, user_id=None):
 def public_profile_list(request):
     """List all public job seeker profiles with search and pagination"""
     from django.core.paginator import Paginator
-    from django.db.models import Q
+    from .search import search_profiles
     
     profiles = JobSeekerProfile.objects.filter(
         is_public=True
@@ -258,18 +260,14 @@ def public_profile_list(request):
     skill_filter = request.GET.get('skill', '')
     
     if search_query:
-        profiles = profiles.filter(
-            Q(user__first_name__icontains=search_query) |
-            Q(user__last_name__icontains=search_query) |
-            Q(headline__icontains=search_query) |
-            Q(bio__icontains=search_query)
-        )
+        # Full-text match on the candidate search document, most relevant first
+        profiles = search_profiles(profiles, search_query)
     
     if location_filter:
         profiles = profiles.filter(location__icontains=location_filter)
     
     if skill_filter:
-        profiles = profiles.filter(skills__name__icontains=skill_filter).distinct()
+        profiles = profiles.filter(search_document__skills__icontains=skill_filter)
     
     # Pagination
     paginator = Paginator(profiles, 6)  # Show 6 profiles per page
@@ -357,27 +355,9 @@ def job_list(request):
     """Display all active job postings with filtering"""
     from jobs.models import JobPosting, JobCategory, JobSkill
     from jobs.utils import get_user_location_from_request
-    from django.db.models import Q
+    from jobs.spatial import within_radius
+    from jobs.search import search_jobs, highlight_jobs
     from django.core.paginator import Paginator
-    import math
-    
-    def calculate_distance(lat1, lon1, lat2, lon2):
-        """Calculate the great circle distance between two points on Earth in miles"""
-        if not all([lat1, lon1, lat2, lon2]):
-            return None
-        
-        # Convert latitude and longitude from degrees to radians
-        lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
-        
-        # Haversine formula
-        dlat = lat2 - lat1
-        dlon = lon2 - lon1
-        a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-        c = 2 * math.asin(math.sqrt(a))
-        
-        # Radius of earth in miles
-        r = 3959
-        return c * r
     
     jobs = JobPosting.objects.filter(is_active=True).select_related('posted_by', 'category').prefetch_related('required_skills').order_by('-posted_at')
     
@@ -398,11 +378,8 @@ def job_list(request):
     user_lon = request.GET.get('user_lon', '')
     
     if search:
-        jobs = jobs.filter(
-            Q(title__icontains=search) | 
-            Q(company__icontains=search) | 
-            Q(description__icontains=search)
-        )
+        # Full-text match, most relevant first
+        jobs = search_jobs(jobs, search)
     
     if title:
         jobs = jobs.filter(title__icontains=title)
@@ -467,29 +444,9 @@ def job_list(request):
         
         if user_lat and user_lon:
             try:
-                radius_miles = float(radius)
-                
-                # Get all jobs first, then filter by distance
-                all_jobs = list(jobs)
-                jobs_within_radius = []
-                
-                for job in all_jobs:
-                    if job.latitude and job.longitude:
-                        distance = calculate_distance(user_lat, user_lon, float(job.latitude), float(job.longitude))
-                        if distance is not None and distance <= radius_miles:
-                            jobs_within_radius.append(job)
-                    else:
-                        # If job doesn't have coordinates, include it if location text matches
-                        if location and location.lower() in job.location.lower():
-                            jobs_within_radius.append(job)
-                
-                # Create a new queryset with the filtered job IDs
-                if jobs_within_radius:
-                    job_ids = [job.id for job in jobs_within_radius]
-                    jobs = JobPosting.objects.filter(id__in=job_ids, is_active=True).order_by('-posted_at')
-                else:
-                    jobs = JobPosting.objects.none()
-                    
+                # Indexed bounding-box prefilter + exact distance, nearest first.
+                # Jobs without coordinates are kept if the location text matched.
+                jobs = within_radius(jobs, user_lat, user_lon, float(radius), include_unlocated=bool(location))
             except (ValueError, TypeError):
                 # If radius/location parameters are invalid, ignore location filtering
                 pass
@@ -499,6 +456,9 @@ def job_list(request):
     page_number = request.GET.get('page')
     jobs = paginator.get_page(page_number)
     
+    if search:
+        highlight_jobs(jobs, search)
+    
     # Add application status for current user
     if request.user.user_type == 'job_seeker':
         applied_job_ids = JobApplication.objects.filter(
@@ -543,6 +503,10 @@ def job_detail(request, job_id):
     """Display job details with apply button"""
     job = get_object_or_404(JobPosting, id=job_id, is_active=True)
     
+    # Buffered increment, written to view_count by a background flush
+    from jobs.view_counter import record_view
+    record_view(job)
+    
     # Check if user has already applied
     has_applied = False
     if request.user.user_type == 'job_seeker':
@@ -843,12 +807,8 @@ def log_user_activity(user, activity_type, request=None, details=''):
         return
     
     try:
-        UserActivity.objects.create(
-            user=user,
-            activity_type=activity_type,
-            ip_address=request.META.get('REMOTE_ADDR') if request else None,
-            details=details
-        )
+        # Queued and written in batches by a background thread
+        log_activity(user, activity_type, request, details)
     except Exception:
         # Silently fail if logging fails to avoid breaking user experience
         pass
@@ -887,33 +847,39 @@ def admin_dashboard(request):
     users_page = paginator.get_page(page_number)
     
     # Statistics
-    total_users = CustomUser.objects.count()
-    active_users = CustomUser.objects.filter(status='active').count()
-    suspended_users = CustomUser.objects.filter(status='suspended').count()
-    flagged_users = CustomUser.objects.filter(status='flagged').count()
-    job_seekers = CustomUser.objects.filter(user_type='job_seeker').count()
-    recruiters = CustomUser.objects.filter(user_type='recruiter').count()
+    from jobs.models import JobPosting
+    from jobs.view_counter import get_view_counts
+    from .metrics import get_usage_totals, get_daily_series
+    totals = get_usage_totals()
+    
+    # Recent activity from the daily rollups
+    today = timezone.localdate()
+    daily_metrics = get_daily_series(today - timedelta(days=13), today + timedelta(days=1))
     
     # Job posting statistics
-    from jobs.models import JobPosting
-    recent_jobs = JobPosting.objects.filter(is_active=True).order_by('-posted_at')[:10]
-    total_jobs = JobPosting.objects.count()
-    active_jobs = JobPosting.objects.filter(is_active=True).count()
-    inactive_jobs = JobPosting.objects.filter(is_active=False).count()
+    recent_jobs = list(JobPosting.objects.filter(is_active=True).order_by('-posted_at')[:10])
+    
+    # Include views still buffered in memory
+    view_counts = get_view_counts(recent_jobs)
+    for job in recent_jobs:
+        job.view_count = view_counts[job.id]
     
     context = {
         'users': users_page,
         'search_form': search_form,
-        'total_users': total_users,
-        'active_users': active_users,
-        'suspended_users': suspended_users,
-        'flagged_users': flagged_users,
-        'job_seekers': job_seekers,
-        'recruiters': recruiters,
+        'total_users': totals['total_users'],
+        'active_users': totals['active_users'],
+        'suspended_users': totals['suspended_users'],
+        'flagged_users': totals['flagged_users'],
+        'job_seekers': totals['job_seekers'],
+        'recruiters': totals['recruiters'],
         'recent_jobs': recent_jobs,
-        'total_jobs': total_jobs,
-        'active_jobs': active_jobs,
-        'inactive_jobs': inactive_jobs,
+        'total_jobs': totals['total_jobs'],
+        'active_jobs': totals['active_jobs'],
+        'inactive_jobs': totals['inactive_jobs'],
+        'daily_metrics': daily_metrics,
+        'export_jobs': ExportJob.objects.select_related('requested_by')[:10],
+        'export_types': ExportJob.DATA_TYPES,
     }
     
     return render(request, 'profiles/admin_dashboard.html', context)
@@ -1097,261 +1063,60 @@ def admin_action_logs(request):
 @admin_required
 def export_data_csv(request, data_type):
     """Export various data types to CSV for reporting purposes"""
-    valid_types = ['users', 'job_postings', 'applications', 'usage_metrics', 'admin_actions']
+    from .csv_export import csv_response, export_rows
     
-    if data_type not in valid_types:
+    if data_type not in dict(ExportJob.DATA_TYPES):
         messages.error(request, 'Invalid export type.')
         return redirect('admin_dashboard')
     
-    # Create response with CSV content type
-    timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
-    filename = f'{data_type}_export_{timestamp}.csv'
-    response = HttpResponse(content_type='text/csv; charset=utf-8')
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    
-    # Add BOM for Excel compatibility
-    response.write('\ufeff')
-    
-    writer = csv.writer(response)
-    
-    if data_type == 'users':
-        _export_users_csv(writer)
-    elif data_type == 'job_postings':
-        _export_job_postings_csv(writer)
-    elif data_type == 'applications':
-        _export_applications_csv(writer)
-    elif data_type == 'usage_metrics':
-        _export_usage_metrics_csv(writer)
-    elif data_type == 'admin_actions':
-        _export_admin_actions_csv(writer)
-    
-    return response
+    # Rows are generated while the response streams, not held in memory
+    return csv_response(f'{data_type}_export', export_rows(data_type))
 
-def _export_users_csv(writer):
-    """Export all users to CSV"""
-    # Header row
-    writer.writerow([
-        'Username', 'Email', 'First Name', 'Last Name', 'User Type', 
-        'Status', 'Is Superuser', 'Is Staff', 'Date Joined', 'Last Login',
-        'Has Job Seeker Profile', 'Has Recruiter Profile'
-    ])
+@admin_required
+@require_http_methods(["POST"])
+def admin_request_export(request, data_type):
+    """Queue an export to be written in the background"""
+    from .export_jobs import request_export, is_valid_export
     
-    # Data rows
-    users = CustomUser.objects.all().select_related('job_seeker_profile').order_by('-date_joined')
+    file_format = request.POST.get('format', 'csv')
+    if not is_valid_export(data_type, file_format):
+        messages.error(request, 'Invalid export type.')
+        return redirect('admin_dashboard')
     
-    for user in users:
-        # Check for profiles safely
-        try:
-            has_job_seeker = user.job_seeker_profile is not None
-        except JobSeekerProfile.DoesNotExist:
-            has_job_seeker = False
-        
-        try:
-            from recruiters.models import RecruiterProfile
-            has_recruiter = RecruiterProfile.objects.filter(user=user).exists()
-        except:
-            has_recruiter = False
-        
-        writer.writerow([
-            user.username,
-            user.email,
-            user.first_name or '',
-            user.last_name or '',
-            user.get_user_type_display(),
-            user.get_status_display(),
-            'Yes' if user.is_superuser else 'No',
-            'Yes' if user.is_staff else 'No',
-            user.date_joined.strftime('%Y-%m-%d %H:%M:%S') if user.date_joined else '',
-            user.last_login.strftime('%Y-%m-%d %H:%M:%S') if user.last_login else 'Never',
-            'Yes' if has_job_seeker else 'No',
-            'Yes' if has_recruiter else 'No',
-        ])
-
-def _export_job_postings_csv(writer):
-    """Export all job postings to CSV"""
-    # Header row
-    writer.writerow([
-        'ID', 'Title', 'Company', 'Location', 'Category', 'Employment Type',
-        'Experience Level', 'Work Location', 'Status', 'Is Active',
-        'Salary Min', 'Salary Max', 'Salary Currency', 'Salary Period',
-        'Visa Sponsorship', 'Application Count', 'View Count',
-        'Posted By (Email)', 'Posted By (Username)', 'Posted At', 'Updated At'
-    ])
-    
-    # Data rows
-    jobs = JobPosting.objects.select_related('posted_by', 'category').prefetch_related('required_skills').order_by('-posted_at')
-    
-    for job in jobs:
-        writer.writerow([
-            job.id,
-            job.title or '',
-            job.company or '',
-            job.location or '',
-            job.category.name if job.category else '',
-            job.get_employment_type_display(),
-            job.get_experience_level_display(),
-            job.get_work_location_display(),
-            job.get_status_display(),
-            'Yes' if job.is_active else 'No',
-            str(job.salary_min) if job.salary_min else '',
-            str(job.salary_max) if job.salary_max else '',
-            job.salary_currency,
-            job.salary_period,
-            'Yes' if job.visa_sponsorship else 'No',
-            job.application_count,
-            job.view_count,
-            job.posted_by.email if job.posted_by else '',
-            job.posted_by.username if job.posted_by else '',
-            job.posted_at.strftime('%Y-%m-%d %H:%M:%S') if job.posted_at else '',
-            job.updated_at.strftime('%Y-%m-%d %H:%M:%S') if job.updated_at else '',
-        ])
-
-def _export_applications_csv(writer):
-    """Export all job applications to CSV"""
-    # Header row
-    writer.writerow([
-        'ID', 'Job Title', 'Job Company', 'Applicant Email', 'Applicant Username',
-        'Applicant Name', 'Status', 'Outcome', 'Applied At', 'Interview Date',
-        'Has Resume', 'Has Cover Letter'
-    ])
-    
-    # Data rows
-    applications = JobApplication.objects.select_related(
-        'job', 'applicant', 'job__posted_by'
-    ).order_by('-applied_at')
-    
-    for app in applications:
-        applicant_name = app.applicant.get_full_name() or app.applicant.username
-        
-        writer.writerow([
-            app.id,
-            app.job.title if app.job else '',
-            app.job.company if app.job else '',
-            app.applicant.email if app.applicant else '',
-            app.applicant.username if app.applicant else '',
-            applicant_name,
-            app.get_status_display(),
-            app.get_outcome_display(),
-            app.applied_at.strftime('%Y-%m-%d %H:%M:%S') if app.applied_at else '',
-            app.interview_date.strftime('%Y-%m-%d %H:%M:%S') if app.interview_date else '',
-            'Yes' if app.resume else 'No',
-            'Yes' if app.cover_letter else 'No',
-        ])
-
-def _export_usage_metrics_csv(writer):
-    """Export usage metrics to CSV"""
-    # Header row
-    writer.writerow([
-        'Metric', 'Value', 'Period', 'Date'
-    ])
-    
-    now = timezone.now()
-    
-    # User metrics
-    total_users = CustomUser.objects.count()
-    active_users = CustomUser.objects.filter(status='active').count()
-    job_seekers = CustomUser.objects.filter(user_type='job_seeker').count()
-    recruiters = CustomUser.objects.filter(user_type='recruiter').count()
-    
-    # Job metrics
-    total_jobs = JobPosting.objects.count()
-    active_jobs = JobPosting.objects.filter(is_active=True).count()
-    published_jobs = JobPosting.objects.filter(status='published').count()
-    
-    # Application metrics
-    total_applications = JobApplication.objects.count()
-    # Get first day of current month
-    first_day_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    applications_this_month = JobApplication.objects.filter(
-        applied_at__gte=first_day_of_month
-    ).count()
-    
-    # Recent registrations
-    users_today = CustomUser.objects.filter(date_joined__date=now.date()).count()
-    users_this_week = CustomUser.objects.filter(
-        date_joined__gte=now - timedelta(days=7)
-    ).count()
-    users_this_month = CustomUser.objects.filter(
-        date_joined__gte=first_day_of_month
-    ).count()
-    
-    # Write metrics
-    metrics = [
-        ('Total Users', total_users, 'All Time', now.strftime('%Y-%m-%d')),
-        ('Active Users', active_users, 'All Time', now.strftime('%Y-%m-%d')),
-        ('Job Seekers', job_seekers, 'All Time', now.strftime('%Y-%m-%d')),
-        ('Recruiters', recruiters, 'All Time', now.strftime('%Y-%m-%d')),
-        ('Total Job Postings', total_jobs, 'All Time', now.strftime('%Y-%m-%d')),
-        ('Active Job Postings', active_jobs, 'All Time', now.strftime('%Y-%m-%d')),
-        ('Published Job Postings', published_jobs, 'All Time', now.strftime('%Y-%m-%d')),
-        ('Total Applications', total_applications, 'All Time', now.strftime('%Y-%m-%d')),
-        ('Applications This Month', applications_this_month, 'This Month', now.strftime('%Y-%m-%d')),
-        ('New Users Today', users_today, 'Today', now.strftime('%Y-%m-%d')),
-        ('New Users This Week', users_this_week, 'This Week', now.strftime('%Y-%m-%d')),
-        ('New Users This Month', users_this_month, 'This Month', now.strftime('%Y-%m-%d')),
-    ]
-    
-    for metric, value, period, date in metrics:
-        writer.writerow([metric, value, period, date])
-    
-    # Time series data - registrations by day (last 30 days)
-    writer.writerow([])  # Empty row separator
-    writer.writerow(['Date', 'New Registrations', 'New Job Postings', 'New Applications'])
-    
-    for i in range(30):
-        date = now.date() - timedelta(days=i)
-        date_start = timezone.make_aware(datetime.combine(date, datetime.min.time()))
-        date_end = date_start + timedelta(days=1)
-        
-        registrations = CustomUser.objects.filter(
-            date_joined__gte=date_start,
-            date_joined__lt=date_end
-        ).count()
-        
-        job_postings = JobPosting.objects.filter(
-            posted_at__gte=date_start,
-            posted_at__lt=date_end
-        ).count()
-        
-        applications = JobApplication.objects.filter(
-            applied_at__gte=date_start,
-            applied_at__lt=date_end
-        ).count()
-        
-        writer.writerow([
-            date.strftime('%Y-%m-%d'),
-            registrations,
-            job_postings,
-            applications
-        ])
-
-def _export_admin_actions_csv(writer):
-    """Export admin action logs to CSV"""
-    # Header row
-    writer.writerow([
-        'ID', 'Admin User', 'Admin Email', 'Target User', 'Target Email',
-        'Action Type', 'Description', 'Previous Value', 'New Value',
-        'IP Address', 'User Agent', 'Created At'
-    ])
-    
-    # Data rows
-    logs = AdminActionLog.objects.select_related('admin_user', 'target_user').order_by('-created_at')
+    job = request_export(request.user, data_type, file_format)
+    messages.success(request, f'{job.get_data_type_display()} {job.get_file_format_display()} export queued. It will be ready to download from the dashboard shortly.')
+    return redirect('admin_dashboard')
+
+@admin_required
+def admin_export_jobs_status(request):
+    """Progress of recent background exports for the admin dashboard"""
+    jobs = ExportJob.objects.all()[:10]
+    return JsonResponse({
+        'success': True,
+        'jobs': [
+            {
+                'id': job.id,
+                'status': job.status,
+                'status_display': job.get_status_display(),
+                'progress': job.progress,
+                'rows_written': job.rows_written,
+                'total_rows': job.total_rows,
+                'file_size': job.file_size,
+                'download_url': reverse('admin_download_export', args=[job.id]) if job.status == 'completed' else None,
+            }
+            for job in jobs
+        ],
+    })
+
+@admin_required
+def admin_download_export(request, job_id):
+    """Download a finished export; supports Range requests for resuming"""
+    from .export_jobs import file_range_response, CONTENT_TYPES
     
-    for log in logs:
-        writer.writerow([
-            log.id,
-            log.admin_user.username if log.admin_user else '',
-            log.admin_user.email if log.admin_user else '',
-            log.target_user.username if log.target_user else '',
-            log.target_user.email if log.target_user else '',
-            log.get_action_type_display(),
-            log.description,
-            log.previous_value,
-            log.new_value,
-            str(log.ip_address) if log.ip_address else '',
-            log.user_agent[:200] if log.user_agent else '',  # Truncate long user agents
-            log.created_at.strftime('%Y-%m-%d %H:%M:%S') if log.created_at else '',
-        ])
+    job = get_object_or_404(ExportJob, id=job_id, status='completed')
+    if not job.file or not os.path.exists(job.file.path):
+        raise Http404('Export file not found')
+    return file_range_response(request, job.file.path, os.path.basename(job.file.name), CONTENT_TYPES[job.file_format])
 
 # Privacy Settings Views
 @login_required
@@ -1452,11 +1217,9 @@ def conversations_list(request):
             'recruiter', 'job_posting'
         ).prefetch_related('messages')
 
-    # Get unread message counts for each conversation
+    # Unread counts are kept on the conversation
     for conversation in conversations:
-        conversation.unread_count = conversation.messages.filter(
-            is_read=False
-        ).exclude(sender=user).count()
+        conversation.unread_count = conversation.get_unread_count(user)
 
     context = {
         'conversations': conversations,
@@ -1476,12 +1239,15 @@ def conversation_detail(request, conversation_id):
         return redirect('conversations_list')
 
     # Get all messages in this conversation
-    messages_list = conversation.messages.select_related('sender').order_by('created_at')
+    # Sender profiles are joined for the avatars, instead of two queries per message
+    messages_list = conversation.messages.select_related(
+        'sender__job_seeker_profile', 'sender__recruiter_profile'
+    ).order_by('created_at')
 
-    # Mark messages as read (except user's own messages)
-    for message in messages_list:
-        if message.sender != request.user and not message.is_read:
-            message.mark_as_read()
+    # Mark messages as read (except user's own messages) in one UPDATE.
+    # Not gated on the unread counter, which may have drifted.
+    from .unread import mark_conversation_read
+    mark_conversation_read(conversation, request.user.id)
 
     # Handle new message
     if request.method == 'POST':
@@ -1610,12 +1376,8 @@ def mark_messages_read(request, conversation_id):
         return JsonResponse({'success': False, 'message': 'Unauthorized'})
 
     # Mark all unread messages as read
-    unread_messages = conversation.messages.filter(
-        is_read=False
-    ).exclude(sender=request.user)
-
-    count = unread_messages.count()
-    unread_messages.update(is_read=True, read_at=timezone.now())
+    from .unread import mark_conversation_read
+    count = mark_conversation_read(conversation, request.user.id)
 
     return JsonResponse({
         'success': True,
@@ -1647,6 +1409,7 @@ def delete_message(request, message_id):
 def notifications_list(request):
     """Display user notifications with filtering and pagination"""
     from django.core.paginator import Paginator
+    from .unread import get_unread_counts
     
     notifications = Notification.objects.filter(recipient=request.user)
     
@@ -1664,7 +1427,7 @@ def notifications_list(request):
     
     context = {
         'notifications': notifications_page,
-        'unread_count': Notification.objects.filter(recipient=request.user, is_read=False).count(),
+        'unread_count': get_unread_counts(request.user.id)['notifications'],
         'total_count': Notification.objects.filter(recipient=request.user).count(),
         'filter': filter_type,
     }
@@ -1691,30 +1454,42 @@ def mark_all_notifications_read(request):
         recipient=request.user,
         is_read=False
     ).update(is_read=True, read_at=timezone.now())
+    from .unread import adjust_unread
+    adjust_unread(request.user.id, notifications=-count)
     
     return redirect('notifications')
 
 @login_required
 def get_unread_notification_count(request):
     """AJAX endpoint to get unread notification count"""
-    count = Notification.objects.filter(recipient=request.user, is_read=False).count()
-    return JsonResponse({'count': count})
+    from .unread import get_unread_counts
+    return JsonResponse({'count': get_unread_counts(request.user.id)['notifications']})
 
 @login_required
 def get_unread_messages_count(request):
     """AJAX endpoint to get unread messages count"""
-    from profiles.models import Message, Conversation
-    
-    # Get all conversations where the user is a participant
-    user_conversations = Conversation.objects.filter(
-        models.Q(job_seeker=request.user) | models.Q(recruiter=request.user),
-        is_active=True
-    )
-    
-    # Count unread messages in those conversations where user is NOT the sender
-    count = Message.objects.filter(
-        conversation__in=user_conversations,
-        is_read=False
-    ).exclude(sender=request.user).count()
-    
-    return JsonResponse({'count': count})
+    from .unread import get_unread_counts
+    return JsonResponse({'count': get_unread_counts(request.user.id)['messages']})
+
+async def badge_stream(request):
+    """
+    Server-sent events stream of the user's unread badge counts.
+
+    Only served under ASGI; elsewhere it answers 204 so the page's
+    EventSource gives up and falls back to polling the count endpoints.
+    """
+    from django.core.handlers.asgi import ASGIRequest
+    from django.http import HttpResponse, StreamingHttpResponse
+    from .badges import badge_events
+
+    user = await request.auser()
+    if not user.is_authenticated:
+        return HttpResponse(status=401)
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+
+    response = StreamingHttpResponse(badge_events(user), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
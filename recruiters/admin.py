@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import RecruiterProfile, SavedSearch, CandidateNote, SearchMatch, SearchNotification
+from .models import RecruiterProfile, SavedSearch, CandidateNote, SearchMatch, SearchNotification, CandidateMatch
 
 @admin.register(RecruiterProfile)
 class RecruiterProfileAdmin(admin.ModelAdmin):
@@ -40,3 +40,11 @@ class SearchNotificationAdmin(admin.ModelAdmin):
     search_fields = ['saved_search__name', 'saved_search__recruiter__user__username']
     readonly_fields = ['sent_at']
     date_hierarchy = 'sent_at'
+
+
+@admin.register(CandidateMatch)
+class CandidateMatchAdmin(admin.ModelAdmin):
+    list_display = ['recruiter', 'candidate', 'score', 'best_job', 'best_job_score', 'updated_at']
+    list_filter = ['recruiter', 'updated_at']
+    search_fields = ['recruiter__user__username', 'candidate__user__username']
+    readonly_fields = ['updated_at']
@@ -1,21 +1,57 @@
 """
 Management command to check saved searches and send notifications
 """
-from django.core.management.base import BaseCommand
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import F
 from django.utils import timezone
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
-from django.conf import settings
-from recruiters.models import SavedSearch
+from recruiters.models import SavedSearch, SearchMatch
 from recruiters.search_utils import (
-    find_new_matches, 
-    should_send_notification, 
-    mark_matches_as_notified,
-    create_notification_record,
-    get_notification_matches
+    find_new_matches,
+    is_notification_due,
+    get_digest_matches,
+    build_digest_email,
+    mark_digest_notified
 )
 
 
+def parse_shard(value):
+    """Parse an ``i/n`` shard spec into (i, n) with 0 <= i < n"""
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise CommandError(f'Invalid --shard "{value}", expected i/n (e.g. 0/4)')
+    if count < 1 or not 0 <= index < count:
+        raise CommandError(f'Invalid --shard "{value}", need 0 <= i < n')
+    return index, count
+
+
+def match_search(search):
+    """
+    Run the incremental matcher for one search
+
+    Returns (search, new matches, error); a failing search is reported
+    instead of aborting the run.
+    """
+    try:
+        return search, find_new_matches(search), None
+    except Exception as e:
+        return search, [], e
+
+
+def match_search_in_thread(search):
+    """Run match_search in a worker thread"""
+    try:
+        return match_search(search)
+    finally:
+        # Each worker thread has its own database connection
+        connection.close()
+
+
 class Command(BaseCommand):
     help = 'Check saved searches for new matches and send notifications'
 
@@ -30,112 +66,158 @@ class Command(BaseCommand):
             type=int,
             help='Check only a specific saved search ID',
         )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of threads used to match searches',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Number of recruiter digests rendered and sent per SMTP connection',
+        )
+        parser.add_argument(
+            '--shard',
+            help='Only process shard i of n (e.g. 0/4), split by recruiter id',
+        )
 
     def handle(self, *args, **options):
         dry_run = options['dry_run']
         search_id = options.get('search_id')
-        
+        workers = max(1, options['workers'])
+        batch_size = max(1, options['batch_size'])
+        shard = parse_shard(options['shard']) if options.get('shard') else None
+        timings = {'matching': 0.0, 'rendering': 0.0, 'sending': 0.0}
+
         self.stdout.write('Checking saved searches for new matches...')
-        
+
         # Get active saved searches
         searches = SavedSearch.objects.filter(
             is_active=True,
             notify_on_new_matches=True
-        )
-        
+        ).select_related('recruiter__user').order_by('id')
+
         if search_id:
             searches = searches.filter(id=search_id)
-        
-        total_notifications = 0
-        
-        for search in searches:
+
+        if shard:
+            searches = self.filter_shard(searches, *shard)
+
+        # Phase 1: find new matches
+        start = time.perf_counter()
+        searches = list(searches)
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(match_search_in_thread, searches))
+        else:
+            results = [match_search(search) for search in searches]
+
+        # The percolator may already have recorded matches, so look at
+        # everything still pending rather than just this run's finds
+        pending_ids = set(SearchMatch.objects.filter(
+            saved_search__in=searches,
+            is_new_match=True,
+            notified=False
+        ).values_list('saved_search_id', flat=True).distinct())
+
+        now = timezone.now()
+        due_by_recruiter = defaultdict(list)
+        failures = 0
+        for search, new_matches, error in results:
             self.stdout.write(f'Checking search: {search.name}')
-            
-            # Find new matches
-            new_matches = find_new_matches(search)
-            
+            if error is not None:
+                failures += 1
+                self.stdout.write(self.style.WARNING(f'  Error matching search {search.id}: {error}'))
             if new_matches:
                 self.stdout.write(f'  Found {len(new_matches)} new matches')
-                
-                # Check if we should send notification
-                if should_send_notification(search):
-                    self.stdout.write(f'  Sending {search.notification_frequency} notification...')
-                    
-                    if not dry_run:
-                        # Send notification
-                        success = self.send_notification(search)
-                        
-                        if success:
-                            # Mark matches as notified
-                            mark_matches_as_notified(search, search.notification_frequency)
-                            
-                            # Create notification record
-                            create_notification_record(
-                                search, 
-                                search.notification_frequency, 
-                                len(new_matches),
-                                email_sent=True
-                            )
-                            
-                            self.stdout.write(f'  Notification sent successfully')
-                            total_notifications += 1
-                        else:
-                            self.stdout.write(f'  Failed to send notification')
-                    else:
-                        self.stdout.write(f'  [DRY RUN] Would send notification')
-                        total_notifications += 1
-                else:
-                    self.stdout.write(f'  Notification not due yet')
+
+            if search.id not in pending_ids:
+                self.stdout.write('  No new matches found')
+            elif is_notification_due(search, now):
+                due_by_recruiter[search.recruiter_id].append(search)
             else:
-                self.stdout.write(f'  No new matches found')
-        
+                self.stdout.write('  Notification not due yet')
+        timings['matching'] = time.perf_counter() - start
+
+        # Phases 2 and 3: one digest per recruiter, rendered and sent in
+        # batches over one SMTP connection
+        recruiter_ids = list(due_by_recruiter)
+        total_notifications = 0
+        for offset in range(0, len(recruiter_ids), batch_size):
+            batch = [due_by_recruiter[recruiter_id] for recruiter_id in recruiter_ids[offset:offset + batch_size]]
+
+            start = time.perf_counter()
+            matches_by_search = get_digest_matches([search for due in batch for search in due])
+            digests = []
+            for due in batch:
+                sections = [
+                    {'saved_search': search, 'matches': matches_by_search[search.id]}
+                    for search in due
+                    if matches_by_search[search.id]
+                ]
+                if sections:
+                    recruiter = sections[0]['saved_search'].recruiter
+                    digests.append((recruiter, sections, build_digest_email(recruiter, sections)))
+            timings['rendering'] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            total_notifications += self.send_batch(digests, dry_run)
+            timings['sending'] += time.perf_counter() - start
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Completed. {total_notifications} digests {"would be " if dry_run else ""}sent.')
+        )
         self.stdout.write(
-            self.style.SUCCESS(f'Completed. {total_notifications} notifications {"would be " if dry_run else ""}sent.')
+            f'Checked {len(searches)} searches with {workers} worker(s), {failures} failed. Timing: '
+            + ', '.join(f'{phase} {seconds:.2f}s' for phase, seconds in timings.items())
         )
 
-    def send_notification(self, saved_search):
+    def filter_shard(self, searches, index, count):
         """
-        Send email notification for new matches
+        Restrict searches to the recruiters with recruiter_id % count == index
+
+        The split doesn't depend on what each host sees in the table, and a
+        recruiter's searches all land on one host, so each digest is sent
+        once.
+        """
+        self.stdout.write(f'Shard {index}/{count}: recruiter id % {count} == {index}')
+        return searches.annotate(shard=F('recruiter_id') % count).filter(shard=index)
+
+    def send_batch(self, digests, dry_run):
+        """
+        Send rendered digests, reusing one SMTP connection
+
+        Returns the number of digests sent.
         """
+        if dry_run:
+            for recruiter, sections, message in digests:
+                self.stdout.write(f'  [DRY RUN] Would send digest to {recruiter.user.email} covering {len(sections)} searches')
+            return len(digests)
+
+        sent = 0
         try:
-            # Get new matches
-            matches = get_notification_matches(saved_search)
-            
-            if not matches.exists():
-                return False
-            
-            # Prepare email context
-            context = {
-                'saved_search': saved_search,
-                'matches': matches,
-                'matches_count': matches.count(),
-                'site_url': getattr(settings, 'SITE_URL', 'http://localhost:8000'),
-            }
-            
-            # Render email templates
-            subject = f'New candidates match your search: {saved_search.name}'
-            
-            if saved_search.notification_frequency == 'immediate':
-                template = 'recruiters/emails/new_matches_immediate.html'
-            elif saved_search.notification_frequency == 'daily':
-                template = 'recruiters/emails/daily_digest.html'
-            else:  # weekly
-                template = 'recruiters/emails/weekly_digest.html'
-            
-            html_message = render_to_string(template, context)
-            
-            # Send email
-            send_mail(
-                subject=subject,
-                message='',  # We're using HTML
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[saved_search.recruiter.user.email],
-                html_message=html_message,
-                fail_silently=False,
-            )
-            
-            return True
-            
+            mail_connection = get_connection(fail_silently=False)
+            mail_connection.open()
         except Exception as e:
-            self.stdout.write(f'Error sending notification: {str(e)}')
-            return False
+            self.stdout.write(f'Error opening mail connection: {str(e)}')
+            return 0
+
+        try:
+            for recruiter, sections, message in digests:
+                try:
+                    message.connection = mail_connection
+                    mail_connection.send_messages([message])
+                except Exception as e:
+                    self.stdout.write(f'  Failed to send digest to {recruiter.user.email}: {str(e)}')
+                    continue
+
+                # Mark the included matches as notified and record the notifications
+                mark_digest_notified(sections)
+                self.stdout.write(f'  Digest sent to {recruiter.user.email} covering {len(sections)} searches')
+                sent += 1
+        finally:
+            mail_connection.close()
+
+        return sent
@@ -0,0 +1,53 @@
+"""
+Management command to refresh the precomputed candidate match store
+"""
+import time
+from django.core.management.base import BaseCommand
+from recruiters.models import RecruiterProfile, MatchRefreshRequest
+from recruiters.match_utils import process_refresh_requests, refresh_recruiter_matches
+
+
+class Command(BaseCommand):
+    help = 'Recompute queued recruiter/candidate matches for candidate recommendations'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Rebuild matches for every recruiter instead of draining the queue',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            help='Process at most this many queued requests',
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+
+        if options['full']:
+            self.stdout.write('Rebuilding candidate matches for all recruiters...')
+            MatchRefreshRequest.objects.filter(target_type='recruiter').delete()
+            total_rows = 0
+            recruiter_ids = list(RecruiterProfile.objects.values_list('id', flat=True))
+            for recruiter_id in recruiter_ids:
+                total_rows += refresh_recruiter_matches(recruiter_id)
+            # Every pair has just been rebuilt, so queued candidates are stale too
+            MatchRefreshRequest.objects.filter(target_type='candidate').delete()
+            self.stdout.write(self.style.SUCCESS(
+                f'Rebuilt {len(recruiter_ids)} recruiter(s), {total_rows} match row(s) '
+                f'in {time.perf_counter() - start:.2f}s'
+            ))
+            return
+
+        pending = MatchRefreshRequest.objects.count()
+        if not pending:
+            self.stdout.write('No queued match refreshes.')
+            return
+
+        self.stdout.write(f'Processing {pending} queued match refresh(es)...')
+        recruiters, candidates = process_refresh_requests(limit=options.get('limit'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Refreshed {recruiters} recruiter(s) and {candidates} candidate(s) '
+            f'in {time.perf_counter() - start:.2f}s'
+        ))
@@ -0,0 +1,222 @@
+"""
+Utility functions for the precomputed recruiter x candidate match store.
+
+CandidateMatch holds one row per (recruiter, candidate) pair with a
+non-zero score. Skill, JobSkill, JobPosting and JobSeekerProfile changes
+only enqueue a MatchRefreshRequest (see recruiters.signals); the
+refresh_candidate_matches command drains the queue, so the
+candidate_recommendations view just reads the top rows.
+"""
+from collections import defaultdict
+from django.db import transaction
+from django.utils import timezone
+from jobs.models import JobSkill
+from jobs.skill_index import normalize_skill, PARTIAL_MATCH_CREDIT, NO_SKILLS_SCORE
+from profiles.models import JobSeekerProfile, Skill
+from .models import CandidateMatch, MatchRefreshRequest, RecruiterProfile
+
+
+def request_refresh(target_type, target_id):
+    """Queue a recruiter or candidate for match recomputation"""
+    if target_id is not None:
+        MatchRefreshRequest.objects.get_or_create(target_type=target_type, target_id=target_id)
+
+
+def get_recruiter_job_skills(recruiter_ids=None):
+    """
+    Load the skills of every active, published job, grouped by recruiter.
+
+    Returns:
+        dict: {recruiter_id: {job_id: [skill names]}}
+    """
+    job_skills = JobSkill.objects.filter(
+        job__is_active=True,
+        job__status='published',
+        job__posted_by__recruiter_profile__isnull=False,
+    )
+    if recruiter_ids is not None:
+        job_skills = job_skills.filter(job__posted_by__recruiter_profile__in=recruiter_ids)
+
+    skills_by_recruiter = defaultdict(lambda: defaultdict(list))
+    for recruiter_id, job_id, name in job_skills.values_list(
+        'job__posted_by__recruiter_profile', 'job_id', 'name'
+    ).order_by('job_id', 'name'):
+        skills_by_recruiter[recruiter_id][job_id].append(name)
+    return skills_by_recruiter
+
+
+def score_candidate(job_skills_map, candidate_skills):
+    """
+    Score a candidate against all of a recruiter's job skills.
+
+    Args:
+        job_skills_map: {job_id: [skill names]} for the recruiter's open jobs
+        candidate_skills: The candidate's skill names
+
+    Returns:
+        dict: score, matched/partial/missing skills, total_required,
+        best_job_id and best_job_score (both exact-match based)
+    """
+    all_job_skills = sorted({name for names in job_skills_map.values() for name in names})
+    candidate_tokens = {normalize_skill(skill) for skill in candidate_skills}
+
+    if not candidate_tokens:
+        return {
+            'score': NO_SKILLS_SCORE,
+            'matched_skills': [],
+            'partial_matches': [],
+            'missing_skills': all_job_skills,
+            'total_required': len(all_job_skills),
+            'best_job_id': None,
+            'best_job_score': 0,
+        }
+
+    matched_skills = []
+    partial_matches = []
+    missing_skills = []
+    for job_skill in all_job_skills:
+        token = normalize_skill(job_skill)
+        if token in candidate_tokens:
+            matched_skills.append(job_skill)
+        elif any(candidate_token in token or token in candidate_token for candidate_token in candidate_tokens):
+            partial_matches.append(job_skill)
+        else:
+            missing_skills.append(job_skill)
+
+    score = 0
+    if all_job_skills:
+        score = (len(matched_skills) + len(partial_matches) * PARTIAL_MATCH_CREDIT) / len(all_job_skills)
+
+    # Find best matching job for this candidate
+    best_job_id = None
+    best_job_score = 0
+    for job_id, names in sorted(job_skills_map.items()):
+        if not names:
+            continue
+        job_matched = sum(1 for name in names if normalize_skill(name) in candidate_tokens)
+        job_score = job_matched / len(names)
+        if job_score > best_job_score:
+            best_job_score = job_score
+            best_job_id = job_id
+
+    return {
+        'score': score,
+        'matched_skills': matched_skills,
+        'partial_matches': partial_matches,
+        'missing_skills': missing_skills,
+        'total_required': len(all_job_skills),
+        'best_job_id': best_job_id,
+        'best_job_score': best_job_score,
+    }
+
+
+def _build_match(recruiter_id, candidate_id, result):
+    return CandidateMatch(
+        recruiter_id=recruiter_id,
+        candidate_id=candidate_id,
+        score=result['score'],
+        matched_skills=result['matched_skills'],
+        partial_matches=result['partial_matches'],
+        missing_skills=result['missing_skills'],
+        total_required=result['total_required'],
+        best_job_id=result['best_job_id'],
+        best_job_score=result['best_job_score'],
+    )
+
+
+def refresh_recruiter_matches(recruiter_id, batch_size=1000):
+    """
+    Recompute every candidate's match row for one recruiter.
+
+    Also stamps the recruiter's matches_built_at, since a recruiter with
+    no matching candidates has no rows. Returns the number of rows stored.
+    """
+    job_skills_map = get_recruiter_job_skills([recruiter_id]).get(recruiter_id, {})
+
+    matches = []
+    if job_skills_map:
+        candidate_skills = defaultdict(list)
+        for profile_id, name in Skill.objects.filter(profile__is_public=True).values_list('profile_id', 'name'):
+            candidate_skills[profile_id].append(name)
+
+        for candidate_id in JobSeekerProfile.objects.filter(is_public=True).values_list('id', flat=True).iterator():
+            result = score_candidate(job_skills_map, candidate_skills.get(candidate_id, []))
+            if result['score'] > 0:
+                matches.append(_build_match(recruiter_id, candidate_id, result))
+
+    with transaction.atomic():
+        CandidateMatch.objects.filter(recruiter_id=recruiter_id).delete()
+        CandidateMatch.objects.bulk_create(matches, batch_size=batch_size)
+        # Queryset update so updated_at and the profile signals are left alone
+        RecruiterProfile.objects.filter(pk=recruiter_id).update(matches_built_at=timezone.now())
+    return len(matches)
+
+
+def refresh_candidate_matches(candidate_id, recruiter_job_skills=None):
+    """
+    Recompute one candidate's match rows against every recruiter.
+
+    ``recruiter_job_skills`` may be passed in (as returned by
+    get_recruiter_job_skills) to share one load across many candidates.
+    Returns the number of rows stored.
+    """
+    matches = []
+    candidate = JobSeekerProfile.objects.filter(id=candidate_id, is_public=True).first()
+    if candidate:
+        if recruiter_job_skills is None:
+            recruiter_job_skills = get_recruiter_job_skills()
+        candidate_skills = list(candidate.skills.values_list('name', flat=True))
+        for recruiter_id, job_skills_map in recruiter_job_skills.items():
+            result = score_candidate(job_skills_map, candidate_skills)
+            if result['score'] > 0:
+                matches.append(_build_match(recruiter_id, candidate_id, result))
+
+    with transaction.atomic():
+        CandidateMatch.objects.filter(candidate_id=candidate_id).delete()
+        CandidateMatch.objects.bulk_create(matches)
+    return len(matches)
+
+
+def process_refresh_requests(limit=None):
+    """
+    Drain queued refresh requests.
+
+    Recruiter refreshes run first so that queued candidates are scored
+    against up-to-date job skills. Returns (recruiters, candidates)
+    processed.
+    """
+    pending = MatchRefreshRequest.objects.order_by('requested_at')
+    if limit:
+        pending = pending[:limit]
+    pending = list(pending)
+
+    recruiters = 0
+    candidates = 0
+    recruiter_job_skills = None
+    for request in sorted(pending, key=lambda item: item.target_type != 'recruiter'):
+        # Delete first so a change made while refreshing queues a new request
+        MatchRefreshRequest.objects.filter(pk=request.pk).delete()
+        if request.target_type == 'recruiter':
+            refresh_recruiter_matches(request.target_id)
+            recruiters += 1
+        else:
+            if recruiter_job_skills is None:
+                recruiter_job_skills = get_recruiter_job_skills()
+            refresh_candidate_matches(request.target_id, recruiter_job_skills)
+            candidates += 1
+    return recruiters, candidates
+
+
+def ensure_recruiter_matches(recruiter):
+    """
+    Build a recruiter's matches inline the first time they are needed.
+
+    Once the store has been built (even if no candidate matched) the view
+    only reads it and refreshes are left to the refresh_candidate_matches
+    command.
+    """
+    if recruiter.matches_built_at:
+        return
+    MatchRefreshRequest.objects.filter(target_type='recruiter', target_id=recruiter.id).delete()
+    refresh_recruiter_matches(recruiter.id)
+    recruiter.refresh_from_db(fields=['matches_built_at'])
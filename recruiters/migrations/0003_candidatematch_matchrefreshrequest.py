@@ -0,0 +1,50 @@
+# Generated by Django 5.0 on 2026-10-17 06:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0010_jobskill_token'),
+        ('profiles', '0009_useractivity'),
+        ('recruiters', '0002_savedsearch_last_notified_at_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MatchRefreshRequest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('target_type', models.CharField(choices=[('recruiter', 'Recruiter'), ('candidate', 'Candidate')], max_length=20)),
+                ('target_id', models.PositiveIntegerField()),
+                ('requested_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['requested_at'],
+                'unique_together': {('target_type', 'target_id')},
+            },
+        ),
+        migrations.CreateModel(
+            name='CandidateMatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(default=0, help_text="Weighted share of the recruiter's job skills the candidate covers (0-1)")),
+                ('matched_skills', models.JSONField(blank=True, default=list)),
+                ('partial_matches', models.JSONField(blank=True, default=list)),
+                ('missing_skills', models.JSONField(blank=True, default=list)),
+                ('total_required', models.PositiveIntegerField(default=0)),
+                ('best_job_score', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('best_job', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='jobs.jobposting')),
+                ('candidate', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recruiter_matches', to='profiles.jobseekerprofile')),
+                ('recruiter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='candidate_matches', to='recruiters.recruiterprofile')),
+            ],
+            options={
+                'ordering': ['-score', 'candidate_id'],
+                'indexes': [models.Index(fields=['recruiter', '-score'], name='recruiters__recruit_94a692_idx')],
+                'unique_together': {('recruiter', 'candidate')},
+            },
+        ),
+    ]
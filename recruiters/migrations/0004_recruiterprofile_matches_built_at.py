@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recruiters', '0003_candidatematch_matchrefreshrequest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recruiterprofile',
+            name='matches_built_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -17,6 +17,8 @@ class RecruiterProfile(models.Model):
     is_verified = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # When the CandidateMatch rows were last built (see recruiters.match_utils)
+    matches_built_at = models.DateTimeField(null=True, blank=True)
     
     def __str__(self):
         return f"{self.user.get_full_name()} - {self.company}"
@@ -130,4 +132,46 @@ class SearchNotification(models.Model):
         ]
     
     def __str__(self):
-        return f"{self.notification_type} notification for {self.saved_search.name} - {self.matches_count} matches"
\ No newline at end of file
+        return f"{self.notification_type} notification for {self.saved_search.name} - {self.matches_count} matches"
+
+class CandidateMatch(models.Model):
+    """Precomputed skill match between a recruiter's open jobs and a candidate"""
+    recruiter = models.ForeignKey(RecruiterProfile, on_delete=models.CASCADE, related_name='candidate_matches')
+    candidate = models.ForeignKey(JobSeekerProfile, on_delete=models.CASCADE, related_name='recruiter_matches')
+    score = models.FloatField(default=0, help_text="Weighted share of the recruiter's job skills the candidate covers (0-1)")
+    matched_skills = models.JSONField(default=list, blank=True)
+    partial_matches = models.JSONField(default=list, blank=True)
+    missing_skills = models.JSONField(default=list, blank=True)
+    total_required = models.PositiveIntegerField(default=0)
+    best_job = models.ForeignKey('jobs.JobPosting', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    best_job_score = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['recruiter', 'candidate']
+        ordering = ['-score', 'candidate_id']
+        indexes = [
+            models.Index(fields=['recruiter', '-score']),
+        ]
+    
+    def __str__(self):
+        return f"{self.candidate} matches {self.recruiter} ({self.score:.0%})"
+
+
+class MatchRefreshRequest(models.Model):
+    """Pending recomputation of CandidateMatch rows, drained by refresh_candidate_matches"""
+    TARGET_TYPES = [
+        ('recruiter', 'Recruiter'),
+        ('candidate', 'Candidate'),
+    ]
+    
+    target_type = models.CharField(max_length=20, choices=TARGET_TYPES)
+    target_id = models.PositiveIntegerField()
+    requested_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ['target_type', 'target_id']
+        ordering = ['requested_at']
+    
+    def __str__(self):
+        return f"Refresh {self.target_type} {self.target_id}"
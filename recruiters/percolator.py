@@ -0,0 +1,205 @@
+"""
+Reverse matching of candidate profiles against saved searches.
+
+Rather than running every SavedSearch over all candidates, the criteria of
+all active searches are loaded into a small in-memory index and a changed
+profile is matched against all of them at once:
+
+- skills: each distinct search skill term maps to the searches using it;
+  a term matches when it is contained in one of the candidate's skills
+- location: contained in the candidate's location
+- experience_level: entry level means no work experience, the other
+  levels mean some
+
+Matching follows run_search_query, so the percolator and the periodic
+check_saved_searches run record the same SearchMatch rows.
+
+Each process keeps one index and reloads it only when the saved searches
+have changed (a new max updated_at or count; skill changes touch
+updated_at, see recruiters.signals). Profiles changed in one transaction
+are percolated together, once each, after it commits. Searches with
+"immediate" notifications are emailed right after, one email per
+recruiter; daily and weekly digests, and emails that failed to send, are
+left to check_saved_searches.
+"""
+import threading
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import Count, Max
+from profiles.models import CandidateSearchDocument
+from .models import SavedSearch, SearchMatch
+from .search_utils import build_digest_email, get_digest_matches, mark_digest_notified
+
+
+class SearchCriteriaIndex:
+    """In-memory index over the criteria of the active saved searches"""
+
+    def __init__(self, searches, skill_terms):
+        """
+        Args:
+            searches: (id, location, experience_level) tuples
+            skill_terms: (search id, skill name) tuples
+        """
+        self.searches = {
+            search_id: (location.lower(), experience_level)
+            for search_id, location, experience_level in searches
+        }
+        self.searches_by_term = defaultdict(set)
+        for search_id, name in skill_terms:
+            if search_id in self.searches:
+                self.searches_by_term[name.lower()].add(search_id)
+        with_skills = set().union(*self.searches_by_term.values()) if self.searches_by_term else set()
+        self.without_skills = set(self.searches) - with_skills
+
+    @classmethod
+    def load(cls):
+        """Build the index from the database in two queries"""
+        active = SavedSearch.objects.filter(is_active=True)
+        searches = active.values_list('id', 'location', 'experience_level')
+        skill_terms = SavedSearch.skills.through.objects.filter(
+            savedsearch__is_active=True
+        ).values_list('savedsearch_id', 'skill__name')
+        return cls(list(searches), list(skill_terms))
+
+    def match(self, skills, location, has_experience):
+        """Return the ids of the searches a candidate satisfies"""
+        skills = [skill.lower() for skill in skills]
+        location = (location or '').lower()
+
+        matched = set(self.without_skills)
+        for term, search_ids in self.searches_by_term.items():
+            if any(term in skill for skill in skills):
+                matched |= search_ids
+
+        result = set()
+        for search_id in matched:
+            search_location, experience_level = self.searches[search_id]
+            if search_location and search_location not in location:
+                continue
+            if experience_level == 'entry' and has_experience:
+                continue
+            if experience_level in ('mid', 'senior', 'executive') and not has_experience:
+                continue
+            result.add(search_id)
+        return result
+
+
+_index_lock = threading.Lock()
+_cached_index = None
+_cached_version = None
+
+
+def get_index():
+    """
+    The process's SearchCriteriaIndex, reloaded only if a saved search was
+    added, changed or deleted since it was built (one query otherwise).
+    """
+    global _cached_index, _cached_version
+    version = tuple(SavedSearch.objects.aggregate(changed=Max('updated_at'), count=Count('id')).values())
+    with _index_lock:
+        if _cached_index is None or version != _cached_version:
+            _cached_index = SearchCriteriaIndex.load()
+            _cached_version = version
+        return _cached_index
+
+
+def percolate_profile(profile_id, index=None):
+    """
+    Match one candidate against every active saved search.
+
+    Records a SearchMatch for each newly matching search and returns the
+    new SearchMatch objects. Sends no email; see notify_immediate.
+    """
+    document = CandidateSearchDocument.objects.select_related('profile').filter(profile_id=profile_id).first()
+    if document is None or not document.profile.is_public:
+        return []
+
+    if index is None:
+        index = get_index()
+    skills = document.skills.split('\n') if document.skills else []
+    search_ids = index.match(skills, document.profile.location, bool(document.experience))
+    if not search_ids:
+        return []
+
+    already_matched = set(SearchMatch.objects.filter(
+        candidate_id=profile_id,
+        saved_search_id__in=search_ids
+    ).values_list('saved_search_id', flat=True))
+    new_matches = [
+        SearchMatch(saved_search_id=search_id, candidate_id=profile_id, is_new_match=True, notified=False)
+        for search_id in sorted(search_ids - already_matched)
+    ]
+    SearchMatch.objects.bulk_create(new_matches, ignore_conflicts=True)
+    return new_matches
+
+
+def notify_immediate(search_ids):
+    """
+    Email the pending matches of the given searches that notify immediately
+
+    Sends one email per recruiter and returns the number sent. A failed
+    send leaves its matches pending for check_saved_searches.
+    """
+    searches = list(SavedSearch.objects.filter(
+        id__in=search_ids,
+        is_active=True,
+        notify_on_new_matches=True,
+        notification_frequency='immediate'
+    ).select_related('recruiter__user').order_by('id'))
+    if not searches:
+        return 0
+
+    matches_by_search = get_digest_matches(searches)
+    sections_by_recruiter = defaultdict(list)
+    for search in searches:
+        if matches_by_search[search.id]:
+            sections_by_recruiter[search.recruiter_id].append(
+                {'saved_search': search, 'matches': matches_by_search[search.id]}
+            )
+
+    sent = 0
+    for sections in sections_by_recruiter.values():
+        recruiter = sections[0]['saved_search'].recruiter
+        try:
+            build_digest_email(recruiter, sections).send(fail_silently=False)
+        except Exception:
+            # Don't break the job seeker's request; the next run retries
+            continue
+        mark_digest_notified(sections)
+        sent += 1
+    return sent
+
+
+# Profiles waiting for the current transaction to commit, per thread
+_pending = threading.local()
+
+
+def _percolate_pending():
+    profile_ids = getattr(_pending, 'profile_ids', None)
+    if not profile_ids:
+        # An earlier callback of the same transaction already ran
+        return
+    _pending.profile_ids = set()
+    index = get_index()
+    search_ids = set()
+    for profile_id in sorted(profile_ids):
+        search_ids.update(match.saved_search_id for match in percolate_profile(profile_id, index))
+    if search_ids:
+        notify_immediate(search_ids)
+
+
+def schedule_percolation(profile_id):
+    """
+    Percolate a profile once the current transaction commits.
+
+    Every call registers the same callback and adds the profile to a
+    per-thread set. The first callback to run percolates the whole set,
+    once per profile, and the others find it empty. If the transaction
+    rolls back its callbacks are dropped, and its profiles are percolated
+    against the committed data with the next commit.
+    """
+    profile_ids = getattr(_pending, 'profile_ids', None)
+    if profile_ids is None:
+        profile_ids = _pending.profile_ids = set()
+    profile_ids.add(profile_id)
+    transaction.on_commit(_percolate_pending)
@@ -1,12 +1,18 @@
 """
 Utility functions for saved search notifications
 """
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
 from django.db.models import Q
+from django.template.loader import render_to_string
 from django.utils import timezone
 from datetime import timedelta
 from profiles.models import JobSeekerProfile
 from .models import SavedSearch, SearchMatch, SearchNotification
 
+# How far before the last run's watermark changed profiles are re-checked
+WATERMARK_OVERLAP = timedelta(minutes=1)
+
 
 def run_search_query(saved_search):
     """
@@ -42,52 +48,44 @@ def run_search_query(saved_search):
 
 def find_new_matches(saved_search):
     """
-    Find new candidates that match a saved search since the last notification
+    Find new candidates that match a saved search since it was last run
+
+    Only profiles whose search document changed after the search's
+    last_search_at watermark are evaluated. A search that has never run,
+    or whose criteria were edited since, is evaluated in full.
     """
-    # Get current candidates matching search criteria
-    current_matches = run_search_query(saved_search)
-    
-    # Get previously matched candidates
-    previous_matches = SearchMatch.objects.filter(
-        saved_search=saved_search
-    ).values_list('candidate_id', flat=True)
-    
-    # Find new matches
-    new_candidates = current_matches.exclude(id__in=previous_matches)
-    
-    # Create SearchMatch records for new candidates
-    new_matches = []
-    for candidate in new_candidates:
-        match, created = SearchMatch.objects.get_or_create(
-            saved_search=saved_search,
-            candidate=candidate,
-            defaults={'is_new_match': True, 'notified': False}
-        )
-        if created:
-            new_matches.append(match)
+    run_started_at = timezone.now()
+    
+    candidates = run_search_query(saved_search)
+    watermark = saved_search.last_search_at
+    if watermark and saved_search.updated_at <= watermark:
+        # Overlap the previous run slightly so rows committed while it ran aren't missed
+        candidates = candidates.filter(search_document__updated_at__gt=watermark - WATERMARK_OVERLAP)
+    
+    # Anti-join in the database rather than passing id lists back and forth
+    new_ids = candidates.exclude(
+        id__in=SearchMatch.objects.filter(saved_search=saved_search).values('candidate_id')
+    ).values_list('id', flat=True)
+    
+    new_matches = [
+        SearchMatch(saved_search=saved_search, candidate_id=candidate_id, is_new_match=True, notified=False)
+        for candidate_id in sorted(set(new_ids))
+    ]
+    # A concurrent run may insert the same pair; the unique constraint wins
+    SearchMatch.objects.bulk_create(new_matches, ignore_conflicts=True)
+    
+    # Queryset update so the criteria timestamp (updated_at) is left alone
+    SavedSearch.objects.filter(pk=saved_search.pk).update(last_search_at=run_started_at)
+    saved_search.last_search_at = run_started_at
     
     return new_matches
 
 
-def should_send_notification(saved_search):
+def is_notification_due(saved_search, now=None):
     """
-    Determine if a notification should be sent for a saved search
+    Check a saved search's notification frequency against its last notification
     """
-    if not saved_search.notify_on_new_matches or not saved_search.is_active:
-        return False
-    
-    # Check if there are new matches
-    new_matches = SearchMatch.objects.filter(
-        saved_search=saved_search,
-        is_new_match=True,
-        notified=False
-    )
-    
-    if not new_matches.exists():
-        return False
-    
-    # Check notification frequency
-    now = timezone.now()
+    now = now or timezone.now()
     
     if saved_search.notification_frequency == 'immediate':
         return True
@@ -103,40 +101,72 @@ def should_send_notification(saved_search):
     return False
 
 
-def mark_matches_as_notified(saved_search, notification_type='immediate'):
+def get_digest_matches(saved_searches):
     """
-    Mark matches as notified and update the saved search
+    Load the pending matches of many saved searches in one query
+
+    Returns {saved_search_id: [SearchMatch, ...]}, newest first.
     """
-    # Mark all new matches as notified
-    SearchMatch.objects.filter(
-        saved_search=saved_search,
+    matches_by_search = {saved_search.id: [] for saved_search in saved_searches}
+    matches = SearchMatch.objects.filter(
+        saved_search_id__in=list(matches_by_search),
         is_new_match=True,
         notified=False
-    ).update(notified=True, is_new_match=False)
-    
-    # Update saved search timestamp
-    saved_search.last_notified_at = timezone.now()
-    saved_search.save(update_fields=['last_notified_at'])
+    ).select_related('candidate__user').prefetch_related('candidate__skills').order_by('-matched_at')
+    for match in matches:
+        matches_by_search[match.saved_search_id].append(match)
+    return matches_by_search
 
 
-def create_notification_record(saved_search, notification_type, matches_count, email_sent=False):
+def build_digest_email(recruiter, sections):
     """
-    Create a notification record for tracking
+    Render one digest email covering several of a recruiter's saved searches
+
+    ``sections`` is a list of {'saved_search': ..., 'matches': [...]} dicts.
     """
-    return SearchNotification.objects.create(
-        saved_search=saved_search,
-        notification_type=notification_type,
-        matches_count=matches_count,
-        email_sent=email_sent
+    context = {
+        'recruiter': recruiter,
+        'sections': sections,
+        'matches_count': sum(len(section['matches']) for section in sections),
+        'site_url': getattr(settings, 'SITE_URL', 'http://localhost:8000'),
+    }
+    
+    if len(sections) == 1:
+        subject = f'New candidates match your search: {sections[0]["saved_search"].name}'
+    else:
+        subject = f'New candidates match {len(sections)} of your saved searches'
+    
+    html_message = render_to_string('recruiters/emails/recruiter_digest.html', context)
+    
+    message = EmailMultiAlternatives(
+        subject=subject,
+        body='',  # We're using HTML
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[recruiter.user.email],
     )
+    message.attach_alternative(html_message, 'text/html')
+    return message
 
 
-def get_notification_matches(saved_search):
+def mark_digest_notified(sections):
     """
-    Get all new matches that should be included in a notification
+    Mark the matches included in a digest as notified and record it
+
+    Only the matches that were rendered are marked, so matches recorded
+    while the digest was being sent go out with the next one.
     """
-    return SearchMatch.objects.filter(
-        saved_search=saved_search,
-        is_new_match=True,
-        notified=False
-    ).select_related('candidate').order_by('-matched_at')
+    now = timezone.now()
+    match_ids = [match.id for section in sections for match in section['matches']]
+    search_ids = [section['saved_search'].id for section in sections]
+    
+    SearchMatch.objects.filter(id__in=match_ids).update(notified=True, is_new_match=False)
+    SavedSearch.objects.filter(id__in=search_ids).update(last_notified_at=now)
+    SearchNotification.objects.bulk_create([
+        SearchNotification(
+            saved_search=section['saved_search'],
+            notification_type=section['saved_search'].notification_frequency,
+            matches_count=len(section['matches']),
+            email_sent=True
+        )
+        for section in sections
+    ])
@@ -0,0 +1,83 @@
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from profiles.models import JobSeekerProfile, Skill, CandidateSearchDocument
+from jobs.models import JobPosting, JobSkill
+from .match_utils import request_refresh
+from .models import SavedSearch
+from .percolator import schedule_percolation
+
+
+def _recruiter_id_for_job(job):
+    """Return the RecruiterProfile id of a job's poster, if any"""
+    recruiter = getattr(job.posted_by, 'recruiter_profile', None)
+    return recruiter.id if recruiter else None
+
+
+@receiver(post_save, sender=Skill)
+@receiver(post_delete, sender=Skill)
+def refresh_matches_on_skill_change(sender, instance, **kwargs):
+    """Queue a candidate's matches for recomputation when their skills change"""
+    request_refresh('candidate', instance.profile_id)
+
+
+@receiver(post_save, sender=JobSeekerProfile)
+def refresh_matches_on_profile_save(sender, instance, **kwargs):
+    """Queue a candidate's matches when their profile (e.g. visibility) changes"""
+    request_refresh('candidate', instance.id)
+
+
+@receiver(post_save, sender=JobSkill)
+@receiver(post_delete, sender=JobSkill)
+def refresh_matches_on_job_skill_change(sender, instance, **kwargs):
+    """Queue a recruiter's matches when one of their job's skills changes"""
+    request_refresh('recruiter', _recruiter_id_for_job(instance.job))
+
+
+@receiver(post_save, sender=JobPosting)
+def refresh_matches_on_job_save(sender, instance, update_fields=None, **kwargs):
+    """Queue a recruiter's matches when a job is opened, closed or published"""
+    # Counter updates (views, application_count) don't affect matching
+    if update_fields is not None and not {'is_active', 'status'} & set(update_fields):
+        return
+    request_refresh('recruiter', _recruiter_id_for_job(instance))
+
+
+@receiver(post_delete, sender=JobPosting)
+def refresh_matches_on_job_delete(sender, instance, **kwargs):
+    """Queue a recruiter's matches when one of their jobs is deleted"""
+    request_refresh('recruiter', _recruiter_id_for_job(instance))
+
+
+@receiver(post_save, sender=CandidateSearchDocument)
+def percolate_changed_profile(sender, instance, **kwargs):
+    """Match a changed candidate against all saved searches"""
+    schedule_percolation(instance.profile_id)
+
+
+def _touch_saved_searches(search_ids):
+    """Bump updated_at so every process reloads its percolator index"""
+    if search_ids:
+        SavedSearch.objects.filter(pk__in=search_ids).update(updated_at=timezone.now())
+
+
+@receiver(m2m_changed, sender=SavedSearch.skills.through)
+def touch_saved_search_on_skills_set(sender, instance, action, reverse, pk_set, **kwargs):
+    """A saved search's skills changed"""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        _touch_saved_searches([instance.pk])
+    elif pk_set:
+        _touch_saved_searches(pk_set)
+    else:
+        _touch_saved_searches(list(instance.saved_searches.values_list('pk', flat=True)))
+
+
+@receiver(post_save, sender=Skill)
+@receiver(pre_delete, sender=Skill)
+def touch_saved_search_on_skill_change(sender, instance, created=False, **kwargs):
+    """A skill used by saved searches was renamed or is being deleted"""
+    # Deleting a skill removes its saved search rows without m2m_changed
+    if not created:
+        _touch_saved_searches(list(instance.saved_searches.values_list('pk', flat=True)))
@@ -1,3 +1,312 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core import mail
+from django.core.management import call_command
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from jobs.models import GeocodeRequest, JobApplication, JobPosting, JobSkill
+from profiles.models import CandidateSearchDocument, CustomUser, JobSeekerProfile, Skill
+from recruiters import percolator
+from recruiters import search_utils
+from recruiters.match_utils import ensure_recruiter_matches, process_refresh_requests
+from recruiters.models import CandidateMatch, MatchRefreshRequest, RecruiterProfile, SavedSearch, SearchMatch, SearchNotification
+
+
+def create_recruiter(username='recruiter'):
+    user = CustomUser.objects.create_user(username, f'{username}@example.com', 'pw', user_type='recruiter')
+    return RecruiterProfile.objects.create(user=user, company='Acme')
+
+
+def create_candidate(username='seeker', location='Chicago, IL'):
+    user = CustomUser.objects.create_user(username, f'{username}@example.com', 'pw', user_type='job_seeker')
+    return JobSeekerProfile.objects.create(user=user, headline='Developer', location=location)
+
+
+class MatchStoreTests(TestCase):
+    """Candidate matches are precomputed and refreshed from a queue"""
+
+    def setUp(self):
+        self.recruiter = create_recruiter()
+        self.job = JobPosting.objects.create(title='Backend', location='Remote', posted_by=self.recruiter.user)
+        for name in ('Python', 'Django', 'PostgreSQL', 'Docker'):
+            JobSkill.objects.create(job=self.job, name=name)
+        self.candidate = create_candidate()
+        for name in ('python', 'Django REST', 'Docker'):
+            Skill.objects.create(profile=self.candidate, name=name)
+
+    def test_changes_queue_refreshes(self):
+        self.assertEqual(
+            set(MatchRefreshRequest.objects.values_list('target_type', 'target_id')),
+            {('recruiter', self.recruiter.id), ('candidate', self.candidate.id)}
+        )
+        self.assertEqual(process_refresh_requests(), (1, 1))
+        self.assertFalse(MatchRefreshRequest.objects.exists())
+
+    def test_refresh_stores_scores(self):
+        no_skills = create_candidate('noskills')
+        process_refresh_requests()
+        self.assertEqual(CandidateMatch.objects.get(candidate=no_skills).score, 0.1)
+        match = CandidateMatch.objects.get(candidate=self.candidate)
+        self.assertEqual(match.recruiter, self.recruiter)
+        self.assertEqual(match.score, (2 + 0.5) / 4)
+        self.assertEqual(match.matched_skills, ['Docker', 'Python'])
+        self.assertEqual(match.partial_matches, ['Django'])
+        self.assertEqual(match.missing_skills, ['PostgreSQL'])
+        self.assertEqual((match.best_job_id, match.best_job_score), (self.job.id, 0.5))
+
+    def test_removed_skill_updates_match(self):
+        process_refresh_requests()
+        self.candidate.skills.get(name='Docker').delete()
+        process_refresh_requests()
+        self.assertEqual(CandidateMatch.objects.get().matched_skills, ['Python'])
+
+    def test_first_view_builds_matches_inline(self):
+        ensure_recruiter_matches(self.recruiter)
+        self.assertEqual(CandidateMatch.objects.count(), 1)
+        self.assertFalse(MatchRefreshRequest.objects.filter(target_type='recruiter').exists())
+        self.assertIsNotNone(self.recruiter.matches_built_at)
+
+    def test_recruiter_without_matches_is_built_once(self):
+        recruiter = create_recruiter('nomatches')
+        ensure_recruiter_matches(recruiter)
+        self.assertFalse(CandidateMatch.objects.filter(recruiter=recruiter).exists())
+
+        recruiter = RecruiterProfile.objects.get(pk=recruiter.pk)
+        with self.assertNumQueries(0):
+            ensure_recruiter_matches(recruiter)
+
+
+class IncrementalMatchingTests(TestCase):
+    """find_new_matches only re-checks profiles changed since its last run"""
+
+    def setUp(self):
+        self.search = SavedSearch.objects.create(recruiter=create_recruiter(), name='Chicago', location='Chicago')
+        self.candidate = create_candidate()
+
+    def age_documents(self):
+        CandidateSearchDocument.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+
+    def forget_matches(self):
+        SearchMatch.objects.all().delete()
+
+    def test_first_run_checks_everyone(self):
+        self.age_documents()
+        self.assertEqual([match.candidate_id for match in search_utils.find_new_matches(self.search)], [self.candidate.id])
+        self.assertIsNotNone(SavedSearch.objects.get().last_search_at)
+        self.assertEqual(search_utils.find_new_matches(self.search), [])
+
+    def test_existing_matches_are_excluded_in_the_database(self):
+        SearchMatch.objects.create(saved_search=self.search, candidate=self.candidate)
+        other = create_candidate('other')
+        # skills.exists(), the anti-join, the insert and the watermark update
+        with self.assertNumQueries(4):
+            new_matches = search_utils.find_new_matches(self.search)
+        self.assertEqual([match.candidate_id for match in new_matches], [other.id])
+
+    def test_unchanged_profiles_are_skipped(self):
+        search_utils.find_new_matches(self.search)
+        self.forget_matches()
+        self.age_documents()
+        self.assertEqual(search_utils.find_new_matches(self.search), [])
+
+        self.candidate.headline = 'Senior developer'
+        self.candidate.save()
+        self.assertEqual(len(search_utils.find_new_matches(self.search)), 1)
+
+    def test_edited_search_checks_everyone(self):
+        search_utils.find_new_matches(self.search)
+        self.forget_matches()
+        self.age_documents()
+        self.search.name = 'Chicago developers'
+        self.search.save()
+        self.assertEqual(len(search_utils.find_new_matches(self.search)), 1)
+
+
+class PercolatorTests(TestCase):
+    """Changed profiles are matched against saved searches after commit"""
+
+    def setUp(self):
+        self.recruiter = create_recruiter()
+        self.search = SavedSearch.objects.create(
+            recruiter=self.recruiter, name='Chicago', location='Chicago',
+            notification_frequency='immediate'
+        )
+
+    def test_matching_profile_creates_search_match(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            candidate = create_candidate()
+        match = SearchMatch.objects.get()
+        self.assertEqual((match.saved_search, match.candidate), (self.search, candidate))
+
+    def test_non_matching_profile_creates_nothing(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            create_candidate(location='Denver, CO')
+        self.assertFalse(SearchMatch.objects.exists())
+
+    def test_profile_saved_repeatedly_is_percolated_once_per_transaction(self):
+        self.search.notification_frequency = 'daily'
+        self.search.save()
+        with self.captureOnCommitCallbacks() as callbacks:
+            candidate = create_candidate()
+            for name in ('Python', 'Django', 'SQL'):
+                Skill.objects.create(profile=candidate, name=name)
+            create_candidate('other')
+
+        # The index is checked and loaded once (3 queries), then 3 per
+        # profile, and 1 to look for immediate searches; the remaining
+        # callbacks find nothing to do
+        with self.assertNumQueries(10):
+            for callback in callbacks:
+                callback()
+        self.assertEqual(SearchMatch.objects.count(), 2)
+
+    def test_rolled_back_profiles_are_percolated_with_the_next_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            candidate = create_candidate()
+        # The callbacks of a rolled back transaction never run
+        self.assertTrue(callbacks)
+        with self.captureOnCommitCallbacks(execute=True):
+            create_candidate('other', location='Denver, CO')
+        self.assertEqual(SearchMatch.objects.get().candidate, candidate)
+
+    def test_immediate_search_is_emailed_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            candidate = create_candidate()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [self.recruiter.user.email])
+        match = SearchMatch.objects.get(candidate=candidate)
+        self.assertTrue(match.notified)
+        self.assertEqual(SearchNotification.objects.get().matches_count, 1)
+
+    def test_daily_search_is_left_to_the_digest(self):
+        self.search.notification_frequency = 'daily'
+        self.search.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            create_candidate()
+        self.assertEqual(mail.outbox, [])
+        self.assertFalse(SearchMatch.objects.get().notified)
+
+    def test_failed_send_leaves_matches_pending(self):
+        with mock.patch('django.core.mail.EmailMessage.send', side_effect=OSError('smtp down')):
+            with self.captureOnCommitCallbacks(execute=True):
+                create_candidate()
+        self.assertFalse(SearchMatch.objects.get().notified)
+        self.assertFalse(SearchNotification.objects.exists())
+
+    def test_index_reloads_when_search_skills_change(self):
+        candidate = create_candidate()
+        Skill.objects.create(profile=candidate, name='Rust')
+        index = percolator.get_index()
+        self.assertIs(percolator.get_index(), index)
+
+        rust = Skill.objects.create(profile=create_candidate('other'), name='Rust')
+        self.search.skills.add(rust)
+        reloaded = percolator.get_index()
+        self.assertIsNot(reloaded, index)
+        self.assertEqual(set(reloaded.searches_by_term), {'rust'})
+
+        rust.delete()
+        self.assertEqual(set(percolator.get_index().searches_by_term), set())
+
+
+class CheckSavedSearchesTests(TestCase):
+    """check_saved_searches shards by recruiter and survives failing searches"""
+
+    def setUp(self):
+        self.searches = [
+            SavedSearch.objects.create(recruiter=create_recruiter(f'recruiter{index}'), name=f'Search {index}')
+            for index in range(4)
+        ]
+
+    def run_command(self, *args):
+        out = StringIO()
+        call_command('check_saved_searches', '--dry-run', *args, stdout=out)
+        return out.getvalue()
+
+    def checked(self, output):
+        return {line.split(': ', 1)[1] for line in output.splitlines() if line.startswith('Checking search: ')}
+
+    def test_shards_split_by_recruiter_id(self):
+        seen = []
+        for index in range(3):
+            checked = self.checked(self.run_command('--shard', f'{index}/3'))
+            expected = {search.name for search in self.searches if search.recruiter_id % 3 == index}
+            self.assertEqual(checked, expected)
+            seen.extend(checked)
+        self.assertEqual(sorted(seen), sorted(search.name for search in self.searches))
+
+    def test_failing_search_does_not_abort_the_run(self):
+        original = search_utils.find_new_matches
+
+        def find_new_matches(search):
+            if search.pk == self.searches[1].pk:
+                raise RuntimeError('boom')
+            return original(search)
+
+        # Worker threads run the same match_search, so the serial path covers them
+        with mock.patch(
+            'recruiters.management.commands.check_saved_searches.find_new_matches',
+            side_effect=find_new_matches
+        ):
+            output = self.run_command()
+        self.assertEqual(len(self.checked(output)), 4)
+        self.assertIn(f'Error matching search {self.searches[1].pk}: boom', output)
+        self.assertIn('1 failed', output)
+        self.assertEqual(SavedSearch.objects.filter(last_search_at__isnull=False).count(), 3)
+
+
+class DigestTests(TestCase):
+    """Each recruiter gets one digest covering all their due searches"""
+
+    def setUp(self):
+        self.recruiter = create_recruiter()
+        self.other = create_recruiter('other')
+        self.chicago = SavedSearch.objects.create(recruiter=self.recruiter, name='Chicago', location='Chicago')
+        self.everyone = SavedSearch.objects.create(recruiter=self.recruiter, name='Everyone')
+        self.other_search = SavedSearch.objects.create(recruiter=self.other, name='Other')
+        create_candidate()
+
+    def run_command(self):
+        call_command('check_saved_searches', stdout=StringIO())
+
+    def test_one_digest_per_recruiter(self):
+        self.run_command()
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ['other@example.com', 'recruiter@example.com'])
+        digest = next(message for message in mail.outbox if message.to == ['recruiter@example.com'])
+        self.assertEqual(digest.subject, 'New candidates match 2 of your saved searches')
+        self.assertFalse(SearchMatch.objects.filter(notified=False).exists())
+        self.assertEqual(SearchNotification.objects.count(), 3)
+
+        mail.outbox = []
+        self.run_command()
+        self.assertEqual(mail.outbox, [])
+
+    def test_searches_not_due_wait(self):
+        SavedSearch.objects.filter(pk=self.everyone.pk).update(notification_frequency='weekly', last_notified_at=timezone.now())
+        self.run_command()
+        digest = next(message for message in mail.outbox if message.to == ['recruiter@example.com'])
+        self.assertEqual(digest.subject, 'New candidates match your search: Chicago')
+        self.assertTrue(SearchMatch.objects.filter(saved_search=self.everyone, notified=False).exists())
+
+
+class ApplicantMapTests(TestCase):
+    """The applicant map only reads stored coordinates"""
+
+    def setUp(self):
+        self.recruiter = create_recruiter()
+        job = JobPosting.objects.create(title='Backend', location='Remote', posted_by=self.recruiter.user)
+        for username in ('seeker', 'other'):
+            JobApplication.objects.create(job=job, applicant=create_candidate(username, 'Atlantis').user)
+        self.client.force_login(self.recruiter.user)
 
-# Create your tests here.
+    def test_viewing_the_map_queues_nothing(self):
+        GeocodeRequest.objects.all().delete()
+        # Session, user, recruiter profile, 3 counts/aggregates and the job filter
+        with self.assertNumQueries(7):
+            response = self.client.get(reverse('recruiters:applicant_map'))
+        self.assertEqual(response.context['pending_geocode_count'], 2)
+        self.assertFalse(GeocodeRequest.objects.exists())
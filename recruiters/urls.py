@@ -31,4 +31,6 @@ urlpatterns = [
 
     # Applicant Location Map (Story 18)
     path('applicants/map/', views.applicant_location_map, name='applicant_map'),
+    path('applicants/map/markers/', views.applicant_map_markers, name='applicant_map_markers'),
+    path('applicants/map/applications/<int:application_id>/', views.applicant_map_detail, name='applicant_map_detail'),
 ]
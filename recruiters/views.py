@@ -2,12 +2,15 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.core.paginator import Paginator
-from django.db.models import Q, Count
+from django.db.models import Q, Count, Max, Min
 from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
 from profiles.models import JobSeekerProfile, Skill, WorkExperience, Education
+from profiles.search import search_profiles
 from jobs.models import JobPosting, JobSkill, JobApplication
-from .models import RecruiterProfile, SavedSearch, CandidateNote, SearchNotification
+from jobs.geo import haversine_distances
+from .models import RecruiterProfile, SavedSearch, CandidateNote, SearchNotification, CandidateMatch
+from .match_utils import ensure_recruiter_matches
 from .forms import CandidateSearchForm, SavedSearchForm, CandidateNoteForm
 
 @login_required
@@ -53,19 +56,15 @@ def search_candidates(request):
     
     # Apply filters
     if search_query:
-        candidates = candidates.filter(
-            Q(user__first_name__icontains=search_query) |
-            Q(user__last_name__icontains=search_query) |
-            Q(headline__icontains=search_query) |
-            Q(bio__icontains=search_query)
-        )
+        # Full-text match on the candidate search document, most relevant first
+        candidates = search_profiles(candidates, search_query)
     
     if skills:
         # Filter by skills - candidates must have at least one of the specified skills
         skill_filters = Q()
         for skill in skills:
-            skill_filters |= Q(skills__name__icontains=skill)
-        candidates = candidates.filter(skill_filters).distinct()
+            skill_filters |= Q(search_document__skills__icontains=skill)
+        candidates = candidates.filter(skill_filters)
     
     if location:
         candidates = candidates.filter(location__icontains=location)
@@ -73,22 +72,12 @@ def search_candidates(request):
     if experience_level:
         # This is a simplified filter - in a real app you'd have more sophisticated logic
         if experience_level == 'entry':
-            candidates = candidates.filter(
-                work_experience__isnull=True
-            ).distinct()
-        elif experience_level == 'mid':
-            candidates = candidates.filter(
-                work_experience__isnull=False
-            ).distinct()
-        elif experience_level == 'senior':
-            candidates = candidates.filter(
-                work_experience__isnull=False
-            ).distinct()
+            candidates = candidates.filter(search_document__experience='')
+        elif experience_level in ('mid', 'senior'):
+            candidates = candidates.exclude(search_document__experience='')
     
     if education_level:
-        candidates = candidates.filter(
-            education__degree__icontains=education_level
-        ).distinct()
+        candidates = candidates.filter(search_document__education__icontains=education_level)
     
     # Pagination
     paginator = Paginator(candidates, 12)
@@ -313,12 +302,8 @@ def candidate_recommendations(request):
     
     # Collect all required skills from recruiter's job postings
     all_job_skills = set()
-    job_skills_map = {}
-    
     for job in recruiter_jobs:
-        job_skills = list(job.required_skills.values_list('name', flat=True))
-        job_skills_map[job.id] = job_skills
-        all_job_skills.update(job_skills)
+        all_job_skills.update(skill.name for skill in job.required_skills.all())
     
     if not all_job_skills:
         messages.info(request, 'Add required skills to your job postings to get better candidate recommendations!')
@@ -335,95 +320,27 @@ def candidate_recommendations(request):
         }
         return render(request, 'recruiters/candidate_recommendations.html', context)
     
-    # Get all public job seeker profiles
-    all_candidates = JobSeekerProfile.objects.filter(
-        is_public=True
-    ).select_related('user').prefetch_related('skills', 'work_experience', 'education')
+    # Scores are precomputed in CandidateMatch, so only the top rows are read
+    ensure_recruiter_matches(recruiter)
+    top_matches = CandidateMatch.objects.filter(
+        recruiter=recruiter
+    ).select_related('candidate__user', 'best_job').prefetch_related(
+        'candidate__skills', 'candidate__work_experience', 'candidate__education'
+    ).order_by('-score', 'candidate_id')[:20]  # Top 20 matches
     
-    # Calculate skill match scores for each candidate
-    candidate_scores = []
+    recommended_candidates = []
     skill_match_info = {}
-    
-    for candidate in all_candidates:
-        candidate_skills = list(candidate.skills.values_list('name', flat=True))
-        
-        if not candidate_skills:
-            # Candidates without skills get a low default score
-            match_score = 0.1
-            matched_skills = []
-            missing_skills = list(all_job_skills)
-            best_job_match = None
-            best_job_score = 0
-        else:
-            # Calculate matches against all job skills
-            matched_skills = []
-            for job_skill in all_job_skills:
-                for candidate_skill in candidate_skills:
-                    if job_skill.lower() == candidate_skill.lower():
-                        matched_skills.append(job_skill)
-                        break
-            
-            # Calculate partial matches (substring matching)
-            partial_matches = []
-            for job_skill in all_job_skills:
-                if job_skill not in matched_skills:
-                    for candidate_skill in candidate_skills:
-                        if (candidate_skill.lower() in job_skill.lower() or 
-                            job_skill.lower() in candidate_skill.lower()):
-                            partial_matches.append(job_skill)
-                            break
-            
-            # Calculate overall match score
-            total_job_skills = len(all_job_skills)
-            exact_matches = len(matched_skills)
-            partial_match_count = len(partial_matches)
-            
-            # Scoring: exact matches = 1 point, partial matches = 0.5 points
-            match_score = (exact_matches + (partial_match_count * 0.5)) / total_job_skills
-            
-            # Missing skills
-            missing_skills = [skill for skill in all_job_skills 
-                            if skill not in matched_skills and skill not in partial_matches]
-            
-            # Find best matching job for this candidate
-            best_job_match = None
-            best_job_score = 0
-            
-            for job in recruiter_jobs:
-                job_skills = job_skills_map[job.id]
-                if not job_skills:
-                    continue
-                    
-                job_matched = []
-                for job_skill in job_skills:
-                    for candidate_skill in candidate_skills:
-                        if job_skill.lower() == candidate_skill.lower():
-                            job_matched.append(job_skill)
-                            break
-                
-                job_score = len(job_matched) / len(job_skills) if job_skills else 0
-                if job_score > best_job_score:
-                    best_job_score = job_score
-                    best_job_match = job
-        
-        # Store match information
-        skill_match_info[candidate.id] = {
-            'matched_skills': matched_skills,
-            'partial_matches': partial_matches if 'partial_matches' in locals() else [],
-            'missing_skills': missing_skills,
-            'match_percentage': round(match_score * 100, 1),
-            'total_required': len(all_job_skills),
-            'best_job_match': best_job_match,
-            'best_job_score': round(best_job_score * 100, 1) if best_job_match else 0
+    for match in top_matches:
+        recommended_candidates.append(match.candidate)
+        skill_match_info[match.candidate_id] = {
+            'matched_skills': match.matched_skills,
+            'partial_matches': match.partial_matches,
+            'missing_skills': match.missing_skills,
+            'match_percentage': round(match.score * 100, 1),
+            'total_required': match.total_required,
+            'best_job_match': match.best_job,
+            'best_job_score': round(match.best_job_score * 100, 1) if match.best_job else 0
         }
-        
-        candidate_scores.append((candidate, match_score))
-    
-    # Sort candidates by match score (highest first)
-    candidate_scores.sort(key=lambda x: x[1], reverse=True)
-    
-    # Get top recommendations
-    recommended_candidates = [candidate for candidate, score in candidate_scores[:20]]  # Top 20 matches
     
     # Categorize recommendations
     high_match_candidates = [candidate for candidate in recommended_candidates 
@@ -625,15 +542,43 @@ def update_application_status_kanban(request, application_id):
         return JsonResponse({'success': False, 'message': str(e)})
 
 
+# Badge colour for each application status on the applicant map
+APPLICATION_STATUS_COLORS = {
+    'pending': 'secondary',
+    'reviewing': 'info',
+    'shortlisted': 'warning',
+    'interviewing': 'primary',
+    'offered': 'success',
+    'rejected': 'danger',
+    'withdrawn': 'dark',
+    'hired': 'success'
+}
+
+
+def _applicant_map_applications(request):
+    """Applications to the recruiter's jobs matching the applicant map's filters"""
+    applications = JobApplication.objects.filter(job__posted_by=request.user)
+
+    selected_job_id = request.GET.get('job_id', '')
+    if selected_job_id.isdigit():
+        applications = applications.filter(job__id=selected_job_id)
+
+    selected_status = request.GET.get('status', '')
+    if selected_status:
+        applications = applications.filter(status=selected_status)
+
+    return applications
+
+
 @login_required
 def applicant_location_map(request):
     """
     Display a map showing clusters of applicants by location (Story 18)
-    """
-    from geopy.geocoders import Nominatim
-    from geopy.exc import GeocoderTimedOut, GeocoderServiceError
-    import time
 
+    Markers are loaded per viewport by applicant_map_markers. The page
+    only reads stored coordinates: profiles are geocoded when saved (see
+    jobs.signals) or by geocode_locations --queue.
+    """
     if not hasattr(request.user, 'recruiter_profile'):
         messages.error(request, 'Only recruiters can access this page.')
         return redirect('home')
@@ -644,92 +589,115 @@ def applicant_location_map(request):
     # Get filter parameters
     selected_job_id = request.GET.get('job_id', '')
     selected_status = request.GET.get('status', '')
-
-    # Build query for applications
-    applications_query = JobApplication.objects.filter(
-        job__posted_by=request.user
-    ).select_related(
-        'applicant__job_seeker_profile',
-        'job'
-    )
-
-    # Apply filters
     job_filter = None
-    if selected_job_id:
-        applications_query = applications_query.filter(job__id=selected_job_id)
+    if selected_job_id.isdigit():
         job_filter = JobPosting.objects.filter(id=selected_job_id).first()
 
-    if selected_status:
-        applications_query = applications_query.filter(status=selected_status)
-
-    # Get all applications
-    applications = applications_query
-    total_applications = applications.count()
-
-    # Initialize geocoder
-    geolocator = Nominatim(user_agent="lockedin_recruiter_app")
-
-    # Build markers data for applicants with location
-    applicant_markers = []
-    for application in applications:
-        profile = application.applicant.job_seeker_profile
-        if profile:
-            latitude = profile.latitude
-            longitude = profile.longitude
-
-            # If lat/lon are missing but location text exists, geocode it
-            if (not latitude or not longitude) and profile.location:
-                try:
-                    location = geolocator.geocode(profile.location)
-                    if location:
-                        latitude = location.latitude
-                        longitude = location.longitude
-                        # Optionally save to profile for future use
-                        profile.latitude = latitude
-                        profile.longitude = longitude
-                        profile.save(update_fields=['latitude', 'longitude'])
-                    time.sleep(1)  # Be respectful to the geocoding service
-                except (GeocoderTimedOut, GeocoderServiceError):
-                    # Skip this applicant if geocoding fails
-                    continue
-
-            # Only add to markers if we have valid coordinates
-            if latitude and longitude:
-                # Determine status badge color
-                status_colors = {
-                    'pending': 'secondary',
-                    'reviewing': 'info',
-                    'shortlisted': 'warning',
-                    'interviewing': 'primary',
-                    'offered': 'success',
-                    'rejected': 'danger',
-                    'withdrawn': 'dark',
-                    'hired': 'success'
-                }
-
-                applicant_markers.append({
-                    'name': application.applicant.get_full_name() or application.applicant.username,
-                    'email': application.applicant.email,
-                    'location': profile.location or 'Not specified',
-                    'headline': profile.headline or 'Job Seeker',
-                    'latitude': float(latitude),
-                    'longitude': float(longitude),
-                    'profile_url': f'/profile/{application.applicant.id}/',
-                    'job_title': application.job.title,
-                    'applied_date': application.applied_at.strftime('%b %d, %Y'),
-                    'status_label': dict(JobApplication.APPLICATION_STATUS).get(application.status, 'Unknown'),
-                    'status_color': status_colors.get(application.status, 'secondary')
-                })
-
-    import json
+    applications = _applicant_map_applications(request)
+
+    # Applicants with a location that hasn't been geocoded yet
+    pending_geocode_count = JobSeekerProfile.objects.filter(
+        Q(latitude__isnull=True) | Q(longitude__isnull=True),
+        user__job_applications__in=applications
+    ).exclude(location='').values('id').distinct().count()
+
+    # The map opens on the area covering every located applicant
+    located = applications.filter(
+        applicant__job_seeker_profile__latitude__isnull=False,
+        applicant__job_seeker_profile__longitude__isnull=False
+    ).aggregate(
+        count=Count('id'),
+        south=Min('applicant__job_seeker_profile__latitude'),
+        west=Min('applicant__job_seeker_profile__longitude'),
+        north=Max('applicant__job_seeker_profile__latitude'),
+        east=Max('applicant__job_seeker_profile__longitude'),
+    )
+    marker_bounds = None
+    if located['count']:
+        marker_bounds = [[float(located['south']), float(located['west'])], [float(located['north']), float(located['east'])]]
+
     context = {
         'my_jobs': my_jobs,
+        'located_count': located['count'],
+        'marker_bounds': marker_bounds,
+        'pending_geocode_count': pending_geocode_count,
         'selected_job_id': selected_job_id,
         'selected_status': selected_status,
         'job_filter': job_filter,
-        'total_applications': total_applications,
-        'applicant_markers': json.dumps(applicant_markers),
+        'total_applications': applications.count(),
         'application_statuses': JobApplication.APPLICATION_STATUS,
     }
 
     return render(request, 'recruiters/applicant_map.html', context)
+
+
+@login_required
+def applicant_map_markers(request):
+    """
+    AJAX endpoint for the applicant map: one page of the applications in
+    the ``bbox`` viewport as ``[id, latitude, longitude, name, status]``.
+    Takes the job_id and status filters, plus the ``cursor`` returned by
+    the previous page.
+    """
+    from jobs.clustering import parse_bbox, parse_cursor, viewport_page
+
+    if not hasattr(request.user, 'recruiter_profile'):
+        return JsonResponse({'success': False, 'message': 'Unauthorized'}, status=403)
+
+    bbox = parse_bbox(request.GET.get('bbox'))
+    if bbox is None:
+        return JsonResponse({'success': False, 'message': 'bbox is required'}, status=400)
+
+    rows, cursor = viewport_page(
+        _applicant_map_applications(request),
+        bbox,
+        (
+            'id',
+            'applicant__job_seeker_profile__latitude',
+            'applicant__job_seeker_profile__longitude',
+            'applicant__first_name',
+            'applicant__last_name',
+            'applicant__username',
+            'status',
+        ),
+        cursor=parse_cursor(request.GET.get('cursor')),
+        field_prefix='applicant__job_seeker_profile__',
+        geohash=False,
+    )
+    markers = [
+        [application_id, latitude, longitude, f'{first_name} {last_name}'.strip() or username, status]
+        for application_id, latitude, longitude, first_name, last_name, username, status in rows
+    ]
+    return JsonResponse({'success': True, 'markers': markers, 'cursor': cursor})
+
+
+@login_required
+def applicant_map_detail(request, application_id):
+    """AJAX endpoint for the popup details of one applicant map marker"""
+    application = get_object_or_404(
+        JobApplication.objects.select_related('applicant__job_seeker_profile', 'job'),
+        id=application_id, job__posted_by=request.user
+    )
+    applicant = application.applicant
+    profile = getattr(applicant, 'job_seeker_profile', None)
+    details = {
+        'success': True,
+        'id': application.id,
+        'name': applicant.get_full_name() or applicant.username,
+        'email': applicant.email,
+        'location': (profile and profile.location) or 'Not specified',
+        'headline': (profile and profile.headline) or 'Job Seeker',
+        'profile_url': f'/profile/{applicant.id}/',
+        'job_title': application.job.title,
+        'applied_date': application.applied_at.strftime('%b %d, %Y'),
+        'status_label': dict(JobApplication.APPLICATION_STATUS).get(application.status, 'Unknown'),
+        'status_color': APPLICATION_STATUS_COLORS.get(application.status, 'secondary'),
+    }
+
+    # Distance to the job, when the map is filtered to one
+    job = application.job
+    if (request.GET.get('job_id') == str(job.id) and profile and profile.latitude is not None
+            and job.latitude is not None and job.longitude is not None):
+        distance = haversine_distances(job.latitude, job.longitude, [profile.latitude], [profile.longitude])[0]
+        details['distance'] = round(float(distance), 1)
+    return JsonResponse(details)